@@ -1,4 +1,6 @@
+#define PY_SSIZE_T_CLEAN
 #include <Python.h>
+#include <pythread.h>
 
 #if PY_VERSION_HEX < 0x02050000 && !defined(PY_SSIZE_T_MIN)
 typedef int Py_ssize_t;
@@ -34,6 +36,7 @@ typedef int Py_ssize_t;
 #endif
 
 #include <ImathBox.h>
+#include <half.h>
 #include <ImfIO.h>
 #include <Iex.h>
 #include <ImfArray.h>
@@ -47,6 +50,7 @@ typedef int Py_ssize_t;
 #include <ImfDoubleAttribute.h>
 #include <ImfEnvmapAttribute.h>
 #include <ImfFloatAttribute.h>
+#include <ImfFrameBuffer.h>
 #include <ImfHeader.h>
 #include <ImfInputFile.h>
 #include <ImfIntAttribute.h>
@@ -62,6 +66,9 @@ typedef int Py_ssize_t;
 #include <ImfTimeCodeAttribute.h>
 #include <ImfVecAttribute.h>
 #include <ImfVersion.h>
+#include <ImfStdIO.h>
+#include <IlmThreadPool.h>
+#include <IlmThreadSemaphore.h>
 
 #include <OpenEXRConfig.h>
 
@@ -82,13 +89,36 @@ typedef int Py_ssize_t;
 #include <ImfMultiPartOutputFile.h>
 #include <ImfInputPart.h>
 #include <ImfOutputPart.h>
+#include <ImfTiledInputPart.h>
+#include <ImfTiledOutputPart.h>
+#include <ImfDeepFrameBuffer.h>
+#include <ImfDeepScanLineInputPart.h>
+#include <ImfDeepScanLineOutputPart.h>
+#include <ImfDeepTiledInputPart.h>
+#include <ImfDeepTiledOutputPart.h>
+#endif
+
+#ifndef _WIN32
+#include <fcntl.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
+#include <unistd.h>
+#define USE_MMAP
 #endif
 
 #include <algorithm>
+#include <cmath>
+#include <deque>
+#include <limits>
+#include <map>
+#include <memory>
 #include <iostream>
 #include <iomanip>
 #include <iostream>
+#include <string>
 #include <vector>
+#include <stdexcept>
+#include <thread>
 
 using namespace std;
 using namespace Imf;
@@ -111,35 +141,234 @@ static PyObject *PyObject_Call1(PyObject *f, PyObject* a)
     return r;
 }
 
+////////////////////////////////////////////////////////////////////////
+//    GIL management
+////////////////////////////////////////////////////////////////////////
+
+// The lock of a file object, which serializes access to the file from
+// several threads.  opened points at the object's is_opened flag.
+// close() clears the flag before it waits for the lock, so a call that
+// was already waiting finds the flag cleared once it gets the lock.
+
+struct FileLock
+{
+    PyThread_type_lock lock;
+    const int *opened;
+};
+
+static FileLock *newfilelock(const int *opened)
+{
+    FileLock *l = new FileLock;
+    l->lock = PyThread_allocate_lock();
+    l->opened = opened;
+    return l;
+}
+
+static void freefilelock(FileLock *l)
+{
+    PyThread_free_lock(l->lock);
+    delete l;
+}
+
+// Releases the GIL for the lifetime of the object, so that decoding and
+// encoding can run concurrently with other Python threads.  If a lock
+// is given it is held for the same lifetime, which serializes access
+// to one file object from several threads.  The GIL is released before
+// waiting on the lock, because the current holder may need the GIL to
+// call back into a Python file object.  If the file was closed while
+// waiting, an exception is thrown, unless closing is set because this
+// is close() itself.
+
+class ReleaseGIL
+{
+  public:
+    ReleaseGIL (FileLock *lock = NULL, bool closing = false): _lock(lock)
+    {
+        _save = PyEval_SaveThread();
+        if (_lock) {
+            PyThread_acquire_lock(_lock->lock, WAIT_LOCK);
+            if (!closing && !*_lock->opened) {
+                PyThread_release_lock(_lock->lock);
+                PyEval_RestoreThread(_save);
+                throw Iex::IoExc("I/O operation on closed file");
+            }
+        }
+    }
+    ~ReleaseGIL ()
+    {
+        if (_lock)
+            PyThread_release_lock(_lock->lock);
+        PyEval_RestoreThread(_save);
+    }
+  private:
+    PyThreadState *_save;
+    FileLock *_lock;
+};
+
+// Takes the GIL back inside a ReleaseGIL section, or from a thread that
+// Python does not know about.
+
+class AcquireGIL
+{
+  public:
+    AcquireGIL (): _state(PyGILState_Ensure()) {}
+    ~AcquireGIL () { PyGILState_Release(_state); }
+  private:
+    PyGILState_STATE _state;
+};
+
 ////////////////////////////////////////////////////////////////////////
 //    Istream and Ostream derivatives
 ////////////////////////////////////////////////////////////////////////
 
+// Size of the blocks that C_IStream and C_OStream read from and write to
+// Python file objects.  Set by setStreamBufferSize().
+
+static Py_ssize_t streamBufferSize = 65536;
+
+// Input stream over a Python file object.  Reads are served from a
+// read-ahead buffer that is refilled one block at a time, using the
+// object's readinto method when it has one, so that the many small
+// reads the library makes cost a single Python call per block.  The
+// position is tracked here, so tellg and seekg do not call Python at
+// all; the object is only seeked when a refill starts somewhere else.
+
 class C_IStream: public IStream
 {
   public:
-    C_IStream (PyObject *fo):
-        IStream(""), _fo(fo) {}
+    C_IStream (PyObject *fo);
+    virtual ~C_IStream ();
     virtual bool    read (char c[], int n);
     virtual Int64   tellg ();
     virtual void    seekg (Int64 pos);
     virtual void    clear ();
     virtual const char*     fileName() const;
   private:
+    Py_ssize_t      fill (char *c, Py_ssize_t n);
     PyObject *_fo;
+    PyObject *_readinto;
+    std::vector<char> _buffer;
+    PY_LONG_LONG _start;     // file position of _buffer[0]
+    PY_LONG_LONG _end;       // file position after the last valid byte of _buffer
+    PY_LONG_LONG _pos;       // position of the next read
+    PY_LONG_LONG _fpos;      // position of the Python file object
 };
 
+C_IStream::C_IStream (PyObject *fo):
+    IStream(""), _fo(fo), _readinto(NULL),
+    _buffer(streamBufferSize), _start(0), _end(0), _pos(0), _fpos(0)
+{
+#if PY_MAJOR_VERSION >= 3
+    _readinto = PyObject_GetAttrString(fo, "readinto");
+    if (_readinto == NULL)
+        PyErr_Clear();
+#endif
+    PyObject *rv = PyObject_CallMethod(_fo, (char*)"tell", NULL);
+    if (rv != NULL) {
+        _pos = _fpos = _start = _end = PyLong_AsLongLong(rv);
+        Py_DECREF(rv);
+    }
+    if (PyErr_Occurred()) {
+        PyErr_Clear();
+        _pos = _start = _end = 0;
+        _fpos = -1;
+    }
+}
+
+C_IStream::~C_IStream ()
+{
+    if (_readinto != NULL) {
+        AcquireGIL gil;
+        Py_DECREF(_readinto);
+    }
+}
+
+// Reads up to n bytes at _pos straight into c, seeking the Python object
+// first if needed.  Returns the number of bytes read, which is only
+// short at the end of the file.  Must be called with the GIL.
+
+Py_ssize_t
+C_IStream::fill (char *c, Py_ssize_t n)
+{
+    if (_fpos != _pos) {
+        PyObject *data = PyObject_CallMethod(_fo, (char*)"seek", (char*)"(L)", (PY_LONG_LONG)_pos);
+        if (data == NULL)
+            throw Iex::InputExc("seek failed");
+        Py_DECREF(data);
+        _fpos = _pos;
+    }
+
+    Py_ssize_t got = 0;
+    while (got < n) {
+        Py_ssize_t r;
+        if (_readinto != NULL) {
+#if PY_MAJOR_VERSION >= 3
+            PyObject *view = PyMemoryView_FromMemory(c + got, n - got, PyBUF_WRITE);
+            if (view == NULL)
+                throw Iex::InputExc("file read failed");
+            PyObject *rv = PyObject_CallFunctionObjArgs(_readinto, view, NULL);
+            Py_DECREF(view);
+            if (rv == NULL || rv == Py_None) {
+                Py_XDECREF(rv);
+                throw Iex::InputExc("file read failed");
+            }
+            r = PyLong_AsSsize_t(rv);
+            Py_DECREF(rv);
+            if (r < 0 || r > n - got)
+                throw Iex::InputExc("file read failed");
+#endif
+        } else {
+            PyObject *data = PyObject_CallMethod(_fo, (char*)"read", (char*)"(n)", n - got);
+            if (data == NULL || PyString_AsString(data) == NULL) {
+                Py_XDECREF(data);
+                throw Iex::InputExc("file read failed");
+            }
+            r = PyString_Size(data);
+            if (r > n - got) {
+                Py_DECREF(data);
+                throw Iex::InputExc("file read failed");
+            }
+            memcpy(c + got, PyString_AsString(data), r);
+            Py_DECREF(data);
+        }
+        if (r == 0)
+            break;
+        got += r;
+        _fpos += r;
+    }
+    return got;
+}
+
 bool
 C_IStream::read (char c[], int n)
 {
-    PyObject *data = PyObject_CallMethod(_fo, (char*)"read", (char*)"(i)", n);
-    if (data != NULL && PyString_AsString(data) && PyString_Size(data) == (Py_ssize_t)n) {
-      memcpy(c, PyString_AsString(data), PyString_Size(data));
-      Py_DECREF(data);
+    // Whatever the buffer already holds
+    if (_pos >= _start && _pos < _end) {
+        Py_ssize_t k = std::min((PY_LONG_LONG)n, _end - _pos);
+        memcpy(c, &_buffer[_pos - _start], k);
+        c += k;
+        n -= k;
+        _pos += k;
+    }
+    if (n == 0)
+        return true;
+
+    AcquireGIL gil;
+    if (n >= (int)_buffer.size()) {
+        // Large reads bypass the buffer
+        Py_ssize_t got = fill(c, n);
+        _pos += got;
+        if (got != n)
+            throw Iex::InputExc("file read failed");
     } else {
-      throw Iex::InputExc("file read failed");
+        _start = _end = _pos;
+        _end += fill(&_buffer[0], _buffer.size());
+        if (_end - _pos < n)
+            throw Iex::InputExc("file read failed");
+        memcpy(c, &_buffer[0], n);
+        _pos += n;
     }
-    return 0;
+    return true;
 }
 
 const char* C_IStream::fileName() const
@@ -151,27 +380,13 @@ const char* C_IStream::fileName() const
 Int64
 C_IStream::tellg ()
 {
-    PyObject *rv = PyObject_CallMethod(_fo, (char*)"tell", NULL);
-    if (rv != NULL && PyNumber_Check(rv)) {
-      PyObject *lrv = PyNumber_Long(rv);
-      long long t = PyLong_AsLong(lrv);
-      Py_DECREF(lrv);
-      Py_DECREF(rv);
-      return (Int64)t;
-    } else {
-      throw Iex::InputExc("tell failed");
-    }
+    return _pos;
 }
 
 void
 C_IStream::seekg (Int64 pos)
 {
-    PyObject *data = PyObject_CallMethod(_fo, (char*)"seek", (char*)"(L)", pos);
-    if (data != NULL) {
-        Py_DECREF(data);
-    } else {
-      throw Iex::InputExc("seek failed");
-    }
+    _pos = pos;
 }
 
 void
@@ -181,31 +396,293 @@ C_IStream::clear ()
 
 ////////////////////////////////////////////////////////////////////////
 
+// Input stream over a read-only mapping of a whole file.  It is used
+// for filenames and for file objects with a fileno(), and never calls
+// back into Python.  Because isMemoryMapped() is true, the library
+// decompresses straight from the mapping instead of copying every
+// chunk into its own buffer first.
+
+class MMap_IStream: public IStream
+{
+  public:
+    static MMap_IStream *open (const char *filename);
+    static MMap_IStream *open (PyObject *fo);
+    virtual ~MMap_IStream ();
+    virtual bool    isMemoryMapped () const;
+    virtual char *  readMemoryMapped (int n);
+    virtual bool    read (char c[], int n);
+    virtual Int64   tellg ();
+    virtual void    seekg (Int64 pos);
+  private:
+    MMap_IStream (const char *fileName, char *base, PY_LONG_LONG size):
+        IStream(fileName), _base(base), _size(size), _pos(0) {}
+    static MMap_IStream *map (const char *fileName, int fd);
+    char *_base;
+    PY_LONG_LONG _size;
+    PY_LONG_LONG _pos;
+};
+
+// Maps the regular file open on fd.  Returns NULL if it cannot be
+// mapped, for example because it is a pipe or is empty, in which case
+// the caller falls back to reading it some other way.
+
+MMap_IStream *
+MMap_IStream::map (const char *fileName, int fd)
+{
+#ifdef USE_MMAP
+    struct stat st;
+    if (fstat(fd, &st) != 0 || !S_ISREG(st.st_mode) || st.st_size == 0)
+        return NULL;
+    void *base = mmap(NULL, st.st_size, PROT_READ, MAP_PRIVATE, fd, 0);
+    if (base == MAP_FAILED)
+        return NULL;
+    return new MMap_IStream(fileName, (char *)base, st.st_size);
+#else
+    return NULL;
+#endif
+}
+
+MMap_IStream *
+MMap_IStream::open (const char *filename)
+{
+#ifdef USE_MMAP
+    int fd = ::open(filename, O_RDONLY);
+    if (fd < 0)
+        return NULL;
+    MMap_IStream *r = map(filename, fd);
+    ::close(fd);
+    return r;
+#else
+    return NULL;
+#endif
+}
+
+// Returns true if fo reads an OS file directly, so that its fileno()
+// gives the bytes it reads: an io.FileIO, or a buffered reader over
+// one.  Wrappers such as gzip.GzipFile also have a fileno(), but it is
+// the fd of the compressed file.
+
+static bool isosfile(PyObject *fo)
+{
+#if PY_MAJOR_VERSION < 3
+    if (PyFile_Check(fo))
+        return true;
+#endif
+    PyObject *io = PyImport_ImportModule("io");
+    if (io == NULL)
+        return false;
+    PyObject *fileio = PyObject_GetAttrString(io, "FileIO");
+    PyObject *buffered = Py_BuildValue("(NN)",
+                                       PyObject_GetAttrString(io, "BufferedReader"),
+                                       PyObject_GetAttrString(io, "BufferedRandom"));
+    Py_DECREF(io);
+    bool r = false;
+    if (fileio != NULL && buffered != NULL) {
+        if (PyObject_IsInstance(fo, fileio) == 1) {
+            r = true;
+        } else if (PyObject_IsInstance(fo, buffered) == 1) {
+            PyObject *raw = PyObject_GetAttrString(fo, "raw");
+            r = raw != NULL && PyObject_IsInstance(raw, fileio) == 1;
+            Py_XDECREF(raw);
+        }
+    }
+    Py_XDECREF(fileio);
+    Py_XDECREF(buffered);
+    return r;
+}
+
+MMap_IStream *
+MMap_IStream::open (PyObject *fo)
+{
+    if (!isosfile(fo)) {
+        PyErr_Clear();
+        return NULL;
+    }
+    PyObject *pos = PyObject_CallMethod(fo, (char*)"tell", NULL);
+    long at = pos == NULL ? -1 : PyLong_AsLong(pos);
+    Py_XDECREF(pos);
+    if (at != 0) {
+        PyErr_Clear();
+        return NULL;
+    }
+    PyObject *rv = PyObject_CallMethod(fo, (char*)"fileno", NULL);
+    if (rv == NULL) {
+        PyErr_Clear();
+        return NULL;
+    }
+    int fd = PyLong_AsLong(rv);
+    Py_DECREF(rv);
+    if (fd == -1 && PyErr_Occurred()) {
+        PyErr_Clear();
+        return NULL;
+    }
+    return map("", fd);
+}
+
+MMap_IStream::~MMap_IStream ()
+{
+#ifdef USE_MMAP
+    munmap(_base, _size);
+#endif
+}
+
+bool
+MMap_IStream::isMemoryMapped () const
+{
+    return true;
+}
+
+char *
+MMap_IStream::readMemoryMapped (int n)
+{
+    if (n < 0 || _pos + n > _size)
+        throw Iex::InputExc("Unexpected end of file.");
+    char *r = _base + _pos;
+    _pos += n;
+    return r;
+}
+
+bool
+MMap_IStream::read (char c[], int n)
+{
+    memcpy(c, readMemoryMapped(n), n);
+    return _pos < _size;
+}
+
+Int64
+MMap_IStream::tellg ()
+{
+    return _pos;
+}
+
+void
+MMap_IStream::seekg (Int64 pos)
+{
+    _pos = pos;
+}
+
+////////////////////////////////////////////////////////////////////////
+
+// Output stream over a Python file object.  Writes are gathered into
+// blocks of streamBufferSize bytes, and each block is passed to the
+// object's write method in one call.  The position is tracked here, so
+// tellp and seekp do not call Python.  A write after seekp lands in the
+// buffer if it falls inside it, as when the library goes back to fill in
+// an offset table it has just written; otherwise the buffer is flushed
+// and the object is seeked first.  flush() must be called once the
+// library has finished with the stream.
+
 class C_OStream: public OStream
 {
   public:
-    C_OStream (PyObject *fo): OStream(""), _fo(fo) {}
+    C_OStream (PyObject *fo);
     virtual void    write (const char *c, int n);
     virtual Int64   tellp ();
     virtual void    seekp (Int64 pos);
     virtual void    clear ();
     virtual const char*     fileName() const;
+    void            flush ();
+    long            callbacks () const { return _callbacks; }
   private:
+    void            put (const char *c, Py_ssize_t n);
+    void            flushbuffer ();
     PyObject *_fo;
+    std::vector<char> _buffer;
+    size_t _capacity;
+    PY_LONG_LONG _start;     // file position of _buffer[0]
+    PY_LONG_LONG _pos;       // position of the next write
+    PY_LONG_LONG _fpos;      // position of the Python file object
+    long _callbacks;  // number of calls made on the Python file object
 };
 
+C_OStream::C_OStream (PyObject *fo):
+    OStream(""), _fo(fo), _capacity(streamBufferSize),
+    _start(0), _pos(0), _fpos(0), _callbacks(1)
+{
+    _buffer.reserve(_capacity);
+    PyObject *rv = PyObject_CallMethod(_fo, (char*)"tell", NULL);
+    if (rv != NULL) {
+        _pos = _fpos = _start = PyLong_AsLongLong(rv);
+        Py_DECREF(rv);
+    }
+    if (PyErr_Occurred()) {
+        PyErr_Clear();
+        _pos = _start = 0;
+        _fpos = -1;
+    }
+}
+
+// Writes n bytes at _start, seeking the Python object first if needed.
+// Must be called with the GIL.
+
+void
+C_OStream::put (const char *c, Py_ssize_t n)
+{
+    if (_fpos != _start) {
+        _callbacks++;
+        PyObject *data = PyObject_CallMethod(_fo, (char*)"seek", (char*)"(L)", (PY_LONG_LONG)_start);
+        if (data == NULL)
+            throw Iex::IoExc("seek failed");
+        Py_DECREF(data);
+        _fpos = _start;
+    }
+    PyObject *data = PyString_FromStringAndSize(c, n);
+    if (data == NULL)
+        throw Iex::IoExc("file write failed");
+    _callbacks++;
+    PyObject *rv = PyObject_CallMethod(_fo, (char*)"write", (char*)"(O)", data);
+    Py_DECREF(data);
+    if (rv == NULL)
+        throw Iex::IoExc("file write failed");
+    Py_DECREF(rv);
+    _fpos += n;
+}
+
+// Writes out the buffer and starts a new one at _pos.  Must be called
+// with the GIL.
+
+void
+C_OStream::flushbuffer ()
+{
+    if (!_buffer.empty()) {
+        put(&_buffer[0], _buffer.size());
+        _buffer.clear();
+    }
+    _start = _pos;
+}
 
 void
 C_OStream::write (const char*c, int n)
 {
-    PyObject *data = PyObject_CallMethod(_fo, (char*)"write", (char*)"(s#)", c, n);
-    if (data != NULL) {
-      Py_DECREF(data);
+    PY_LONG_LONG offset = _pos - _start;
+    if (offset >= 0 && offset <= (PY_LONG_LONG)_buffer.size() && offset + n <= (PY_LONG_LONG)_capacity) {
+        if (offset + n > (PY_LONG_LONG)_buffer.size())
+            _buffer.resize(offset + n);
+        memcpy(&_buffer[offset], c, n);
+        _pos += n;
+        return;
+    }
+
+    AcquireGIL gil;
+    flushbuffer();
+    if ((size_t)n >= _capacity) {
+        // Large writes bypass the buffer
+        put(c, n);
+        _pos += n;
+        _start = _pos;
     } else {
-      throw Iex::InputExc("file write failed");
+        _buffer.assign(c, c + n);
+        _pos += n;
     }
 }
 
+void
+C_OStream::flush ()
+{
+    AcquireGIL gil;
+    flushbuffer();
+}
+
 const char* C_OStream::fileName() const
 {
   return "xxx";
@@ -215,27 +692,13 @@ const char* C_OStream::fileName() const
 Int64
 C_OStream::tellp ()
 {
-    PyObject *rv = PyObject_CallMethod(_fo, (char*)"tell", NULL);
-    if (rv != NULL && PyNumber_Check(rv)) {
-      PyObject *lrv = PyNumber_Long(rv);
-      long long t = PyLong_AsLong(lrv);
-      Py_DECREF(lrv);
-      Py_DECREF(rv);
-      return (Int64)t;
-    } else {
-      throw Iex::InputExc("tell failed");
-    }
+    return _pos;
 }
 
 void
 C_OStream::seekp (Int64 pos)
 {
-    PyObject *data = PyObject_CallMethod(_fo, (char*)"seek", (char*)"(L)", pos);
-    if (data != NULL) {
-        Py_DECREF(data);
-    } else {
-      throw Iex::InputExc("seek failed");
-    }
+    _pos = pos;
 }
 
 void
@@ -264,712 +727,3023 @@ size_t compute_typesize(PixelType pt)
   }
 }
 
+static void releaseviews(std::vector<Py_buffer> &views)
+{
+    for (size_t i=0; i < views.size(); i++)
+        PyBuffer_Release(&views[i]);
+}
+
+// Converts an Imath.PixelType object to a PixelType.  Returns false with
+// a Python exception set if the object is not a valid PixelType.
+
+static bool pixeltype_from_object(PyObject *pixel_type, PixelType &pt)
+{
+    PyObject *v = PyObject_GetAttrString(pixel_type, "v");
+    if (v == NULL) {
+        PyErr_SetString(PyExc_TypeError, "Invalid PixelType object");
+        return false;
+    }
+    pt = PixelType(PyLong_AsLong(v));
+    Py_DECREF(v);
+    if (pt != HALF && pt != FLOAT && pt != UINT) {
+        PyErr_SetString(PyExc_TypeError, "Unknown type");
+        return false;
+    }
+    return true;
+}
+
 ////////////////////////////////////////////////////////////////////////
-//    TiledInputFile
+//    Reading into caller-supplied buffers
 ////////////////////////////////////////////////////////////////////////
 
-typedef struct {
-    PyObject_HEAD
-    TiledInputFile i;
-    PyObject *fo;
-    C_IStream *istream;
-    int is_opened;
-} TiledInputFileC;
+// Inserts a slice for channel cname that decodes straight into the
+// writable buffer object, which must hold width x height samples of
+// type pt.  Any C-contiguous buffer of exactly the right size is
+// accepted, as is a strided two-dimensional buffer of shape
+// (height, width), such as a numpy view.  (ox, oy) is the pixel that
+// lands in the first element of the buffer.  On success the buffer view
+// is appended to views, and must be released after reading.
+
+static bool insertbufferslice(FrameBuffer &frameBuffer,
+                              std::vector<Py_buffer> &views,
+                              PyObject *buffer,
+                              const char *cname,
+                              PixelType pt,
+                              int ox, int oy,
+                              int width, int height,
+                              int xSampling, int ySampling)
+{
+    size_t typeSize = compute_typesize(pt);
+    Py_buffer view;
 
-static PyObject *channel_tiled(PyObject *self, PyObject *args, PyObject *kw)
+    if (PyObject_GetBuffer(buffer, &view, PyBUF_WRITABLE | PyBUF_STRIDES) != 0) {
+        PyErr_Format(PyExc_TypeError, "Buffer for channel '%s' must be writable and support buffer protocol", cname);
+        return false;
+    }
+
+    Py_ssize_t xstride, ystride;
+    if (PyBuffer_IsContiguous(&view, 'C')) {
+        Py_ssize_t expectedSize = typeSize * width * height;
+        if (view.len != expectedSize) {
+            PyBuffer_Release(&view);
+            PyErr_Format(PyExc_TypeError, "Buffer for channel '%s' should have size %zd but got %zd", cname, expectedSize, view.len);
+            return false;
+        }
+        xstride = typeSize;
+        ystride = typeSize * width;
+    } else if (view.ndim == 2 &&
+               view.itemsize == (Py_ssize_t)typeSize &&
+               view.shape[0] == height &&
+               view.shape[1] == width) {
+        xstride = view.strides[1];
+        ystride = view.strides[0];
+    } else {
+        PyBuffer_Release(&view);
+        PyErr_Format(PyExc_TypeError, "Buffer for channel '%s' must be contiguous, or have shape (%d, %d) and item size %zu", cname, height, width, typeSize);
+        return false;
+    }
+    views.push_back(view);
+
+    frameBuffer.insert(cname,
+                       Slice(pt,
+                             (char *)view.buf - (ox / xSampling) * xstride - (oy / ySampling) * ystride,
+                             xstride,
+                             ystride,
+                             xSampling, ySampling,
+                             0.0));
+    return true;
+}
+
+// Converts the channel names given to channels_into or
+// channels_interleaved to strings.  Returns false with an exception set.
+
+static bool channelnames(PyObject *cnames, std::vector<std::string> &names)
 {
-    if (!((TiledInputFileC *)self)->is_opened) {
-	PyErr_SetString(PyExc_OSError, "cannot read from closed file");
-	return NULL;
+    PyObject *nseq = PySequence_Fast(cnames, "Channel list must be iterable");
+    if (nseq == NULL)
+        return false;
+    Py_ssize_t n = PySequence_Fast_GET_SIZE(nseq);
+    for (Py_ssize_t i = 0; i < n; i++) {
+        PyObject *item = PySequence_Fast_GET_ITEM(nseq, i);
+        const char *cname = PyUnicode_Check(item) ? PyUTF8_AsSstring(item) : PyString_AsString(item);
+        if (cname == NULL) {
+            Py_DECREF(nseq);
+            return false;
+        }
+        names.push_back(cname);
     }
-    TiledInputFile *file = &((TiledInputFileC *)self)->i;
+    Py_DECREF(nseq);
+    return true;
+}
 
-    Box2i dw = file->header().dataWindow();
+// Pairs up the channel names and buffers given to channels_into, which
+// must have the same length.  Returns false with an exception set.
 
-    int numXTiles = file->numXTiles();
-    int numYTiles = file->numYTiles();
+static bool namesandbuffers(PyObject *cnames, PyObject *buffers,
+                            std::vector<std::string> &names,
+                            std::vector<PyObject *> &bufs)
+{
+    if (!channelnames(cnames, names))
+        return false;
+    PyObject *bseq = PySequence_Fast(buffers, "Buffer list must be a sequence");
+    if (bseq == NULL)
+        return false;
+    Py_ssize_t n = names.size();
+    if (PySequence_Fast_GET_SIZE(bseq) != n) {
+        PyErr_Format(PyExc_TypeError, "Got %zd channel names but %zd buffers", n, PySequence_Fast_GET_SIZE(bseq));
+        Py_DECREF(bseq);
+        return false;
+    }
+    for (Py_ssize_t i = 0; i < n; i++)
+        bufs.push_back(PySequence_Fast_GET_ITEM(bseq, i));
+    Py_DECREF(bseq);
+    return true;
+}
 
-    int tileXSize = file->tileXSize();
-    int tileYSize = file->tileYSize();
+// Checks a scan line range against the data window.  Returns false with
+// an exception set.
 
-    int tile_minx=0;
-    int tile_miny=0;
-    int tile_maxx=numXTiles-1;
-    int tile_maxy=numYTiles-1;
+static bool checkscanlines(const Box2i &dw, int miny, int maxy)
+{
+    if (maxy < miny) {
+        PyErr_SetString(PyExc_TypeError, "scanLine1 must be <= scanLine2");
+        return false;
+    }
+    if (miny < dw.min.y) {
+        PyErr_SetString(PyExc_TypeError, "scanLine1 cannot be outside dataWindow");
+        return false;
+    }
+    if (maxy > dw.max.y) {
+        PyErr_SetString(PyExc_TypeError, "scanLine2 cannot be outside dataWindow");
+        return false;
+    }
+    return true;
+}
 
-    char *cname;
-    PyObject *pixel_type = NULL;
-    char *keywords[] = { (char*)"cname", (char*)"pixel_type", (char*)"tilex_min", (char*)"tilex_max", (char*) "tiley_min", (char*) "tiley_max", NULL };
-    if (!PyArg_ParseTupleAndKeywords(args, kw, "s|Oiiii", keywords, &cname, &pixel_type, &tile_minx, &tile_maxx, &tile_miny, &tile_maxy))
-        return NULL;
+// Checks that a tile range is not empty.  Returns false with an
+// exception set.
 
+static bool checktiles(int tile_minx, int tile_maxx, int tile_miny, int tile_maxy)
+{
     if (tile_maxy < tile_miny) {
 	PyErr_SetString(PyExc_TypeError, "TileY_max must be >= TileY_min");
-	return NULL;
+	return false;
     }
     if (tile_maxx < tile_minx) {
 	PyErr_SetString(PyExc_TypeError, "TileX_max must be >= TileX_min");
-	return NULL;
+	return false;
     }
+    return true;
+}
+
+// Checks a range of tiles of level (lx, ly) of a TiledInputFile or
+// TiledOutputFile, and sets box to the pixels that it covers.  Returns
+// false with an exception set.
 
-    ChannelList channels = file->header().channels();
-    Channel *channelPtr = channels.findChannel(cname);
-    if (channelPtr == NULL) {
-        return PyErr_Format(PyExc_TypeError, "There is no channel '%s' in the image", cname);
+template <class F>
+static bool tilerange(F &file,
+                      int tile_minx, int tile_maxx,
+                      int tile_miny, int tile_maxy,
+                      int lx, int ly, Box2i &box)
+{
+    if (!checktiles(tile_minx, tile_maxx, tile_miny, tile_maxy))
+        return false;
+    if (!file.isValidLevel(lx, ly)) {
+        PyErr_Format(PyExc_TypeError, "There is no level (%d, %d) in the image", lx, ly);
+        return false;
+    }
+    if (tile_minx < 0 || tile_maxx >= file.numXTiles(lx) ||
+        tile_miny < 0 || tile_maxy >= file.numYTiles(ly)) {
+        PyErr_SetString(PyExc_TypeError, "Tile range is outside the image");
+        return false;
     }
+    box.min = file.dataWindowForTile(tile_minx, tile_miny, lx, ly).min;
+    box.max = file.dataWindowForTile(tile_maxx, tile_maxy, lx, ly).max;
+    return true;
+}
+
+// Converts an Imath.Box2i pixel window to a Box2i.  Returns false with
+// an exception set.
 
-    Imf::PixelType pt;
-    if (pixel_type != NULL) {
-        if (PyObject_GetAttrString(pixel_type,"v") == NULL) {
-            return PyErr_Format(PyExc_TypeError, "Invalid PixelType object");
+static bool window_from_object(PyObject *o, Box2i &box)
+{
+    PyObject *corners[2] = { PyObject_GetAttrString(o, "min"), PyObject_GetAttrString(o, "max") };
+    int v[4];
+    bool ok = corners[0] != NULL && corners[1] != NULL;
+    for (int i = 0; ok && i < 4; i++) {
+        PyObject *c = PyObject_GetAttrString(corners[i / 2], (i & 1) ? "y" : "x");
+        ok = (c != NULL);
+        if (ok) {
+            v[i] = (int)PyLong_AsLong(c);
+            Py_DECREF(c);
+            ok = !PyErr_Occurred();
         }
-        pt = PixelType(PyLong_AsLong(PyObject_StealAttrString(pixel_type, "v")));
-    } else {
-        pt = channelPtr->type;
     }
+    Py_XDECREF(corners[0]);
+    Py_XDECREF(corners[1]);
+    if (!ok) {
+        PyErr_Clear();
+        PyErr_SetString(PyExc_TypeError, "window must be an Imath.Box2i");
+        return false;
+    }
+    box = Box2i(V2i(v[0], v[1]), V2i(v[2], v[3]));
+    return true;
+}
 
-    int xSampling = channelPtr->xSampling;
-    int ySampling = channelPtr->ySampling;
+// Converts the optional window argument o, which is NULL or None if it
+// was not given, into box.  Sets window to &box, or to NULL if there is
+// no window.  Returns false with an exception set.
 
-    int width = std::min((tile_maxx+1)*tileXSize, dw.max.x - dw.min.x + 1) - tile_minx * tileXSize;
-    int height = std::min((tile_maxy+1)*tileYSize, dw.max.y - dw.min.y + 1) - tile_miny * tileYSize;
-    width /= xSampling;
-    height /= ySampling;
+static bool windowarg(PyObject *o, Box2i &box, const Box2i *&window)
+{
+    window = NULL;
+    if (o == NULL || o == Py_None)
+        return true;
+    if (!window_from_object(o, box))
+        return false;
+    window = &box;
+    return true;
+}
 
-    size_t typeSize = compute_typesize(pt);
-    
-    PyObject *r = PyString_FromStringAndSize(NULL, typeSize * width * height);
+// Checks that a pixel window is non-empty and inside limits, the data
+// window of the image or level.  Returns false with an exception set.
 
-    char *pixels = PyString_AsString(r);
+static bool checkwindow(const Box2i &limits, const Box2i &window)
+{
+    if (window.isEmpty()) {
+        PyErr_SetString(PyExc_TypeError, "window must have min <= max");
+        return false;
+    }
+    if (window.min.x < limits.min.x || window.max.x > limits.max.x ||
+        window.min.y < limits.min.y || window.max.y > limits.max.y) {
+        PyErr_SetString(PyExc_TypeError, "window cannot be outside dataWindow");
+        return false;
+    }
+    return true;
+}
 
-    try
-    {
-        FrameBuffer frameBuffer;
-        size_t xstride = typeSize;
-        size_t ystride = typeSize * width;
-        frameBuffer.insert(cname,
-                           Slice(pt,
-                                 pixels - (dw.min.x + tile_minx * tileXSize) * xstride / xSampling - (dw.min.y + tile_miny * tileYSize) * ystride / ySampling,
-                                 xstride,
-                                 ystride,
-                                 xSampling, ySampling,
-                                 0.0));
-        file->setFrameBuffer(frameBuffer);
-	file->readTiles(tile_minx, tile_maxx, tile_miny, tile_maxy);
-	return r;
-    }
-    catch (const std::exception &e)
-    {
-       PyErr_SetString(PyExc_OSError, e.what());
-       return NULL;
-    }
+// Sets box to the pixels that a scan line read covers: the window if
+// one is given, otherwise lines miny..maxy of the data window.  Returns
+// false with an exception set.
 
-    return r;
+static bool scanlinebox(const Box2i &dw, int miny, int maxy,
+                        const Box2i *window, Box2i &box)
+{
+    if (window != NULL) {
+        if (!checkwindow(dw, *window))
+            return false;
+        box = *window;
+        return true;
+    }
+    if (!checkscanlines(dw, miny, maxy))
+        return false;
+    box = Box2i(V2i(dw.min.x, miny), V2i(dw.max.x, maxy));
+    return true;
 }
 
-static PyObject *channels_tiled(PyObject *self, PyObject *args, PyObject *kw)
+// Sets box to the pixels that a read of level (lx, ly) covers: the
+// window if one is given, otherwise the tile range.  Returns false with
+// an exception set.
+
+template <class F>
+static bool tilebox(F &file,
+                    int tile_minx, int tile_maxx,
+                    int tile_miny, int tile_maxy,
+                    int lx, int ly, const Box2i *window, Box2i &box)
 {
-    if (!((TiledInputFileC *)self)->is_opened) {
-	PyErr_SetString(PyExc_OSError, "cannot read from closed file");
-	return NULL;
+    if (window == NULL)
+        return tilerange(file, tile_minx, tile_maxx, tile_miny, tile_maxy, lx, ly, box);
+    if (!file.isValidLevel(lx, ly)) {
+        PyErr_Format(PyExc_TypeError, "There is no level (%d, %d) in the image", lx, ly);
+        return false;
     }
-    TiledInputFile *file = &((TiledInputFileC *)self)->i;
+    if (!checkwindow(file.dataWindowForLevel(lx, ly), *window))
+        return false;
+    box = *window;
+    return true;
+}
 
-    Box2i dw = file->header().dataWindow();
+// Window reads copy pixel by pixel, so they do not handle subsampled
+// channels.  Returns false with an exception set.
 
-    int numXTiles = file->numXTiles();
-    int numYTiles = file->numYTiles();
+static bool checkwindowsampling(const FrameBuffer &frameBuffer)
+{
+    for (FrameBuffer::ConstIterator i = frameBuffer.begin(); i != frameBuffer.end(); ++i) {
+        if (i.slice().xSampling != 1 || i.slice().ySampling != 1) {
+            PyErr_Format(PyExc_TypeError, "Channel '%s' is subsampled, so it cannot be read with a window", i.name());
+            return false;
+        }
+    }
+    return true;
+}
 
-    int tileXSize = file->tileXSize();
-    int tileYSize = file->tileYSize();
+// Band policies for readwindow.  A scan line file is read in bands of
+// up to 256 lines, aligned so that no compressed block of lines is
+// split between bands.  A tiled file is read one row of tiles at a
+// time, covering only the tiles that the window touches.
 
-    int tile_minx=0;
-    int tile_miny=0;
-    int tile_maxx=numXTiles-1;
-    int tile_maxy=numYTiles-1;
+struct ScanLineBands
+{
+    Box2i dw;
 
-    PyObject *clist;
-    PyObject *pixel_type = NULL;
-    char *keywords[] = { (char*)"cnames", (char*)"pixel_type", (char*)"tilex_min", (char*)"tilex_max", (char*) "tiley_min", (char*) "tiley_max", NULL };
-    if (!PyArg_ParseTupleAndKeywords(args, kw, "O|Oiiii", keywords, &clist, &pixel_type, &tile_minx, &tile_maxx, &tile_miny, &tile_maxy))
-	return NULL;
-    if (tile_maxy < tile_miny) {
-	PyErr_SetString(PyExc_TypeError, "TileY_max must be >= TileY_min");
-	return NULL;
+    ScanLineBands(const Box2i &dw) : dw(dw) {}
+
+    Box2i band(const Box2i &window, int y) const
+    {
+        int end = dw.min.y + ((y - dw.min.y) / 256 + 1) * 256 - 1;
+        return Box2i(V2i(dw.min.x, y), V2i(dw.max.x, std::min(end, window.max.y)));
     }
-    if (tile_maxx < tile_minx) {
-	PyErr_SetString(PyExc_TypeError, "TileX_max must be >= TileX_min");
-	return NULL;
+
+    template <class F>
+    void read(F &file, const Box2i &band) const
+    {
+        file.readPixels(band.min.y, band.max.y);
     }
+};
 
-    ChannelList channels = file->header().channels();
-    FrameBuffer frameBuffer;
+template <class F>
+struct TileBands
+{
+    F &file;
+    int lx, ly;
+    Box2i dw;
 
-    int width = std::min((tile_maxx+1)*tileXSize, dw.max.x - dw.min.x + 1) - tile_minx * tileXSize;
-    int height = std::min((tile_maxy+1)*tileYSize, dw.max.y - dw.min.y + 1) - tile_miny * tileYSize;
+    TileBands(F &file, int lx, int ly)
+        : file(file), lx(lx), ly(ly), dw(file.header().dataWindow()) {}
 
-    PyObject *retval = PyList_New(0);
-    PyObject *iterator = PyObject_GetIter(clist);
+    int tilex(int x) const { return (x - dw.min.x) / file.tileXSize(); }
+    int tiley(int y) const { return (y - dw.min.y) / file.tileYSize(); }
 
-    if (iterator == NULL) {
-	PyErr_SetString(PyExc_TypeError, "Channel list must be iterable");
-	return NULL;
+    Box2i band(const Box2i &window, int y) const
+    {
+        return Box2i(file.dataWindowForTile(tilex(window.min.x), tiley(y), lx, ly).min,
+                     file.dataWindowForTile(tilex(window.max.x), tiley(y), lx, ly).max);
     }
 
-    PyObject *item;
-
-    while ((item = PyIter_Next(iterator)) != NULL) {
-	char *cname = PyUTF8_AsSstring(item);
-	Channel *channelPtr = channels.findChannel(cname);
-	if (channelPtr == NULL) {
-	    return PyErr_Format(PyExc_TypeError, "There is no channel '%s' in the image", cname);
-	}
-
-	Imf::PixelType pt;
-	if (pixel_type != NULL) {
-	    pt = PixelType(PyLong_AsLong(PyObject_StealAttrString(pixel_type, "v")));
-	} else {
-	    pt = channelPtr->type;
-	}
-
-	// Use pt to compute typeSize
-	size_t typeSize = compute_typesize(pt);
-	if (typeSize < 0) {
-	    PyErr_SetString(PyExc_TypeError, "Unknown type");
-	    return NULL;
-	}
+    void read(F &, const Box2i &band) const
+    {
+        file.readTiles(tilex(band.min.x), tilex(band.max.x),
+                       tiley(band.min.y), tiley(band.min.y), lx, ly);
+    }
+};
 
-	size_t xstride = typeSize;
-	size_t ystride = typeSize * width;
-
-	PyObject *r = PyString_FromStringAndSize(NULL, typeSize * width * height);
-	PyList_Append(retval, r);
-	Py_DECREF(r);
-	char *pixels = PyString_AsString(r);
-
-	try
-	    {
-		frameBuffer.insert(
-				   cname,
-				   Slice(
-					 pt,
-					 pixels - (dw.min.x + tile_minx * tileXSize) * xstride - (dw.min.y + tile_miny * tileYSize) * ystride,
-					 xstride,
-					 ystride,
-					 1,
-					 1,
-					 0.0
-					 ));
-	    }
-	catch (const std::exception &e)
-	    {
-		PyErr_SetString(PyExc_OSError, e.what());
-		return NULL;
-	    }
-	Py_DECREF(item);
-    }
-    Py_DECREF(iterator);
-    file->setFrameBuffer(frameBuffer);
-    try
-	{
-	    file->readTiles(tile_minx, tile_maxx, tile_miny, tile_maxy);
-	}
-    catch (const std::exception &e)
-	{
-	    PyErr_SetString(PyExc_OSError, e.what());
-	    return NULL;
-	}
-    return retval;
-}
+// Decodes the pixels of window into the slices of target, which are
+// addressed by absolute pixel position like any frame buffer.  The
+// library decodes whole lines or tiles, so each band of the window is
+// decoded into scratch buffers and the window's columns copied out.
+// Called without the GIL.
 
-static PyObject *inclose_tiled(PyObject *self, PyObject *args)
+template <class F, class B>
+static void readwindow(F &file, const B &bands, const FrameBuffer &target, const Box2i &window)
 {
-    TiledInputFileC *pc = ((TiledInputFileC *)self);
-    if (pc->is_opened) {
-	pc->is_opened = 0;
-	TiledInputFile *file = &((TiledInputFileC *)self)->i;
-	file->~TiledInputFile();
+    std::vector<std::vector<char> > scratch;
+    Box2i band;
+    for (int y = window.min.y; y <= window.max.y; y = band.max.y + 1) {
+        band = bands.band(window, y);
+        size_t width = band.max.x - band.min.x + 1;
+        size_t height = band.max.y - band.min.y + 1;
+
+        FrameBuffer frameBuffer;
+        size_t c = 0;
+        for (FrameBuffer::ConstIterator i = target.begin(); i != target.end(); ++i, ++c) {
+            size_t typeSize = compute_typesize(i.slice().type);
+            if (scratch.size() <= c)
+                scratch.resize(c + 1);
+            scratch[c].resize(typeSize * width * height);
+            frameBuffer.insert(i.name(),
+                               Slice(i.slice().type,
+                                     &scratch[c][0] - band.min.x * (ptrdiff_t)typeSize - band.min.y * (ptrdiff_t)(typeSize * width),
+                                     typeSize,
+                                     typeSize * width,
+                                     1, 1,
+                                     i.slice().fillValue));
+        }
+        file.setFrameBuffer(frameBuffer);
+        bands.read(file, band);
+
+        int y0 = std::max(band.min.y, window.min.y);
+        int y1 = std::min(band.max.y, window.max.y);
+        c = 0;
+        for (FrameBuffer::ConstIterator i = target.begin(); i != target.end(); ++i, ++c) {
+            const Slice &slice = i.slice();
+            size_t typeSize = compute_typesize(slice.type);
+            size_t n = window.max.x - window.min.x + 1;
+            for (int yy = y0; yy <= y1; yy++) {
+                const char *src = &scratch[c][typeSize * ((yy - band.min.y) * width + (window.min.x - band.min.x))];
+                char *dst = slice.base + yy * (ptrdiff_t)slice.yStride + window.min.x * (ptrdiff_t)slice.xStride;
+                if (slice.xStride == typeSize) {
+                    memcpy(dst, src, typeSize * n);
+                } else {
+                    for (size_t x = 0; x < n; x++)
+                        memcpy(dst + x * slice.xStride, src + x * typeSize, typeSize);
+                }
+            }
+        }
     }
-    Py_RETURN_NONE;
 }
 
-static PyObject *tiles_x(PyObject *self, PyObject *args)
+// Decodes box of a scan line file into frameBuffer, directly if it
+// spans the whole data window dw, otherwise through readwindow.
+
+template <class F>
+static void decodescanlines(F &file, const Box2i &dw, const FrameBuffer &frameBuffer, const Box2i &box)
 {
-    int level = 0;
-    if (!PyArg_ParseTuple(args, "|i", &level))
-	return NULL;
-    if (!((TiledInputFileC *)self)->is_opened) {
-	PyErr_SetString(PyExc_OSError, "file is closed");
-	return NULL;
+    if (box.min.x == dw.min.x && box.max.x == dw.max.x) {
+        file.setFrameBuffer(frameBuffer);
+        file.readPixels(box.min.y, box.max.y);
+    } else {
+        readwindow(file, ScanLineBands(dw), frameBuffer, box);
     }
-    TiledInputFile *file = &((TiledInputFileC *)self)->i;
-    int n;
-    try
-	{
-	    n = file->numXTiles(level);
-	}
-    catch (const std::exception &e)
-	{
-	    PyErr_SetString(PyExc_OSError, e.what());
-	    return NULL;
-	}
-    return PyLong_FromLong(n);
 }
 
-static PyObject *tiles_y(PyObject *self, PyObject *args)
+// Decodes a tile range, or the window if one is given, of level
+// (lx, ly) into frameBuffer.
+
+template <class F>
+static void decodetiles(F &file, const FrameBuffer &frameBuffer,
+                        int tile_minx, int tile_maxx,
+                        int tile_miny, int tile_maxy,
+                        int lx, int ly, const Box2i *window)
 {
-    int level = 0;
-    if (!PyArg_ParseTuple(args, "|i", &level))
-	return NULL;
-    if (!((TiledInputFileC *)self)->is_opened) {
-	PyErr_SetString(PyExc_OSError, "file is closed");
-	return NULL;
+    if (window != NULL) {
+        readwindow(file, TileBands<F>(file, lx, ly), frameBuffer, *window);
+    } else {
+        file.setFrameBuffer(frameBuffer);
+        file.readTiles(tile_minx, tile_maxx, tile_miny, tile_maxy, lx, ly);
     }
-    TiledInputFile *file = &((TiledInputFileC *)self)->i;
-    int n;
-    try
-	{
-	    n = file->numYTiles(level);
-	}
-    catch (const std::exception &e)
-	{
-	    PyErr_SetString(PyExc_OSError, e.what());
-	    return NULL;
-	}
-    return PyLong_FromLong(n);
 }
 
-static PyObject *isComplete_tiled(PyObject *self, PyObject *args)
+// Inserts slices that decode box of the named channels into the
+// buffers.  On failure the views are released and false is returned
+// with an exception set.
+
+static bool insertscanlineslices(FrameBuffer &frameBuffer,
+                                 std::vector<Py_buffer> &views,
+                                 const Header &header,
+                                 std::vector<std::string> &names,
+                                 std::vector<PyObject *> &bufs,
+                                 PyObject *pixel_type, const Box2i &box,
+                                 bool windowed)
 {
-    TiledInputFile *file = &((TiledInputFileC *)self)->i;
-    return PyBool_FromLong(file->isComplete());
-}
+    const ChannelList &channels = header.channels();
 
-////////////////////////////////////////////////////////////////////////
-//    InputFile
-////////////////////////////////////////////////////////////////////////
+    for (size_t i = 0; i < names.size(); i++) {
+        const char *cname = names[i].c_str();
+        const Channel *channelPtr = channels.findChannel(cname);
+        if (channelPtr == NULL) {
+            releaseviews(views);
+            PyErr_Format(PyExc_TypeError, "There is no channel '%s' in the image", cname);
+            return false;
+        }
 
-typedef struct {
-    PyObject_HEAD
-    InputFile i;
-    PyObject *fo;
-    C_IStream *istream;
-    int is_opened;
-} InputFileC;
+        Imf::PixelType pt = channelPtr->type;
+        if (pixel_type != NULL && !pixeltype_from_object(pixel_type, pt)) {
+            releaseviews(views);
+            return false;
+        }
 
-static PyObject *channel(PyObject *self, PyObject *args, PyObject *kw)
-{
-    if (!((InputFileC *)self)->is_opened) {
-	PyErr_SetString(PyExc_OSError, "cannot read from closed file");
-	return NULL;
+        int xSampling = channelPtr->xSampling;
+        int ySampling = channelPtr->ySampling;
+        int width  = (box.max.x - box.min.x + 1) / xSampling;
+        int height = (box.max.y - box.min.y + 1) / ySampling;
+
+        if (!insertbufferslice(frameBuffer, views, bufs[i], cname, pt,
+                               box.min.x, box.min.y, width, height,
+                               xSampling, ySampling)) {
+            releaseviews(views);
+            return false;
+        }
     }
-    InputFile *file = &((InputFileC *)self)->i;
+    if (windowed && !checkwindowsampling(frameBuffer)) {
+        releaseviews(views);
+        return false;
+    }
+    return true;
+}
 
-    Box2i dw = file->header().dataWindow();
-    int miny, maxy;
+// Decodes scan lines miny..maxy, or the window if one is given, of the
+// named channels into the buffers, for an InputFile or an InputPart.
 
-    miny = dw.min.y;
-    maxy = dw.max.y;
+template <class F>
+static bool readscanlinesinto(F &file, const Header &header, FileLock *lock,
+                              std::vector<std::string> &names,
+                              std::vector<PyObject *> &bufs,
+                              PyObject *pixel_type, int miny, int maxy,
+                              const Box2i *window = NULL)
+{
+    Box2i dw = header.dataWindow();
+    Box2i box;
+    if (!scanlinebox(dw, miny, maxy, window, box))
+        return false;
 
-    char *cname;
-    PyObject *pixel_type = NULL;
-    char *keywords[] = { (char*)"cname", (char*)"pixel_type", (char*)"scanLine1", (char*)"scanLine2", NULL };
-    if (!PyArg_ParseTupleAndKeywords(args, kw, "s|Oii", keywords, &cname, &pixel_type, &miny, &maxy))
-        return NULL;
+    FrameBuffer frameBuffer;
+    std::vector<Py_buffer> views;
+    if (!insertscanlineslices(frameBuffer, views, header, names, bufs, pixel_type, box, window != NULL))
+        return false;
 
-    if (maxy < miny) {
-        PyErr_SetString(PyExc_TypeError, "scanLine1 must be <= scanLine2");
-        return NULL;
-    }
-    if (miny < dw.min.y) {
-        PyErr_SetString(PyExc_TypeError, "scanLine1 cannot be outside dataWindow");
-        return NULL;
+    try
+    {
+        ReleaseGIL nogil(lock);
+        decodescanlines(file, dw, frameBuffer, box);
     }
-    if (maxy > dw.max.y) {
-        PyErr_SetString(PyExc_TypeError, "scanLine2 cannot be outside dataWindow");
-        return NULL;
+    catch (const std::exception &e)
+    {
+        releaseviews(views);
+        PyErr_SetString(PyExc_OSError, e.what());
+        return false;
     }
+    releaseviews(views);
+    return true;
+}
 
-    ChannelList channels = file->header().channels();
-    Channel *channelPtr = channels.findChannel(cname);
-    if (channelPtr == NULL) {
-        return PyErr_Format(PyExc_TypeError, "There is no channel '%s' in the image", cname);
-    }
+// Decodes the tile range, or the window if one is given, of level
+// (lx, ly) of the named channels into the buffers, for a TiledInputFile.
+
+template <class F>
+static bool readtilesinto(F &file, FileLock *lock,
+                          std::vector<std::string> &names,
+                          std::vector<PyObject *> &bufs,
+                          PyObject *pixel_type,
+                          int tile_minx, int tile_maxx,
+                          int tile_miny, int tile_maxy,
+                          int lx, int ly,
+                          const Box2i *window = NULL)
+{
+    Box2i box;
+    if (!tilebox(file, tile_minx, tile_maxx, tile_miny, tile_maxy, lx, ly, window, box))
+        return false;
 
-    Imf::PixelType pt;
-    if (pixel_type != NULL) {
-        if (PyObject_GetAttrString(pixel_type,"v") == NULL) {
-            return PyErr_Format(PyExc_TypeError, "Invalid PixelType object");
+    FrameBuffer frameBuffer;
+    std::vector<Py_buffer> views;
+    const ChannelList &channels = file.header().channels();
+
+    for (size_t i = 0; i < names.size(); i++) {
+        const char *cname = names[i].c_str();
+        const Channel *channelPtr = channels.findChannel(cname);
+        if (channelPtr == NULL) {
+            releaseviews(views);
+            PyErr_Format(PyExc_TypeError, "There is no channel '%s' in the image", cname);
+            return false;
         }
-        pt = PixelType(PyLong_AsLong(PyObject_StealAttrString(pixel_type, "v")));
-    } else {
-        pt = channelPtr->type;
-    }
-
-    int xSampling = channelPtr->xSampling;
-    int ySampling = channelPtr->ySampling;
-    int width  = (dw.max.x - dw.min.x + 1) / xSampling;
-    int height = (maxy - miny + 1) / ySampling;
-
-    size_t typeSize = compute_typesize(pt);
 
-    PyObject *r = PyString_FromStringAndSize(NULL, typeSize * width * height);
+        Imf::PixelType pt = channelPtr->type;
+        if (pixel_type != NULL && !pixeltype_from_object(pixel_type, pt)) {
+            releaseviews(views);
+            return false;
+        }
 
-    char *pixels = PyString_AsString(r);
+        int xSampling = channelPtr->xSampling;
+        int ySampling = channelPtr->ySampling;
+        int width = (box.max.x - box.min.x + 1) / xSampling;
+        int height = (box.max.y - box.min.y + 1) / ySampling;
+
+        if (!insertbufferslice(frameBuffer, views, bufs[i], cname, pt,
+                               box.min.x, box.min.y,
+                               width, height,
+                               xSampling, ySampling)) {
+            releaseviews(views);
+            return false;
+        }
+    }
 
     try
     {
-        FrameBuffer frameBuffer;
-        size_t xstride = typeSize;
-        size_t ystride = typeSize * width;
-        frameBuffer.insert(cname,
-                           Slice(pt,
-                                 pixels - dw.min.x * xstride / xSampling - miny * ystride / ySampling,
-                                 xstride,
-                                 ystride,
-                                 xSampling, ySampling,
-                                 0.0));
-        file->setFrameBuffer(frameBuffer);
-        file->readPixels(miny, maxy);
+        ReleaseGIL nogil(lock);
+        decodetiles(file, frameBuffer, tile_minx, tile_maxx, tile_miny, tile_maxy, lx, ly, window);
     }
     catch (const std::exception &e)
     {
-       PyErr_SetString(PyExc_OSError, e.what());
-       return NULL;
+        releaseviews(views);
+        PyErr_SetString(PyExc_OSError, e.what());
+        return false;
     }
+    releaseviews(views);
+    return true;
+}
 
-    return r;
+////////////////////////////////////////////////////////////////////////
+//    Reading into new strings or numpy arrays
+////////////////////////////////////////////////////////////////////////
+
+// numpy is imported the first time an array is asked for, so that the
+// module works without it.
+
+static PyObject *numpy_module = NULL;
+
+static const char *numpy_dtype(PixelType pt)
+{
+    switch (pt) {
+    case HALF:
+        return "float16";
+    case FLOAT:
+        return "float32";
+    default:
+        return "uint32";
+    }
 }
 
-static PyObject *channels(PyObject *self, PyObject *args, PyObject *kw)
+// Returns a new uninitialized numpy array of the given shape and dtype,
+// or NULL with an exception set.
+
+static PyObject *newnumpy(const char *dtype, PyObject *shape)
 {
-    if (!((InputFileC *)self)->is_opened) {
-	PyErr_SetString(PyExc_OSError, "cannot read from closed file");
-	return NULL;
+    if (shape == NULL)
+        return NULL;
+    if (numpy_module == NULL) {
+        numpy_module = PyImport_ImportModule("numpy");
+        if (numpy_module == NULL) {
+            Py_DECREF(shape);
+            PyErr_SetString(PyExc_ImportError, "numpy=True requires numpy");
+            return NULL;
+        }
     }
-    InputFile *file = &((InputFileC *)self)->i;
+    PyObject *r = PyObject_CallMethod(numpy_module, (char*)"empty", (char*)"(Os)", shape, dtype);
+    Py_DECREF(shape);
+    return r;
+}
 
-    Box2i dw = file->header().dataWindow();
-    int miny, maxy;
+// Returns a new uninitialized numpy array of the given shape, with the
+// dtype matching pt, or NULL with an exception set.
 
-    miny = dw.min.y;
-    maxy = dw.max.y;
+static PyObject *newarray(PixelType pt, PyObject *shape)
+{
+    return newnumpy(numpy_dtype(pt), shape);
+}
 
-    PyObject *clist;
-    PyObject *pixel_type = NULL;
-    char *keywords[] = { (char*)"cnames", (char*)"pixel_type", (char*)"scanLine1", (char*)"scanLine2", NULL };
-    if (!PyArg_ParseTupleAndKeywords(args, kw, "O|Oii", keywords, &clist, &pixel_type, &miny, &maxy))
-        return NULL;
+// Returns a new uninitialized string of size bytes, or numpy array of
+// the given shape and dtype if as_numpy is set, and sets data to its
+// contents.  Returns NULL with an exception set.
 
-    if (maxy < miny) {
-        PyErr_SetString(PyExc_TypeError, "scanLine1 must be <= scanLine2");
-        return NULL;
+static PyObject *newflat(const char *dtype, PyObject *shape, size_t size,
+                         bool as_numpy, char *&data)
+{
+    if (!as_numpy) {
+        Py_XDECREF(shape);
+        PyObject *s = PyString_FromStringAndSize(NULL, size);
+        if (s != NULL)
+            data = PyString_AsString(s);
+        return s;
     }
-    if (miny < dw.min.y) {
-        PyErr_SetString(PyExc_TypeError, "scanLine1 cannot be outside dataWindow");
+    PyObject *a = newnumpy(dtype, shape);
+    if (a == NULL)
         return NULL;
-    }
-    if (maxy > dw.max.y) {
-        PyErr_SetString(PyExc_TypeError, "scanLine2 cannot be outside dataWindow");
+    Py_buffer view;
+    if (PyObject_GetBuffer(a, &view, PyBUF_CONTIG) != 0) {
+        Py_DECREF(a);
         return NULL;
     }
+    data = (char *)view.buf;
+    PyBuffer_Release(&view);
+    return a;
+}
 
-    ChannelList channels = file->header().channels();
-    FrameBuffer frameBuffer;
-
-    int width  = dw.max.x - dw.min.x + 1;
-    int height = maxy - miny + 1;
+// Returns a list with one new string, or numpy array of shape
+// (height, width) if as_numpy is set, for each named channel, sized for
+// width x height pixels allowing for the channel's sampling.  Returns
+// NULL with an exception set.
 
+static PyObject *newchannelbuffers(const ChannelList &channels,
+                                   std::vector<std::string> &names,
+                                   PyObject *pixel_type,
+                                   int width, int height,
+                                   bool as_numpy)
+{
     PyObject *retval = PyList_New(0);
-    PyObject *iterator = PyObject_GetIter(clist);
-    if (iterator == NULL) {
-      PyErr_SetString(PyExc_TypeError, "Channel list must be iterable");
-      return NULL;
+    for (size_t i = 0; i < names.size(); i++) {
+        const Channel *channelPtr = channels.findChannel(names[i].c_str());
+        if (channelPtr == NULL) {
+            Py_DECREF(retval);
+            PyErr_Format(PyExc_TypeError, "There is no channel '%s' in the image", names[i].c_str());
+            return NULL;
+        }
+        Imf::PixelType pt = channelPtr->type;
+        if (pixel_type != NULL && !pixeltype_from_object(pixel_type, pt)) {
+            Py_DECREF(retval);
+            return NULL;
+        }
+        int w = width / channelPtr->xSampling;
+        int h = height / channelPtr->ySampling;
+        PyObject *a;
+        if (as_numpy)
+            a = newarray(pt, Py_BuildValue("(ii)", h, w));
+        else
+            a = PyString_FromStringAndSize(NULL, compute_typesize(pt) * w * h);
+        if (a == NULL) {
+            Py_DECREF(retval);
+            return NULL;
+        }
+        PyList_Append(retval, a);
+        Py_DECREF(a);
     }
-    PyObject *item;
-
-    while ((item = PyIter_Next(iterator)) != NULL) {
-      char *cname = PyUTF8_AsSstring(item);
-      Channel *channelPtr = channels.findChannel(cname);
-      if (channelPtr == NULL) {
-          return PyErr_Format(PyExc_TypeError, "There is no channel '%s' in the image", cname);
-      }
+    return retval;
+}
 
-      Imf::PixelType pt;
-      if (pixel_type != NULL) {
-          pt = PixelType(PyLong_AsLong(PyObject_StealAttrString(pixel_type, "v")));
-      } else {
-          pt = channelPtr->type;
-      }
+// Fills bufs with new references to the objects that the channels in
+// list, made by newchannelbuffers, are decoded through: the arrays
+// themselves, or writable views of the new strings.  Returns false with
+// an exception set.
 
-      // Use pt to compute typeSize
-      size_t typeSize = compute_typesize(pt);
-      if (typeSize < 0) {
-          PyErr_SetString(PyExc_TypeError, "Unknown type");
-          return NULL;
-      }
+static bool decodetargets(PyObject *list, bool as_numpy, std::vector<PyObject *> &bufs)
+{
+    for (Py_ssize_t i = 0; i < PyList_GET_SIZE(list); i++) {
+        PyObject *a = PyList_GET_ITEM(list, i);
+        PyObject *b;
+        if (as_numpy) {
+            Py_INCREF(a);
+            b = a;
+        } else {
+#if PY_MAJOR_VERSION >= 3
+            b = PyMemoryView_FromMemory(PyBytes_AS_STRING(a), PyBytes_GET_SIZE(a), PyBUF_WRITE);
+#else
+            b = PyBuffer_FromReadWriteMemory(PyString_AS_STRING(a), PyString_GET_SIZE(a));
+#endif
+        }
+        if (b == NULL) {
+            for (size_t j = 0; j < bufs.size(); j++)
+                Py_DECREF(bufs[j]);
+            bufs.clear();
+            return false;
+        }
+        bufs.push_back(b);
+    }
+    return true;
+}
+
+static void releasetargets(std::vector<PyObject *> &bufs)
+{
+    for (size_t i = 0; i < bufs.size(); i++)
+        Py_DECREF(bufs[i]);
+    bufs.clear();
+}
+
+// Decodes scan lines miny..maxy, or the window if one is given, of the
+// named channels into new strings or numpy arrays the size of the
+// pixels read, for an InputFile or an InputPart.  Returns the list, or
+// NULL with an exception set.
+
+template <class F>
+static PyObject *readscanlines(F &file, const Header &header, FileLock *lock,
+                               std::vector<std::string> &names,
+                               PyObject *pixel_type, int miny, int maxy,
+                               bool as_numpy, const Box2i *window = NULL)
+{
+    Box2i box;
+    if (!scanlinebox(header.dataWindow(), miny, maxy, window, box))
+        return NULL;
+
+    PyObject *retval = newchannelbuffers(header.channels(), names, pixel_type,
+                                         box.max.x - box.min.x + 1, box.max.y - box.min.y + 1,
+                                         as_numpy);
+    if (retval == NULL)
+        return NULL;
+    std::vector<PyObject *> bufs;
+    if (!decodetargets(retval, as_numpy, bufs)) {
+        Py_DECREF(retval);
+        return NULL;
+    }
+    bool ok = readscanlinesinto(file, header, lock, names, bufs, pixel_type, miny, maxy, window);
+    releasetargets(bufs);
+    if (!ok) {
+        Py_DECREF(retval);
+        return NULL;
+    }
+    return retval;
+}
+
+// Decodes the tile range, or the window if one is given, of level
+// (lx, ly) of the named channels into new strings or numpy arrays the
+// size of the pixels read, for a TiledInputFile.  Returns the list, or
+// NULL with an exception set.
+
+template <class F>
+static PyObject *readtiles(F &file, FileLock *lock,
+                           std::vector<std::string> &names,
+                           PyObject *pixel_type,
+                           int tile_minx, int tile_maxx,
+                           int tile_miny, int tile_maxy,
+                           int lx, int ly,
+                           bool as_numpy, const Box2i *window = NULL)
+{
+    Box2i box;
+    if (!tilebox(file, tile_minx, tile_maxx, tile_miny, tile_maxy, lx, ly, window, box))
+        return NULL;
+
+    PyObject *retval = newchannelbuffers(file.header().channels(), names, pixel_type,
+                                         box.max.x - box.min.x + 1, box.max.y - box.min.y + 1,
+                                         as_numpy);
+    if (retval == NULL)
+        return NULL;
+    std::vector<PyObject *> bufs;
+    if (!decodetargets(retval, as_numpy, bufs)) {
+        Py_DECREF(retval);
+        return NULL;
+    }
+    bool ok = readtilesinto(file, lock, names, bufs, pixel_type, tile_minx, tile_maxx, tile_miny, tile_maxy, lx, ly, window);
+    releasetargets(bufs);
+    if (!ok) {
+        Py_DECREF(retval);
+        return NULL;
+    }
+    return retval;
+}
+
+// Returns the only item of a list returned by readscanlines or
+// readtiles, consuming the list.
+
+static PyObject *onlyitem(PyObject *list)
+{
+    if (list == NULL)
+        return NULL;
+    PyObject *r = PyList_GET_ITEM(list, 0);
+    Py_INCREF(r);
+    Py_DECREF(list);
+    return r;
+}
+
+////////////////////////////////////////////////////////////////////////
+//    Interleaved reads
+////////////////////////////////////////////////////////////////////////
+
+// Inserts one slice per named channel, so that the channels of each
+// pixel are adjacent and the pixels form a height x width x C array
+// with the channels in the order given.  All the channels must have the
+// same sampling and, unless pixel_type is given, the same pixel type.
+// If buffer is NULL a string, or a numpy array if as_numpy is set, is
+// allocated for the pixels.  Otherwise they are decoded into buffer,
+// which must either be contiguous and exactly the right size, or be a
+// strided buffer of shape (height, width, C).
+// (ox, oy) is the pixel that lands first; width and height are measured
+// in data window pixels.  On success *result holds a new reference to
+// the string or buffer, and the buffer view is appended to views.
+
+static bool insertinterleavedslices(FrameBuffer &frameBuffer,
+                                    std::vector<Py_buffer> &views,
+                                    const ChannelList &channels,
+                                    std::vector<std::string> &names,
+                                    PyObject *pixel_type,
+                                    PyObject *buffer,
+                                    bool as_numpy,
+                                    int ox, int oy,
+                                    int width, int height,
+                                    PyObject **result)
+{
+    size_t nchannels = names.size();
+    if (nchannels == 0) {
+        PyErr_SetString(PyExc_TypeError, "No channels given");
+        return false;
+    }
+
+    std::vector<const Channel *> channelPtrs;
+    for (size_t i = 0; i < nchannels; i++) {
+        const Channel *channelPtr = channels.findChannel(names[i].c_str());
+        if (channelPtr == NULL) {
+            PyErr_Format(PyExc_TypeError, "There is no channel '%s' in the image", names[i].c_str());
+            return false;
+        }
+        channelPtrs.push_back(channelPtr);
+    }
+
+    const Channel *first = channelPtrs[0];
+    Imf::PixelType pt = first->type;
+    if (pixel_type != NULL && !pixeltype_from_object(pixel_type, pt))
+        return false;
+    for (size_t i = 1; i < nchannels; i++) {
+        if (channelPtrs[i]->xSampling != first->xSampling ||
+            channelPtrs[i]->ySampling != first->ySampling) {
+            PyErr_Format(PyExc_TypeError, "Channels '%s' and '%s' have different sampling", names[0].c_str(), names[i].c_str());
+            return false;
+        }
+        if (pixel_type == NULL && channelPtrs[i]->type != pt) {
+            PyErr_Format(PyExc_TypeError, "Channels '%s' and '%s' have different pixel types, so pixel_type must be given", names[0].c_str(), names[i].c_str());
+            return false;
+        }
+    }
+
+    int xSampling = first->xSampling;
+    int ySampling = first->ySampling;
+    width /= xSampling;
+    height /= ySampling;
+    Py_ssize_t typeSize = compute_typesize(pt);
+    Py_ssize_t cstride = typeSize;
+    Py_ssize_t xstride = typeSize * nchannels;
+    Py_ssize_t ystride = xstride * width;
+    char *pixels;
+
+    if (buffer == NULL && !as_numpy) {
+        *result = PyString_FromStringAndSize(NULL, ystride * height);
+        if (*result == NULL)
+            return false;
+        pixels = PyString_AsString(*result);
+    } else {
+        if (buffer == NULL) {
+            *result = newarray(pt, Py_BuildValue("(iin)", height, width, (Py_ssize_t)nchannels));
+            if (*result == NULL)
+                return false;
+        } else {
+            Py_INCREF(buffer);
+            *result = buffer;
+        }
+        Py_buffer view;
+        if (PyObject_GetBuffer(*result, &view, PyBUF_WRITABLE | PyBUF_STRIDES) != 0) {
+            Py_DECREF(*result);
+            PyErr_SetString(PyExc_TypeError, "Buffer must be writable and support buffer protocol");
+            return false;
+        }
+        if (PyBuffer_IsContiguous(&view, 'C')) {
+            if (view.len != ystride * height) {
+                PyBuffer_Release(&view);
+                Py_DECREF(*result);
+                PyErr_Format(PyExc_TypeError, "Buffer should have size %zd but got %zd", ystride * height, view.len);
+                return false;
+            }
+        } else if (view.ndim == 3 &&
+                   view.itemsize == typeSize &&
+                   view.shape[0] == height &&
+                   view.shape[1] == width &&
+                   view.shape[2] == (Py_ssize_t)nchannels) {
+            cstride = view.strides[2];
+            xstride = view.strides[1];
+            ystride = view.strides[0];
+        } else {
+            PyBuffer_Release(&view);
+            Py_DECREF(*result);
+            PyErr_Format(PyExc_TypeError, "Buffer must be contiguous, or have shape (%d, %d, %zu) and item size %zd", height, width, nchannels, typeSize);
+            return false;
+        }
+        views.push_back(view);
+        pixels = (char *)view.buf;
+    }
+
+    for (size_t i = 0; i < nchannels; i++)
+        frameBuffer.insert(names[i].c_str(),
+                           Slice(pt,
+                                 pixels + i * cstride - (ox / xSampling) * xstride - (oy / ySampling) * ystride,
+                                 xstride,
+                                 ystride,
+                                 xSampling, ySampling,
+                                 0.0));
+    return true;
+}
+
+// Decodes scan lines miny..maxy, or the window if one is given, of the
+// named channels interleaved into one array, for an InputFile or an
+// InputPart.  Returns a new reference to the pixels, or NULL with an
+// exception set.
+
+template <class F>
+static PyObject *readscanlinesinterleaved(F &file, const Header &header, FileLock *lock,
+                                          PyObject *cnames, PyObject *pixel_type, PyObject *buffer,
+                                          bool as_numpy, int miny, int maxy,
+                                          const Box2i *window = NULL)
+{
+    Box2i dw = header.dataWindow();
+    Box2i box;
+    if (!scanlinebox(dw, miny, maxy, window, box))
+        return NULL;
+
+    std::vector<std::string> names;
+    if (!channelnames(cnames, names))
+        return NULL;
+
+    FrameBuffer frameBuffer;
+    std::vector<Py_buffer> views;
+    PyObject *retval;
+    if (!insertinterleavedslices(frameBuffer, views, header.channels(), names,
+                                 pixel_type, buffer, as_numpy,
+                                 box.min.x, box.min.y,
+                                 box.max.x - box.min.x + 1, box.max.y - box.min.y + 1,
+                                 &retval))
+        return NULL;
+    if (window != NULL && !checkwindowsampling(frameBuffer)) {
+        releaseviews(views);
+        Py_DECREF(retval);
+        return NULL;
+    }
+
+    try
+    {
+        ReleaseGIL nogil(lock);
+        decodescanlines(file, dw, frameBuffer, box);
+    }
+    catch (const std::exception &e)
+    {
+        releaseviews(views);
+        Py_DECREF(retval);
+        PyErr_SetString(PyExc_OSError, e.what());
+        return NULL;
+    }
+    releaseviews(views);
+    return retval;
+}
+
+// Decodes the tile range, or the window if one is given, of level
+// (lx, ly) of the named channels interleaved into one array, for a
+// TiledInputFile.  Returns a new reference to the pixels, or NULL with
+// an exception set.
+
+template <class F>
+static PyObject *readtilesinterleaved(F &file, FileLock *lock,
+                                      PyObject *cnames, PyObject *pixel_type, PyObject *buffer,
+                                      bool as_numpy,
+                                      int tile_minx, int tile_maxx,
+                                      int tile_miny, int tile_maxy,
+                                      int lx, int ly,
+                                      const Box2i *window = NULL)
+{
+    Box2i box;
+    if (!tilebox(file, tile_minx, tile_maxx, tile_miny, tile_maxy, lx, ly, window, box))
+        return NULL;
+
+    std::vector<std::string> names;
+    if (!channelnames(cnames, names))
+        return NULL;
+
+    FrameBuffer frameBuffer;
+    std::vector<Py_buffer> views;
+    PyObject *retval;
+    if (!insertinterleavedslices(frameBuffer, views, file.header().channels(), names,
+                                 pixel_type, buffer, as_numpy,
+                                 box.min.x, box.min.y,
+                                 box.max.x - box.min.x + 1, box.max.y - box.min.y + 1,
+                                 &retval))
+        return NULL;
+
+    try
+    {
+        ReleaseGIL nogil(lock);
+        decodetiles(file, frameBuffer, tile_minx, tile_maxx, tile_miny, tile_maxy, lx, ly, window);
+    }
+    catch (const std::exception &e)
+    {
+        releaseviews(views);
+        Py_DECREF(retval);
+        PyErr_SetString(PyExc_OSError, e.what());
+        return NULL;
+    }
+    releaseviews(views);
+    return retval;
+}
+
+////////////////////////////////////////////////////////////////////////
+//    Tone mapped reads
+////////////////////////////////////////////////////////////////////////
+
+// HALF channels are decoded as HALF, so that exposure, the transfer
+// function and quantization together become one table lookup per
+// sample, indexed by the bits of the half.  FLOAT and UINT channels,
+// which a half cannot hold, are decoded as FLOAT and mapped directly.
+
+enum Transfer { TRANSFER_LINEAR, TRANSFER_SRGB, TRANSFER_GAMMA };
+
+struct ToneMap {
+    int bits;
+    double exposure;
+    Transfer transfer;
+    double gamma;
+    bool autorange;
+};
+
+// Converts the transfer argument of channels_tonemapped, "linear",
+// "srgb" or a gamma, into tm.  Returns false with an exception set.
+
+static bool transfer_from_object(PyObject *o, ToneMap &tm)
+{
+    tm.transfer = TRANSFER_SRGB;
+    tm.gamma = 1.0;
+    if (o == NULL)
+        return true;
+    if (PyUnicode_Check(o) || PyString_Check(o)) {
+        const char *name = PyUnicode_Check(o) ? PyUTF8_AsSstring(o) : PyString_AsString(o);
+        if (name == NULL)
+            return false;
+        if (strcmp(name, "linear") == 0) {
+            tm.transfer = TRANSFER_LINEAR;
+            return true;
+        }
+        if (strcmp(name, "srgb") == 0)
+            return true;
+    } else if (PyNumber_Check(o)) {
+        tm.transfer = TRANSFER_GAMMA;
+        tm.gamma = PyFloat_AsDouble(o);
+        if (tm.gamma > 0)
+            return true;
+        if (PyErr_Occurred())
+            return false;
+    }
+    PyErr_SetString(PyExc_TypeError, "transfer must be 'linear', 'srgb' or a positive gamma");
+    return false;
+}
+
+static double applytransfer(const ToneMap &tm, double v)
+{
+    switch (tm.transfer) {
+    case TRANSFER_SRGB:
+        return v <= 0.0031308 ? 12.92 * v : 1.055 * pow(v, 1 / 2.4) - 0.055;
+    case TRANSFER_GAMMA:
+        return pow(v, 1 / tm.gamma);
+    default:
+        return v;
+    }
+}
+
+// Returns v * scale + offset clamped to [0, 1], passed through the
+// transfer function and scaled to 0..maxval.  NaN maps to 0.
+
+static unsigned short quantize(const ToneMap &tm, double v, double scale, double offset,
+                               unsigned int maxval)
+{
+    v = v * scale + offset;
+    if (!(v > 0))
+        return 0;
+    if (v >= 1)
+        return maxval;
+    return (unsigned short)(applytransfer(tm, v) * maxval + 0.5);
+}
+
+// Fills lut, indexed by the bits of a half h, with quantize(h).
+
+static void buildlut(std::vector<unsigned short> &lut, const ToneMap &tm,
+                     double scale, double offset, unsigned int maxval)
+{
+    lut.resize(1 << 16);
+    for (unsigned int i = 0; i < lut.size(); i++) {
+        half h;
+        h.setBits(i);
+        lut[i] = quantize(tm, h, scale, offset, maxval);
+    }
+}
+
+// Sets scale and offset to map the interleaved samples in src through
+// exposure and, if tm.autorange is set, the darkest to lightest finite
+// sample of the channels not flagged in alpha to [0, 1].
+
+template <class T>
+static void tonerange(const T *src, size_t npixels, const std::vector<bool> &alpha,
+                      const ToneMap &tm, double &scale, double &offset)
+{
+    size_t nchannels = alpha.size();
+    scale = pow(2.0, tm.exposure);
+    offset = 0;
+    if (!tm.autorange)
+        return;
+    float lo = std::numeric_limits<float>::max(), hi = -lo;
+    for (size_t c = 0; c < nchannels; c++) {
+        if (alpha[c])
+            continue;
+        for (size_t i = c; i < npixels * nchannels; i += nchannels) {
+            float v = src[i];
+            if (std::isfinite(v)) {
+                lo = std::min(lo, v);
+                hi = std::max(hi, v);
+            }
+        }
+    }
+    if (lo < hi) {
+        scale /= (double)hi - lo;
+        offset = -lo * scale;
+    }
+}
+
+template <class U>
+static void tonemapchannel(const half *src, size_t c, size_t n, size_t nchannels,
+                           const unsigned short *lut, U *out)
+{
+    for (size_t i = c; i < n * nchannels; i += nchannels)
+        out[i] = (U)lut[src[i].bits()];
+}
+
+// Maps the interleaved HALF samples in src through the tone map into
+// dst, one byte or unsigned short per sample.  Channels flagged in alpha
+// are quantized linearly, without exposure or auto-range.
+
+static void tonemap(const half *src, size_t npixels, const std::vector<bool> &alpha,
+                    const ToneMap &tm, char *dst)
+{
+    size_t nchannels = alpha.size();
+    double scale, offset;
+    tonerange(src, npixels, alpha, tm, scale, offset);
+
+    unsigned int maxval = (1u << tm.bits) - 1;
+    std::vector<unsigned short> color, linear;
+    buildlut(color, tm, scale, offset, maxval);
+    if (std::find(alpha.begin(), alpha.end(), true) != alpha.end()) {
+        ToneMap identity = tm;
+        identity.transfer = TRANSFER_LINEAR;
+        buildlut(linear, identity, 1, 0, maxval);
+    }
+
+    for (size_t c = 0; c < nchannels; c++) {
+        const unsigned short *lut = alpha[c] ? &linear[0] : &color[0];
+        if (tm.bits == 8)
+            tonemapchannel(src, c, npixels, nchannels, lut, (unsigned char *)dst);
+        else
+            tonemapchannel(src, c, npixels, nchannels, lut, (unsigned short *)dst);
+    }
+}
+
+template <class U>
+static void tonemapchannel(const float *src, size_t c, size_t n, size_t nchannels,
+                           const ToneMap &tm, double scale, double offset,
+                           unsigned int maxval, U *out)
+{
+    for (size_t i = c; i < n * nchannels; i += nchannels)
+        out[i] = (U)quantize(tm, src[i], scale, offset, maxval);
+}
+
+// As above for FLOAT samples, which are mapped one by one at full
+// precision.
+
+static void tonemap(const float *src, size_t npixels, const std::vector<bool> &alpha,
+                    const ToneMap &tm, char *dst)
+{
+    size_t nchannels = alpha.size();
+    double scale, offset;
+    tonerange(src, npixels, alpha, tm, scale, offset);
+
+    unsigned int maxval = (1u << tm.bits) - 1;
+    ToneMap identity = tm;
+    identity.transfer = TRANSFER_LINEAR;
+    for (size_t c = 0; c < nchannels; c++) {
+        const ToneMap &t = alpha[c] ? identity : tm;
+        double s = alpha[c] ? 1 : scale, o = alpha[c] ? 0 : offset;
+        if (tm.bits == 8)
+            tonemapchannel(src, c, npixels, nchannels, t, s, o, maxval, (unsigned char *)dst);
+        else
+            tonemapchannel(src, c, npixels, nchannels, t, s, o, maxval, (unsigned short *)dst);
+    }
+}
+
+// Decodes scan lines miny..maxy, or the window if one is given, of the
+// named channels and tone maps them into one interleaved string, or
+// numpy array of shape (height, width, C) if as_numpy is set, of 8 or
+// 16 bit samples.  Returns a new reference, or NULL with an exception
+// set.
+
+template <class F>
+static PyObject *readscanlinestonemapped(F &file, const Header &header, FileLock *lock,
+                                         PyObject *cnames, const ToneMap &tm, bool as_numpy,
+                                         int miny, int maxy, const Box2i *window)
+{
+    Box2i dw = header.dataWindow();
+    Box2i box;
+    if (!scanlinebox(dw, miny, maxy, window, box))
+        return NULL;
+
+    std::vector<std::string> names;
+    if (!channelnames(cnames, names))
+        return NULL;
+    size_t nchannels = names.size();
+    if (nchannels == 0) {
+        PyErr_SetString(PyExc_TypeError, "No channels given");
+        return NULL;
+    }
+
+    std::vector<bool> alpha(nchannels);
+    int xSampling = 1, ySampling = 1;
+    Imf::PixelType pt = HALF;
+    for (size_t i = 0; i < nchannels; i++) {
+        const Channel *channelPtr = header.channels().findChannel(names[i].c_str());
+        if (channelPtr == NULL) {
+            PyErr_Format(PyExc_TypeError, "There is no channel '%s' in the image", names[i].c_str());
+            return NULL;
+        }
+        if (i == 0) {
+            xSampling = channelPtr->xSampling;
+            ySampling = channelPtr->ySampling;
+        } else if (channelPtr->xSampling != xSampling || channelPtr->ySampling != ySampling) {
+            PyErr_Format(PyExc_TypeError, "Channels '%s' and '%s' have different sampling", names[0].c_str(), names[i].c_str());
+            return NULL;
+        }
+        if (channelPtr->type != HALF)
+            pt = FLOAT;
+        const std::string &name = names[i];
+        alpha[i] = name == "A" || (name.size() > 2 && name.compare(name.size() - 2, 2, ".A") == 0);
+    }
+
+    int width = (box.max.x - box.min.x + 1) / xSampling;
+    int height = (box.max.y - box.min.y + 1) / ySampling;
+    size_t npixels = (size_t)width * height;
+    char *out;
+    PyObject *retval = newflat(tm.bits == 8 ? "uint8" : "uint16",
+                               Py_BuildValue("(iin)", height, width, (Py_ssize_t)nchannels),
+                               npixels * nchannels * (tm.bits / 8), as_numpy, out);
+    if (retval == NULL)
+        return NULL;
+
+    size_t size = pt == HALF ? sizeof(half) : sizeof(float);
+    std::unique_ptr<char[]> pixels(new char[npixels * nchannels * size]);
+    size_t xstride = size * nchannels;
+    size_t ystride = xstride * width;
+    FrameBuffer frameBuffer;
+    for (size_t i = 0; i < nchannels; i++)
+        frameBuffer.insert(names[i].c_str(),
+                           Slice(pt,
+                                 &pixels[i * size] - (box.min.x / xSampling) * xstride - (box.min.y / ySampling) * ystride,
+                                 xstride,
+                                 ystride,
+                                 xSampling, ySampling,
+                                 0.0));
+    if (window != NULL && !checkwindowsampling(frameBuffer)) {
+        Py_DECREF(retval);
+        return NULL;
+    }
+
+    try
+    {
+        ReleaseGIL nogil(lock);
+        decodescanlines(file, dw, frameBuffer, box);
+        if (pt == HALF)
+            tonemap((const half *)pixels.get(), npixels, alpha, tm, out);
+        else
+            tonemap((const float *)pixels.get(), npixels, alpha, tm, out);
+    }
+    catch (const std::exception &e)
+    {
+        Py_DECREF(retval);
+        PyErr_SetString(PyExc_OSError, e.what());
+        return NULL;
+    }
+    return retval;
+}
+
+////////////////////////////////////////////////////////////////////////
+//    Thumbnails and previews
+////////////////////////////////////////////////////////////////////////
+
+// Sample conversion for thumbnails, previews and level generation,
+// which filter in float.
+
+static float loadsample(Imf::PixelType pt, const char *p)
+{
+    switch (pt) {
+    case HALF:
+        return *(const half *)p;
+    case FLOAT:
+        return *(const float *)p;
+    default:
+        return (float)*(const unsigned int *)p;
+    }
+}
+
+static void storesample(Imf::PixelType pt, char *p, float v)
+{
+    switch (pt) {
+    case HALF:
+        *(half *)p = half(v);
+        break;
+    case FLOAT:
+        *(float *)p = v;
+        break;
+    default:
+        *(unsigned int *)p = v <= 0.0f ? 0 : (unsigned int)(v + 0.5f);
+        break;
+    }
+}
+
+// Sets (width, height) to the size of a thumbnail of a sw x sh image
+// whose longer side is size, keeping the aspect ratio.  Images that are
+// already small enough keep their size.
+
+static void thumbnailsize(int sw, int sh, int size, int &width, int &height)
+{
+    double scale = std::min(1.0, (double)size / std::max(sw, sh));
+    width = std::max(1, (int)(sw * scale + 0.5));
+    height = std::max(1, (int)(sh * scale + 0.5));
+}
+
+static double sinc(double x)
+{
+    if (x == 0)
+        return 1;
+    x *= M_PI;
+    return sin(x) / x;
+}
+
+// Fills first and weights so that destination pixel i of a resampling
+// from src to dst pixels is the sum of weights[i][k] times source pixel
+// first[i] + k.  The box filter averages the source area that each
+// destination pixel covers; Lanczos uses three lobes.
+
+static void filterweights(int src, int dst, bool lanczos,
+                          std::vector<int> &first,
+                          std::vector<std::vector<float> > &weights)
+{
+    double scale = (double)src / dst;
+    double support = lanczos ? 3 * std::max(scale, 1.0) : std::max(scale, 1.0) / 2;
+    first.resize(dst);
+    weights.assign(dst, std::vector<float>());
+    for (int i = 0; i < dst; i++) {
+        double center = (i + 0.5) * scale;
+        int lo = std::max(0, (int)floor(center - support));
+        int hi = std::min(src - 1, (int)ceil(center + support));
+        double total = 0;
+        std::vector<double> w;
+        for (int s = lo; s <= hi; s++) {
+            double v;
+            if (lanczos) {
+                double x = (s + 0.5 - center) / std::max(scale, 1.0);
+                v = fabs(x) < 3 ? sinc(x) * sinc(x / 3) : 0;
+            } else {
+                v = std::min(s + 1.0, center + support) - std::max((double)s, center - support);
+                v = std::max(v, 0.0);
+            }
+            w.push_back(v);
+            total += v;
+        }
+        if (total == 0) {
+            w.assign(1, 1.0);
+            lo = std::min(std::max((int)center, 0), src - 1);
+            total = 1;
+        }
+        first[i] = lo;
+        for (size_t k = 0; k < w.size(); k++)
+            weights[i].push_back((float)(w[k] / total));
+    }
+}
+
+// Resamples an image of interleaved float pixels down to width x height,
+// taking one source row at a time in any order, so that only the
+// result is held in memory however large the source.
+
+class Downsampler
+{
+public:
+    Downsampler(int srcWidth, int srcHeight, int width, int height,
+                int nchannels, bool lanczos);
+    void addrow(int y, const float *row);
+    const std::vector<float> &result() const { return _acc; }
+    int width() const { return _width; }
+    int height() const { return _height; }
+
+private:
+    int _width, _height, _nchannels;
+    std::vector<int> _xfirst;
+    std::vector<std::vector<float> > _xweights;
+    std::vector<std::vector<std::pair<int, float> > > _rows;
+    std::vector<float> _acc;
+    std::vector<float> _line;
+};
+
+Downsampler::Downsampler(int srcWidth, int srcHeight, int width, int height,
+                         int nchannels, bool lanczos):
+    _width(width), _height(height), _nchannels(nchannels),
+    _rows(srcHeight),
+    _acc((size_t)width * height * nchannels),
+    _line((size_t)width * nchannels)
+{
+    filterweights(srcWidth, width, lanczos, _xfirst, _xweights);
+    std::vector<int> yfirst;
+    std::vector<std::vector<float> > yweights;
+    filterweights(srcHeight, height, lanczos, yfirst, yweights);
+    for (int i = 0; i < height; i++)
+        for (size_t k = 0; k < yweights[i].size(); k++)
+            _rows[yfirst[i] + k].push_back(std::make_pair(i, yweights[i][k]));
+}
+
+// Adds source row y, of srcWidth interleaved pixels, to the result.
+
+void Downsampler::addrow(int y, const float *row)
+{
+    const std::vector<std::pair<int, float> > &targets = _rows[y];
+    if (targets.empty())
+        return;
+    int nc = _nchannels;
+    for (int i = 0; i < _width; i++) {
+        float *out = &_line[(size_t)i * nc];
+        for (int c = 0; c < nc; c++)
+            out[c] = 0;
+        const float *src = row + (size_t)_xfirst[i] * nc;
+        const std::vector<float> &w = _xweights[i];
+        for (size_t k = 0; k < w.size(); k++)
+            for (int c = 0; c < nc; c++)
+                out[c] += w[k] * src[k * nc + c];
+    }
+    for (size_t t = 0; t < targets.size(); t++) {
+        float *acc = &_acc[(size_t)targets[t].first * _width * nc];
+        float w = targets[t].second;
+        for (size_t j = 0; j < _line.size(); j++)
+            acc[j] += w * _line[j];
+    }
+}
+
+// Returns the number of scan lines in each compressed chunk of a file
+// with this header, or the tile height of a tiled file.  Reads that
+// start and end on chunk boundaries never decode a chunk twice.
+
+static int linesperchunk(const Header &header)
+{
+    if (header.hasTileDescription())
+        return header.tileDescription().ySize;
+    switch (header.compression()) {
+    case NO_COMPRESSION:
+    case RLE_COMPRESSION:
+    case ZIPS_COMPRESSION:
+        return 1;
+    case ZIP_COMPRESSION:
+    case PXR24_COMPRESSION:
+        return 16;
+    case PIZ_COMPRESSION:
+    case B44_COMPRESSION:
+    case B44A_COMPRESSION:
+    case DWAA_COMPRESSION:
+        return 32;
+    default:
+        return 256;
+    }
+}
+
+// Decodes the named channels a block of scan lines at a time and
+// filters them down to a thumbnail whose longer side is size, as one
+// interleaved string of floats, or numpy array of shape (height, width,
+// C) if as_numpy is set.  Returns a new reference, or NULL with an
+// exception set.
+
+template <class F>
+static PyObject *readthumbnail(F &file, const Header &header, FileLock *lock,
+                               PyObject *cnames, int size, bool lanczos, bool as_numpy)
+{
+    std::vector<std::string> names;
+    if (!channelnames(cnames, names))
+        return NULL;
+    size_t nchannels = names.size();
+    if (nchannels == 0) {
+        PyErr_SetString(PyExc_TypeError, "No channels given");
+        return NULL;
+    }
+    for (size_t i = 0; i < nchannels; i++) {
+        const Channel *channelPtr = header.channels().findChannel(names[i].c_str());
+        if (channelPtr == NULL) {
+            PyErr_Format(PyExc_TypeError, "There is no channel '%s' in the image", names[i].c_str());
+            return NULL;
+        }
+        if (channelPtr->xSampling != 1 || channelPtr->ySampling != 1) {
+            PyErr_Format(PyExc_TypeError, "Channel '%s' is subsampled", names[i].c_str());
+            return NULL;
+        }
+    }
+    if (size < 1) {
+        PyErr_SetString(PyExc_TypeError, "size must be at least 1");
+        return NULL;
+    }
+
+    Box2i dw = header.dataWindow();
+    int sw = dw.max.x - dw.min.x + 1;
+    int sh = dw.max.y - dw.min.y + 1;
+    int width, height;
+    thumbnailsize(sw, sh, size, width, height);
+    char *out;
+    PyObject *retval = newflat("float32", Py_BuildValue("(iin)", height, width, (Py_ssize_t)nchannels),
+                               (size_t)width * height * nchannels * sizeof(float), as_numpy, out);
+    if (retval == NULL)
+        return NULL;
+
+    int chunk = linesperchunk(header);
+    int rows = (64 + chunk - 1) / chunk * chunk;
+    try
+    {
+        ReleaseGIL nogil(lock);
+        Downsampler thumbnail(sw, sh, width, height, nchannels, lanczos);
+        std::vector<float> block((size_t)sw * rows * nchannels);
+        size_t xstride = sizeof(float) * nchannels;
+        size_t ystride = xstride * sw;
+        for (int y = dw.min.y; y <= dw.max.y; y += rows) {
+            int last = std::min(y + rows - 1, dw.max.y);
+            FrameBuffer frameBuffer;
+            for (size_t i = 0; i < nchannels; i++)
+                frameBuffer.insert(names[i].c_str(),
+                                   Slice(FLOAT,
+                                         (char *)&block[i] - dw.min.x * xstride - y * ystride,
+                                         xstride, ystride));
+            file.setFrameBuffer(frameBuffer);
+            file.readPixels(y, last);
+            for (int r = y; r <= last; r++)
+                thumbnail.addrow(r - dw.min.y, &block[(size_t)(r - y) * sw * nchannels]);
+        }
+        memcpy(out, &thumbnail.result()[0], thumbnail.result().size() * sizeof(float));
+    }
+    catch (const std::exception &e)
+    {
+        Py_DECREF(retval);
+        PyErr_SetString(PyExc_OSError, e.what());
+        return NULL;
+    }
+    return retval;
+}
+
+// Converts a linear value to an 8 bit preview sample, with the exposure,
+// knee and gamma that the exrmakepreview utility uses.
+
+static unsigned char previewsample(float v)
+{
+    v *= 5.55555f;    // 2 ** 2.47393
+    if (!(v > 0))
+        return 0;
+    if (v > 1)
+        v = 1 + log((v - 1) * 0.184874f + 1) / 0.184874f;
+    return (unsigned char)std::min(255.0f, powf(v, 0.4545f) * 84.66f);
+}
+
+// Feeds scan line y of the pixels being written, whose channel buffers
+// are described by frameBuffer, to the RGBA preview downsampler.  R, G
+// and B fall back to Y, and A to 1, when the image lacks them.
+
+static void previewrow(Downsampler &preview, const FrameBuffer &frameBuffer,
+                       const Box2i &dw, int y, std::vector<float> &row)
+{
+    static const char *names[4] = { "R", "G", "B", "A" };
+    int width = dw.max.x - dw.min.x + 1;
+    row.resize((size_t)width * 4);
+    for (int c = 0; c < 4; c++) {
+        const Slice *slice = frameBuffer.findSlice(names[c]);
+        if (slice == NULL && c < 3)
+            slice = frameBuffer.findSlice("Y");
+        if (slice != NULL && (slice->xSampling != 1 || slice->ySampling != 1))
+            slice = NULL;
+        for (int x = 0; x < width; x++) {
+            if (slice == NULL)
+                row[x * 4 + c] = c == 3 ? 1.0f : 0.0f;
+            else
+                row[x * 4 + c] = loadsample(slice->type, slice->base + (x + dw.min.x) * slice->xStride + y * slice->yStride);
+        }
+    }
+    preview.addrow(y - dw.min.y, &row[0]);
+}
+
+// Converts the filtered RGBA preview to the pixels of a PreviewImage.
+
+static void previewpixels(const Downsampler &preview, std::vector<PreviewRgba> &pixels)
+{
+    const std::vector<float> &rgba = preview.result();
+    pixels.resize(rgba.size() / 4);
+    for (size_t i = 0; i < pixels.size(); i++) {
+        pixels[i].r = previewsample(rgba[i * 4 + 0]);
+        pixels[i].g = previewsample(rgba[i * 4 + 1]);
+        pixels[i].b = previewsample(rgba[i * 4 + 2]);
+        pixels[i].a = (unsigned char)std::min(std::max(rgba[i * 4 + 3] * 255.0f + 0.5f, 0.0f), 255.0f);
+    }
+}
+
+////////////////////////////////////////////////////////////////////////
+//    Tile levels
+////////////////////////////////////////////////////////////////////////
+
+enum LevelQuery { NUM_LEVELS, NUM_X_LEVELS, NUM_Y_LEVELS, LEVEL_WIDTH, LEVEL_HEIGHT,
+                  NUM_X_TILES, NUM_Y_TILES };
+
+// Answers a question about the levels of a TiledInputFile or
+// TiledOutputFile, or a tiled part.  LEVEL_WIDTH, LEVEL_HEIGHT,
+// NUM_X_TILES and NUM_Y_TILES take a level argument.
+
+template <class F>
+static PyObject *levelquery(F &file, int is_opened, PyObject *args, LevelQuery q)
+{
+    int level = 0;
+    if (q == LEVEL_WIDTH || q == LEVEL_HEIGHT || q == NUM_X_TILES || q == NUM_Y_TILES) {
+        if (!PyArg_ParseTuple(args, "|i", &level))
+            return NULL;
+    } else {
+        if (!PyArg_ParseTuple(args, ""))
+            return NULL;
+    }
+    if (!is_opened) {
+	PyErr_SetString(PyExc_OSError, "file is closed");
+	return NULL;
+    }
+    int n = 0;
+    try
+    {
+        switch (q) {
+        case NUM_LEVELS:
+            n = file.numLevels();
+            break;
+        case NUM_X_LEVELS:
+            n = file.numXLevels();
+            break;
+        case NUM_Y_LEVELS:
+            n = file.numYLevels();
+            break;
+        case LEVEL_WIDTH:
+            n = file.levelWidth(level);
+            break;
+        case LEVEL_HEIGHT:
+            n = file.levelHeight(level);
+            break;
+        case NUM_X_TILES:
+            n = file.numXTiles(level);
+            break;
+        case NUM_Y_TILES:
+            n = file.numYTiles(level);
+            break;
+        }
+    }
+    catch (const std::exception &e)
+    {
+        PyErr_SetString(PyExc_OSError, e.what());
+        return NULL;
+    }
+    return PyLong_FromLong(n);
+}
+
+////////////////////////////////////////////////////////////////////////
+//    TiledInputFile
+////////////////////////////////////////////////////////////////////////
+
+typedef struct {
+    PyObject_HEAD
+    TiledInputFile i;
+    PyObject *fo;
+    IStream *istream;
+    int is_opened;
+    FileLock *lock;
+    PyObject *header;
+} TiledInputFileC;
+
+// Fills in the defaults for a tile range of level (lx, ly): ly is lx if
+// not given, and the range covers the whole level.  Returns false with
+// an exception set if the level does not exist.
+
+template <class F>
+static bool tiledefaults(F &file, int &tile_maxx, int &tile_maxy, int lx, int &ly)
+{
+    if (ly == -1)
+        ly = lx;
+    if (!file.isValidLevel(lx, ly)) {
+        PyErr_Format(PyExc_TypeError, "There is no level (%d, %d) in the image", lx, ly);
+        return false;
+    }
+    if (tile_maxx == -1)
+        tile_maxx = file.numXTiles(lx) - 1;
+    if (tile_maxy == -1)
+        tile_maxy = file.numYTiles(ly) - 1;
+    return true;
+}
+
+// The reading methods of TiledInputFile.  They are templates so that
+// the tiled parts of a MultiPartInputFile, TiledInputParts, are read
+// with the same arguments.
+
+template <class F>
+static PyObject *tiledchannel(F &file, FileLock *lock, PyObject *args, PyObject *kw)
+{
+    int tile_minx=0;
+    int tile_miny=0;
+    int tile_maxx=-1;
+    int tile_maxy=-1;
+    int lx = 0;
+    int ly = -1;
+    PyObject *window_obj = NULL;
+
+    char *cname;
+    PyObject *pixel_type = NULL;
+    PyObject *as_numpy = Py_False;
+    char *keywords[] = { (char*)"cname", (char*)"pixel_type", (char*)"tilex_min", (char*)"tilex_max", (char*) "tiley_min", (char*) "tiley_max", (char*)"numpy", (char*)"lx", (char*)"ly", (char*)"window", NULL };
+    if (!PyArg_ParseTupleAndKeywords(args, kw, "s|OiiiiOiiO", keywords, &cname, &pixel_type, &tile_minx, &tile_maxx, &tile_miny, &tile_maxy, &as_numpy, &lx, &ly, &window_obj))
+        return NULL;
+    if (!tiledefaults(file, tile_maxx, tile_maxy, lx, ly))
+        return NULL;
+    Box2i box;
+    const Box2i *window;
+    if (!windowarg(window_obj, box, window))
+        return NULL;
+
+    std::vector<std::string> names(1, cname);
+    return onlyitem(readtiles(file, lock, names, pixel_type, tile_minx, tile_maxx, tile_miny, tile_maxy, lx, ly, PyObject_IsTrue(as_numpy), window));
+}
+
+static PyObject *channel_tiled(PyObject *self, PyObject *args, PyObject *kw)
+{
+    if (!((TiledInputFileC *)self)->is_opened) {
+	PyErr_SetString(PyExc_OSError, "cannot read from closed file");
+	return NULL;
+    }
+    TiledInputFileC *pc = (TiledInputFileC *)self;
+    return tiledchannel(pc->i, pc->lock, args, kw);
+}
+
+template <class F>
+static PyObject *tiledchannels(F &file, FileLock *lock, PyObject *args, PyObject *kw)
+{
+    int tile_minx=0;
+    int tile_miny=0;
+    int tile_maxx=-1;
+    int tile_maxy=-1;
+    int lx = 0;
+    int ly = -1;
+    PyObject *window_obj = NULL;
+
+    PyObject *clist;
+    PyObject *pixel_type = NULL;
+    PyObject *as_numpy = Py_False;
+    char *keywords[] = { (char*)"cnames", (char*)"pixel_type", (char*)"tilex_min", (char*)"tilex_max", (char*) "tiley_min", (char*) "tiley_max", (char*)"numpy", (char*)"lx", (char*)"ly", (char*)"window", NULL };
+    if (!PyArg_ParseTupleAndKeywords(args, kw, "O|OiiiiOiiO", keywords, &clist, &pixel_type, &tile_minx, &tile_maxx, &tile_miny, &tile_maxy, &as_numpy, &lx, &ly, &window_obj))
+	return NULL;
+    if (!tiledefaults(file, tile_maxx, tile_maxy, lx, ly))
+        return NULL;
+    Box2i box;
+    const Box2i *window;
+    if (!windowarg(window_obj, box, window))
+        return NULL;
+
+    std::vector<std::string> names;
+    if (!channelnames(clist, names))
+        return NULL;
+    return readtiles(file, lock, names, pixel_type, tile_minx, tile_maxx, tile_miny, tile_maxy, lx, ly, PyObject_IsTrue(as_numpy), window);
+}
+
+static PyObject *channels_tiled(PyObject *self, PyObject *args, PyObject *kw)
+{
+    if (!((TiledInputFileC *)self)->is_opened) {
+	PyErr_SetString(PyExc_OSError, "cannot read from closed file");
+	return NULL;
+    }
+    TiledInputFileC *pc = (TiledInputFileC *)self;
+    return tiledchannels(pc->i, pc->lock, args, kw);
+}
+
+template <class F>
+static PyObject *tiledchannelinto(F &file, FileLock *lock, PyObject *args, PyObject *kw)
+{
+    int tile_minx=0;
+    int tile_miny=0;
+    int tile_maxx=-1;
+    int tile_maxy=-1;
+    int lx = 0;
+    int ly = -1;
+    PyObject *window_obj = NULL;
+
+    char *cname;
+    PyObject *buffer;
+    PyObject *pixel_type = NULL;
+    char *keywords[] = { (char*)"cname", (char*)"buffer", (char*)"pixel_type", (char*)"tilex_min", (char*)"tilex_max", (char*) "tiley_min", (char*) "tiley_max", (char*)"lx", (char*)"ly", (char*)"window", NULL };
+    if (!PyArg_ParseTupleAndKeywords(args, kw, "sO|OiiiiiiO", keywords, &cname, &buffer, &pixel_type, &tile_minx, &tile_maxx, &tile_miny, &tile_maxy, &lx, &ly, &window_obj))
+        return NULL;
+    if (!tiledefaults(file, tile_maxx, tile_maxy, lx, ly))
+        return NULL;
+    Box2i box;
+    const Box2i *window;
+    if (!windowarg(window_obj, box, window))
+        return NULL;
+
+    std::vector<std::string> names(1, cname);
+    std::vector<PyObject *> bufs(1, buffer);
+    if (!readtilesinto(file, lock, names, bufs, pixel_type, tile_minx, tile_maxx, tile_miny, tile_maxy, lx, ly, window))
+        return NULL;
+
+    Py_INCREF(buffer);
+    return buffer;
+}
+
+static PyObject *channel_into_tiled(PyObject *self, PyObject *args, PyObject *kw)
+{
+    if (!((TiledInputFileC *)self)->is_opened) {
+	PyErr_SetString(PyExc_OSError, "cannot read from closed file");
+	return NULL;
+    }
+    TiledInputFileC *pc = (TiledInputFileC *)self;
+    return tiledchannelinto(pc->i, pc->lock, args, kw);
+}
+
+template <class F>
+static PyObject *tiledchannelsinto(F &file, FileLock *lock, PyObject *args, PyObject *kw)
+{
+    int tile_minx=0;
+    int tile_miny=0;
+    int tile_maxx=-1;
+    int tile_maxy=-1;
+    int lx = 0;
+    int ly = -1;
+    PyObject *window_obj = NULL;
+
+    PyObject *clist;
+    PyObject *buffers;
+    PyObject *pixel_type = NULL;
+    char *keywords[] = { (char*)"cnames", (char*)"buffers", (char*)"pixel_type", (char*)"tilex_min", (char*)"tilex_max", (char*) "tiley_min", (char*) "tiley_max", (char*)"lx", (char*)"ly", (char*)"window", NULL };
+    if (!PyArg_ParseTupleAndKeywords(args, kw, "OO|OiiiiiiO", keywords, &clist, &buffers, &pixel_type, &tile_minx, &tile_maxx, &tile_miny, &tile_maxy, &lx, &ly, &window_obj))
+        return NULL;
+    if (!tiledefaults(file, tile_maxx, tile_maxy, lx, ly))
+        return NULL;
+    Box2i box;
+    const Box2i *window;
+    if (!windowarg(window_obj, box, window))
+        return NULL;
+
+    std::vector<std::string> names;
+    std::vector<PyObject *> bufs;
+    if (!namesandbuffers(clist, buffers, names, bufs))
+        return NULL;
+    if (!readtilesinto(file, lock, names, bufs, pixel_type, tile_minx, tile_maxx, tile_miny, tile_maxy, lx, ly, window))
+        return NULL;
+
+    Py_INCREF(buffers);
+    return buffers;
+}
+
+static PyObject *channels_into_tiled(PyObject *self, PyObject *args, PyObject *kw)
+{
+    if (!((TiledInputFileC *)self)->is_opened) {
+	PyErr_SetString(PyExc_OSError, "cannot read from closed file");
+	return NULL;
+    }
+    TiledInputFileC *pc = (TiledInputFileC *)self;
+    return tiledchannelsinto(pc->i, pc->lock, args, kw);
+}
+
+template <class F>
+static PyObject *tiledchannelsinterleaved(F &file, FileLock *lock, PyObject *args, PyObject *kw)
+{
+    int tile_minx=0;
+    int tile_miny=0;
+    int tile_maxx=-1;
+    int tile_maxy=-1;
+    int lx = 0;
+    int ly = -1;
+    PyObject *window_obj = NULL;
+
+    PyObject *clist;
+    PyObject *pixel_type = NULL;
+    PyObject *buffer = NULL;
+    PyObject *as_numpy = Py_False;
+    char *keywords[] = { (char*)"cnames", (char*)"pixel_type", (char*)"tilex_min", (char*)"tilex_max", (char*) "tiley_min", (char*) "tiley_max", (char*)"buffer", (char*)"numpy", (char*)"lx", (char*)"ly", (char*)"window", NULL };
+    if (!PyArg_ParseTupleAndKeywords(args, kw, "O|OiiiiOOiiO", keywords, &clist, &pixel_type, &tile_minx, &tile_maxx, &tile_miny, &tile_maxy, &buffer, &as_numpy, &lx, &ly, &window_obj))
+        return NULL;
+    if (buffer == Py_None)
+        buffer = NULL;
+    if (!tiledefaults(file, tile_maxx, tile_maxy, lx, ly))
+        return NULL;
+    Box2i box;
+    const Box2i *window;
+    if (!windowarg(window_obj, box, window))
+        return NULL;
+
+    return readtilesinterleaved(file, lock, clist, pixel_type, buffer, PyObject_IsTrue(as_numpy), tile_minx, tile_maxx, tile_miny, tile_maxy, lx, ly, window);
+}
+
+static PyObject *channels_interleaved_tiled(PyObject *self, PyObject *args, PyObject *kw)
+{
+    if (!((TiledInputFileC *)self)->is_opened) {
+	PyErr_SetString(PyExc_OSError, "cannot read from closed file");
+	return NULL;
+    }
+    TiledInputFileC *pc = (TiledInputFileC *)self;
+    return tiledchannelsinterleaved(pc->i, pc->lock, args, kw);
+}
+
+static PyObject *inclose_tiled(PyObject *self, PyObject *args)
+{
+    TiledInputFileC *pc = ((TiledInputFileC *)self);
+    if (pc->is_opened) {
+	pc->is_opened = 0;
+	TiledInputFile *file = &((TiledInputFileC *)self)->i;
+	ReleaseGIL nogil(pc->lock, true);
+	file->~TiledInputFile();
+	delete pc->istream;
+	pc->istream = NULL;
+    }
+    Py_RETURN_NONE;
+}
+
+static PyObject *tiles_x(PyObject *self, PyObject *args)
+{
+    int level = 0;
+    if (!PyArg_ParseTuple(args, "|i", &level))
+	return NULL;
+    if (!((TiledInputFileC *)self)->is_opened) {
+	PyErr_SetString(PyExc_OSError, "file is closed");
+	return NULL;
+    }
+    TiledInputFile *file = &((TiledInputFileC *)self)->i;
+    int n;
+    try
+	{
+	    n = file->numXTiles(level);
+	}
+    catch (const std::exception &e)
+	{
+	    PyErr_SetString(PyExc_OSError, e.what());
+	    return NULL;
+	}
+    return PyLong_FromLong(n);
+}
+
+static PyObject *tiles_y(PyObject *self, PyObject *args)
+{
+    int level = 0;
+    if (!PyArg_ParseTuple(args, "|i", &level))
+	return NULL;
+    if (!((TiledInputFileC *)self)->is_opened) {
+	PyErr_SetString(PyExc_OSError, "file is closed");
+	return NULL;
+    }
+    TiledInputFile *file = &((TiledInputFileC *)self)->i;
+    int n;
+    try
+	{
+	    n = file->numYTiles(level);
+	}
+    catch (const std::exception &e)
+	{
+	    PyErr_SetString(PyExc_OSError, e.what());
+	    return NULL;
+	}
+    return PyLong_FromLong(n);
+}
+
+static PyObject *levels_tiled(PyObject *self, PyObject *args)
+{
+    TiledInputFileC *pc = (TiledInputFileC *)self;
+    return levelquery(pc->i, pc->is_opened, args, NUM_LEVELS);
+}
+
+static PyObject *xlevels_tiled(PyObject *self, PyObject *args)
+{
+    TiledInputFileC *pc = (TiledInputFileC *)self;
+    return levelquery(pc->i, pc->is_opened, args, NUM_X_LEVELS);
+}
+
+static PyObject *ylevels_tiled(PyObject *self, PyObject *args)
+{
+    TiledInputFileC *pc = (TiledInputFileC *)self;
+    return levelquery(pc->i, pc->is_opened, args, NUM_Y_LEVELS);
+}
+
+static PyObject *levelwidth_tiled(PyObject *self, PyObject *args)
+{
+    TiledInputFileC *pc = (TiledInputFileC *)self;
+    return levelquery(pc->i, pc->is_opened, args, LEVEL_WIDTH);
+}
+
+static PyObject *levelheight_tiled(PyObject *self, PyObject *args)
+{
+    TiledInputFileC *pc = (TiledInputFileC *)self;
+    return levelquery(pc->i, pc->is_opened, args, LEVEL_HEIGHT);
+}
+
+static PyObject *isComplete_tiled(PyObject *self, PyObject *args)
+{
+    TiledInputFile *file = &((TiledInputFileC *)self)->i;
+    return PyBool_FromLong(file->isComplete());
+}
+
+////////////////////////////////////////////////////////////////////////
+//    InputFile
+////////////////////////////////////////////////////////////////////////
+
+typedef struct {
+    PyObject_HEAD
+    InputFile i;
+    PyObject *fo;
+    IStream *istream;
+    int is_opened;
+    FileLock *lock;
+    PyObject *header;
+} InputFileC;
+
+static PyObject *channel(PyObject *self, PyObject *args, PyObject *kw)
+{
+    if (!((InputFileC *)self)->is_opened) {
+	PyErr_SetString(PyExc_OSError, "cannot read from closed file");
+	return NULL;
+    }
+    InputFile *file = &((InputFileC *)self)->i;
+
+    Box2i dw = file->header().dataWindow();
+    int miny, maxy;
+
+    miny = dw.min.y;
+    maxy = dw.max.y;
+
+    char *cname;
+    PyObject *pixel_type = NULL;
+    PyObject *as_numpy = Py_False;
+    PyObject *window_obj = NULL;
+    char *keywords[] = { (char*)"cname", (char*)"pixel_type", (char*)"scanLine1", (char*)"scanLine2", (char*)"numpy", (char*)"window", NULL };
+    if (!PyArg_ParseTupleAndKeywords(args, kw, "s|OiiOO", keywords, &cname, &pixel_type, &miny, &maxy, &as_numpy, &window_obj))
+        return NULL;
+    Box2i box;
+    const Box2i *window;
+    if (!windowarg(window_obj, box, window))
+        return NULL;
+
+    std::vector<std::string> names(1, cname);
+    return onlyitem(readscanlines(*file, file->header(), ((InputFileC *)self)->lock, names, pixel_type, miny, maxy, PyObject_IsTrue(as_numpy), window));
+}
+
+static PyObject *channels(PyObject *self, PyObject *args, PyObject *kw)
+{
+    if (!((InputFileC *)self)->is_opened) {
+	PyErr_SetString(PyExc_OSError, "cannot read from closed file");
+	return NULL;
+    }
+    InputFile *file = &((InputFileC *)self)->i;
+
+    Box2i dw = file->header().dataWindow();
+    int miny, maxy;
+
+    miny = dw.min.y;
+    maxy = dw.max.y;
+
+    PyObject *clist;
+    PyObject *pixel_type = NULL;
+    PyObject *as_numpy = Py_False;
+    PyObject *window_obj = NULL;
+    char *keywords[] = { (char*)"cnames", (char*)"pixel_type", (char*)"scanLine1", (char*)"scanLine2", (char*)"numpy", (char*)"window", NULL };
+    if (!PyArg_ParseTupleAndKeywords(args, kw, "O|OiiOO", keywords, &clist, &pixel_type, &miny, &maxy, &as_numpy, &window_obj))
+        return NULL;
+    Box2i box;
+    const Box2i *window;
+    if (!windowarg(window_obj, box, window))
+        return NULL;
+
+    std::vector<std::string> names;
+    if (!channelnames(clist, names))
+        return NULL;
+    return readscanlines(*file, file->header(), ((InputFileC *)self)->lock, names, pixel_type, miny, maxy, PyObject_IsTrue(as_numpy), window);
+}
 
-      size_t xstride = typeSize;
-      size_t ystride = typeSize * width;
+static PyObject *channel_into(PyObject *self, PyObject *args, PyObject *kw)
+{
+    if (!((InputFileC *)self)->is_opened) {
+	PyErr_SetString(PyExc_OSError, "cannot read from closed file");
+	return NULL;
+    }
+    InputFile *file = &((InputFileC *)self)->i;
 
-      PyObject *r = PyString_FromStringAndSize(NULL, typeSize * width * height);
-      PyList_Append(retval, r);
-      Py_DECREF(r);
+    Box2i dw = file->header().dataWindow();
+    int miny = dw.min.y;
+    int maxy = dw.max.y;
 
-      char *pixels = PyString_AsString(r);
+    char *cname;
+    PyObject *buffer;
+    PyObject *pixel_type = NULL;
+    PyObject *window_obj = NULL;
+    char *keywords[] = { (char*)"cname", (char*)"buffer", (char*)"pixel_type", (char*)"scanLine1", (char*)"scanLine2", (char*)"window", NULL };
+    if (!PyArg_ParseTupleAndKeywords(args, kw, "sO|OiiO", keywords, &cname, &buffer, &pixel_type, &miny, &maxy, &window_obj))
+        return NULL;
+    Box2i box;
+    const Box2i *window;
+    if (!windowarg(window_obj, box, window))
+        return NULL;
 
-      try
-      {
-          frameBuffer.insert(cname,
-                             Slice(pt,
-                                   pixels - dw.min.x * xstride - miny * ystride,
-                                   xstride,
-                                   ystride,
-                                   1,1,
-                                   0.0));
-      }
-      catch (const std::exception &e)
-      {
-         PyErr_SetString(PyExc_OSError, e.what());
-         return NULL;
-      }
-      Py_DECREF(item);
+    std::vector<std::string> names(1, cname);
+    std::vector<PyObject *> bufs(1, buffer);
+    if (!readscanlinesinto(*file, file->header(), ((InputFileC *)self)->lock, names, bufs, pixel_type, miny, maxy, window))
+        return NULL;
+
+    Py_INCREF(buffer);
+    return buffer;
+}
+
+static PyObject *channels_into(PyObject *self, PyObject *args, PyObject *kw)
+{
+    if (!((InputFileC *)self)->is_opened) {
+	PyErr_SetString(PyExc_OSError, "cannot read from closed file");
+	return NULL;
     }
-    Py_DECREF(iterator);
-    file->setFrameBuffer(frameBuffer);
-    file->readPixels(miny, maxy);
+    InputFile *file = &((InputFileC *)self)->i;
 
-    return retval;
+    Box2i dw = file->header().dataWindow();
+    int miny = dw.min.y;
+    int maxy = dw.max.y;
+
+    PyObject *clist;
+    PyObject *buffers;
+    PyObject *pixel_type = NULL;
+    PyObject *window_obj = NULL;
+    char *keywords[] = { (char*)"cnames", (char*)"buffers", (char*)"pixel_type", (char*)"scanLine1", (char*)"scanLine2", (char*)"window", NULL };
+    if (!PyArg_ParseTupleAndKeywords(args, kw, "OO|OiiO", keywords, &clist, &buffers, &pixel_type, &miny, &maxy, &window_obj))
+        return NULL;
+    Box2i box;
+    const Box2i *window;
+    if (!windowarg(window_obj, box, window))
+        return NULL;
+
+    std::vector<std::string> names;
+    std::vector<PyObject *> bufs;
+    if (!namesandbuffers(clist, buffers, names, bufs))
+        return NULL;
+    if (!readscanlinesinto(*file, file->header(), ((InputFileC *)self)->lock, names, bufs, pixel_type, miny, maxy, window))
+        return NULL;
+
+    Py_INCREF(buffers);
+    return buffers;
+}
+
+static PyObject *channels_interleaved(PyObject *self, PyObject *args, PyObject *kw)
+{
+    if (!((InputFileC *)self)->is_opened) {
+	PyErr_SetString(PyExc_OSError, "cannot read from closed file");
+	return NULL;
+    }
+    InputFile *file = &((InputFileC *)self)->i;
+
+    Box2i dw = file->header().dataWindow();
+    int miny = dw.min.y;
+    int maxy = dw.max.y;
+
+    PyObject *clist;
+    PyObject *pixel_type = NULL;
+    PyObject *buffer = NULL;
+    PyObject *as_numpy = Py_False;
+    PyObject *window_obj = NULL;
+    char *keywords[] = { (char*)"cnames", (char*)"pixel_type", (char*)"scanLine1", (char*)"scanLine2", (char*)"buffer", (char*)"numpy", (char*)"window", NULL };
+    if (!PyArg_ParseTupleAndKeywords(args, kw, "O|OiiOOO", keywords, &clist, &pixel_type, &miny, &maxy, &buffer, &as_numpy, &window_obj))
+        return NULL;
+    if (buffer == Py_None)
+        buffer = NULL;
+    Box2i box;
+    const Box2i *window;
+    if (!windowarg(window_obj, box, window))
+        return NULL;
+
+    return readscanlinesinterleaved(*file, file->header(), ((InputFileC *)self)->lock, clist, pixel_type, buffer, PyObject_IsTrue(as_numpy), miny, maxy, window);
+}
+
+static PyObject *channels_tonemapped(PyObject *self, PyObject *args, PyObject *kw)
+{
+    if (!((InputFileC *)self)->is_opened) {
+	PyErr_SetString(PyExc_OSError, "cannot read from closed file");
+	return NULL;
+    }
+    InputFile *file = &((InputFileC *)self)->i;
+
+    Box2i dw = file->header().dataWindow();
+    int miny = dw.min.y;
+    int maxy = dw.max.y;
+
+    PyObject *clist;
+    ToneMap tm;
+    tm.bits = 8;
+    tm.exposure = 0.0;
+    PyObject *transfer = NULL;
+    PyObject *autorange = Py_False;
+    PyObject *as_numpy = Py_False;
+    PyObject *window_obj = NULL;
+    char *keywords[] = { (char*)"cnames", (char*)"bits", (char*)"exposure", (char*)"transfer", (char*)"autorange", (char*)"scanLine1", (char*)"scanLine2", (char*)"numpy", (char*)"window", NULL };
+    if (!PyArg_ParseTupleAndKeywords(args, kw, "O|idOOiiOO", keywords, &clist, &tm.bits, &tm.exposure, &transfer, &autorange, &miny, &maxy, &as_numpy, &window_obj))
+        return NULL;
+    if (tm.bits != 8 && tm.bits != 16) {
+        PyErr_SetString(PyExc_TypeError, "bits must be 8 or 16");
+        return NULL;
+    }
+    if (!transfer_from_object(transfer, tm))
+        return NULL;
+    tm.autorange = PyObject_IsTrue(autorange);
+    Box2i box;
+    const Box2i *window;
+    if (!windowarg(window_obj, box, window))
+        return NULL;
+
+    return readscanlinestonemapped(*file, file->header(), ((InputFileC *)self)->lock, clist, tm, PyObject_IsTrue(as_numpy), miny, maxy, window);
+}
+
+static PyObject *thumbnail(PyObject *self, PyObject *args, PyObject *kw)
+{
+    if (!((InputFileC *)self)->is_opened) {
+	PyErr_SetString(PyExc_OSError, "cannot read from closed file");
+	return NULL;
+    }
+    InputFile *file = &((InputFileC *)self)->i;
+
+    PyObject *clist;
+    int size;
+    const char *filter = "box";
+    PyObject *as_numpy = Py_False;
+    char *keywords[] = { (char*)"cnames", (char*)"size", (char*)"filter", (char*)"numpy", NULL };
+    if (!PyArg_ParseTupleAndKeywords(args, kw, "Oi|sO:thumbnail", keywords, &clist, &size, &filter, &as_numpy))
+        return NULL;
+    bool lanczos = strcmp(filter, "lanczos") == 0;
+    if (!lanczos && strcmp(filter, "box") != 0) {
+        PyErr_SetString(PyExc_TypeError, "filter must be 'box' or 'lanczos'");
+        return NULL;
+    }
+
+    return readthumbnail(*file, file->header(), ((InputFileC *)self)->lock, clist, size, lanczos, PyObject_IsTrue(as_numpy));
+}
+
+////////////////////////////////////////////////////////////////////////
+//    Scan line block iteration
+////////////////////////////////////////////////////////////////////////
+
+// The iterator returned by InputFile.iter_blocks.  It decodes blocks of
+// rows scan lines into a ring of nbuffers sets of channel buffers, and
+// yields views of them, so its memory does not grow with the image.
+
+typedef struct {
+    PyObject_HEAD
+    PyObject *file;
+    PyObject *cnames;
+    PyObject *pixel_type;
+    PyObject *ring;
+    int as_numpy;
+    int slot;
+    int rows;
+    int y;
+    int maxy;
+} ScanLineBlocksC;
+
+static PyObject *blocks_next(PyObject *self)
+{
+    ScanLineBlocksC *it = (ScanLineBlocksC *)self;
+    InputFileC *pc = (InputFileC *)it->file;
+    if (it->y > it->maxy)
+        return NULL;
+    if (!pc->is_opened) {
+	PyErr_SetString(PyExc_OSError, "cannot read from closed file");
+	return NULL;
+    }
+    const Header &header = pc->i.header();
+    Box2i dw = header.dataWindow();
+
+    int miny = it->y;
+    int maxy = std::min(it->maxy, dw.min.y + ((miny - dw.min.y) / it->rows + 1) * it->rows - 1);
+    int height = maxy - miny + 1;
+
+    std::vector<std::string> names;
+    if (!channelnames(it->cnames, names))
+        return NULL;
+
+    PyObject *buffers = PyList_GET_ITEM(it->ring, it->slot);
+    PyObject *views = PyList_New(names.size());
+    for (size_t i = 0; i < names.size(); i++) {
+        PyObject *buffer = PyList_GET_ITEM(buffers, i);
+        const Channel *channelPtr = header.channels().findChannel(names[i].c_str());
+        Py_ssize_t n = height / channelPtr->ySampling;
+        PyObject *view;
+        if (it->as_numpy) {
+            view = PySequence_GetSlice(buffer, 0, n);
+        } else {
+            Py_ssize_t lines = it->rows / channelPtr->ySampling;
+            view = PySequence_GetSlice(buffer, 0, n * (PyObject_Length(buffer) / lines));
+        }
+        if (view == NULL) {
+            Py_DECREF(views);
+            return NULL;
+        }
+        PyList_SET_ITEM(views, i, view);
+    }
+
+    std::vector<PyObject *> bufs;
+    for (size_t i = 0; i < names.size(); i++)
+        bufs.push_back(PyList_GET_ITEM(views, i));
+    if (!readscanlinesinto(pc->i, header, pc->lock, names, bufs, it->pixel_type, miny, maxy)) {
+        Py_DECREF(views);
+        return NULL;
+    }
+
+    it->y = maxy + 1;
+    it->slot = (it->slot + 1) % PyList_GET_SIZE(it->ring);
+    return Py_BuildValue("(iiN)", miny, maxy, views);
+}
+
+static void blocks_dealloc(PyObject *self)
+{
+    ScanLineBlocksC *it = (ScanLineBlocksC *)self;
+    Py_XDECREF(it->file);
+    Py_XDECREF(it->cnames);
+    Py_XDECREF(it->pixel_type);
+    Py_XDECREF(it->ring);
+    PyObject_Del(self);
+}
+
+static PyTypeObject ScanLineBlocks_Type = {
+    PyVarObject_HEAD_INIT(&PyType_Type, 0)
+    "OpenEXR.ScanLineBlocks",
+    sizeof(ScanLineBlocksC),
+    0,
+    (destructor)blocks_dealloc,
+};
+
+// Makes the ring of buffers for iter_blocks: nbuffers lists, each with
+// a buffer of rows scan lines for each channel.  Buffers are numpy
+// arrays, or memoryviews of bytearrays.
+
+static PyObject *newblockring(const Header &header, std::vector<std::string> &names,
+                              PyObject *pixel_type, int rows, int nbuffers, bool as_numpy)
+{
+    Box2i dw = header.dataWindow();
+    int width = dw.max.x - dw.min.x + 1;
+    PyObject *ring = PyList_New(0);
+    for (int slot = 0; slot < nbuffers; slot++) {
+        PyObject *buffers;
+        if (as_numpy) {
+            buffers = newchannelbuffers(header.channels(), names, pixel_type, width, rows, true);
+        } else {
+            buffers = PyList_New(0);
+            for (size_t i = 0; buffers != NULL && i < names.size(); i++) {
+                const Channel *channelPtr = header.channels().findChannel(names[i].c_str());
+                if (channelPtr == NULL) {
+                    Py_CLEAR(buffers);
+                    PyErr_Format(PyExc_TypeError, "There is no channel '%s' in the image", names[i].c_str());
+                    break;
+                }
+                Imf::PixelType pt = channelPtr->type;
+                if (pixel_type != NULL && !pixeltype_from_object(pixel_type, pt)) {
+                    Py_CLEAR(buffers);
+                    break;
+                }
+                Py_ssize_t size = compute_typesize(pt) * (width / channelPtr->xSampling) * (rows / channelPtr->ySampling);
+                PyObject *b = PyByteArray_FromStringAndSize(NULL, size);
+                PyObject *m = (b == NULL) ? NULL : PyMemoryView_FromObject(b);
+                Py_XDECREF(b);
+                if (m == NULL) {
+                    Py_CLEAR(buffers);
+                    break;
+                }
+                PyList_Append(buffers, m);
+                Py_DECREF(m);
+            }
+        }
+        if (buffers == NULL) {
+            Py_DECREF(ring);
+            return NULL;
+        }
+        PyList_Append(ring, buffers);
+        Py_DECREF(buffers);
+    }
+    return ring;
+}
+
+static PyObject *iter_blocks(PyObject *self, PyObject *args, PyObject *kw)
+{
+    InputFileC *pc = (InputFileC *)self;
+    if (!pc->is_opened) {
+	PyErr_SetString(PyExc_OSError, "cannot read from closed file");
+	return NULL;
+    }
+    const Header &header = pc->i.header();
+    Box2i dw = header.dataWindow();
+    int miny = dw.min.y;
+    int maxy = dw.max.y;
+    int rows = 0;
+    int nbuffers = 2;
+
+    PyObject *clist;
+    PyObject *pixel_type = NULL;
+    PyObject *as_numpy = Py_False;
+    char *keywords[] = { (char*)"cnames", (char*)"rows", (char*)"pixel_type", (char*)"scanLine1", (char*)"scanLine2", (char*)"numpy", (char*)"buffers", NULL };
+    if (!PyArg_ParseTupleAndKeywords(args, kw, "O|iOiiOi", keywords, &clist, &rows, &pixel_type, &miny, &maxy, &as_numpy, &nbuffers))
+        return NULL;
+    if (!checkscanlines(dw, miny, maxy))
+        return NULL;
+    if (rows < 0) {
+        PyErr_SetString(PyExc_TypeError, "rows must be >= 0");
+        return NULL;
+    }
+    if (nbuffers < 1) {
+        PyErr_SetString(PyExc_TypeError, "buffers must be >= 1");
+        return NULL;
+    }
+
+    // Blocks are whole chunks, at least 64 lines unless rows is given.
+    int chunk = linesperchunk(header);
+    if (rows == 0)
+        rows = 64;
+    rows = (rows + chunk - 1) / chunk * chunk;
+
+    std::vector<std::string> names;
+    if (!channelnames(clist, names))
+        return NULL;
+    PyObject *cnames = PyList_New(0);
+    for (size_t i = 0; i < names.size(); i++) {
+        PyObject *name = PyUnicode_FromString(names[i].c_str());
+        PyList_Append(cnames, name);
+        Py_DECREF(name);
+    }
+    PyObject *ring = newblockring(header, names, pixel_type, rows, nbuffers, PyObject_IsTrue(as_numpy));
+    if (ring == NULL) {
+        Py_DECREF(cnames);
+        return NULL;
+    }
+
+    ScanLineBlocksC *it = PyObject_New(ScanLineBlocksC, &ScanLineBlocks_Type);
+    if (it == NULL) {
+        Py_DECREF(cnames);
+        Py_DECREF(ring);
+        return NULL;
+    }
+    Py_INCREF(self);
+    it->file = self;
+    it->cnames = cnames;
+    Py_XINCREF(pixel_type);
+    it->pixel_type = pixel_type;
+    it->ring = ring;
+    it->as_numpy = PyObject_IsTrue(as_numpy);
+    it->slot = 0;
+    it->rows = rows;
+    it->y = miny;
+    it->maxy = maxy;
+    return (PyObject *)it;
 }
+
 static PyObject *inclose(PyObject *self, PyObject *args)
 {
   InputFileC *pc = ((InputFileC *)self);
   if (pc->is_opened) {
     pc->is_opened = 0;
     InputFile *file = &((InputFileC *)self)->i;
+    ReleaseGIL nogil(pc->lock, true);
     file->~InputFile();
+    delete pc->istream;
+    pc->istream = NULL;
   }
   Py_RETURN_NONE;
 }
 
-static PyObject *dict_from_header(Header h)
+// The Imath classes that header values are converted to.  They are
+// looked up once and kept for the life of the module.
+
+static PyObject *imath(const char *name)
+{
+    static std::map<std::string, PyObject *> classes;
+    PyObject *&c = classes[name];
+    if (c == NULL)
+        c = PyObject_GetAttrString(pModuleImath, name);
+    return c;
+}
+
+// Converts one header attribute to its Python value.  Attributes of
+// unknown type convert to None.
+
+static PyObject *value_from_attribute(const Attribute *a)
+{
+    PyObject *ob = NULL;
+
+    if (const Box2iAttribute *ta = dynamic_cast <const Box2iAttribute *> (a)) {
+
+        PyObject *ptargs[2];
+        ptargs[0] = Py_BuildValue("ii", ta->value().min.x, ta->value().min.y);
+        ptargs[1] = Py_BuildValue("ii", ta->value().max.x, ta->value().max.y);
+        PyObject *pt[2];
+        pt[0] = PyObject_CallObject(imath("point"), ptargs[0]);
+        pt[1] = PyObject_CallObject(imath("point"), ptargs[1]);
+        PyObject *boxArgs = Py_BuildValue("NN", pt[0], pt[1]);
+
+        ob = PyObject_CallObject(imath("Box2i"), boxArgs);
+        Py_DECREF(boxArgs);
+        Py_DECREF(ptargs[0]);
+        Py_DECREF(ptargs[1]);
+    } else if (const KeyCodeAttribute *ka = dynamic_cast <const KeyCodeAttribute *> (a)) {
+        PyObject *args = Py_BuildValue("iiiiiii",
+                                       ka->value().filmMfcCode(),
+                                       ka->value().filmType(),
+                                       ka->value().prefix(),
+                                       ka->value().count(),
+                                       ka->value().perfOffset(),
+                                       ka->value().perfsPerFrame(),
+                                       ka->value().perfsPerCount());
+            ob = PyObject_CallObject(imath("KeyCode"), args);
+            Py_DECREF(args);
+    } else if (const TimeCodeAttribute *ta = dynamic_cast <const TimeCodeAttribute *> (a)) {
+            PyObject *args = Py_BuildValue("iiiiiiiiiiiiiiiiii",
+                                           ta->value().hours(),
+                                           ta->value().minutes(),
+                                           ta->value().seconds(),
+                                           ta->value().frame(),
+                                           ta->value().dropFrame(),
+                                           ta->value().colorFrame(),
+                                           ta->value().fieldPhase(),
+                                           ta->value().bgf0(),
+                                           ta->value().bgf1(),
+                                           ta->value().bgf2(),
+                                           ta->value().binaryGroup(1),
+                                           ta->value().binaryGroup(2),
+                                           ta->value().binaryGroup(3),
+                                           ta->value().binaryGroup(4),
+                                           ta->value().binaryGroup(5),
+                                           ta->value().binaryGroup(6),
+                                           ta->value().binaryGroup(7),
+                                           ta->value().binaryGroup(8));
+            ob = PyObject_CallObject(imath("TimeCode"), args);
+            Py_DECREF(args);
+
+    } else if (const RationalAttribute *ra = dynamic_cast <const RationalAttribute *> (a)) {
+        PyObject *args = Py_BuildValue("ii", ra->value().n, ra->value().d);
+        ob = PyObject_CallObject(imath("Rational"), args);
+        Py_DECREF(args);
+    } else if (const PreviewImageAttribute *pia = dynamic_cast <const PreviewImageAttribute *> (a)) {
+        Py_ssize_t size = pia->value().width() * pia->value().height() * 4;
+#if PY_MAJOR_VERSION >= 3
+        const char fmt[] = "iiy#";
+#else
+        const char fmt[] = "iis#";
+#endif
+        PyObject *args = Py_BuildValue(fmt, pia->value().width(), pia->value().height(), (char*)pia->value().pixels(), size);
+        ob = PyObject_CallObject(imath("PreviewImage"), args);
+
+        Py_DECREF(args);
+    } else if (const LineOrderAttribute *ta = dynamic_cast <const LineOrderAttribute *> (a)) {
+        PyObject *args = PyTuple_Pack(1, PyInt_FromLong(ta->value()));
+        ob = PyObject_CallObject(imath("LineOrder"), args);
+        Py_DECREF(args);
+    } else if (const CompressionAttribute *ta = dynamic_cast <const CompressionAttribute *> (a)) {
+        PyObject *args = PyTuple_Pack(1, PyInt_FromLong(ta->value()));
+        ob = PyObject_CallObject(imath("Compression"), args);
+        Py_DECREF(args);
+    } else if (const ChannelListAttribute *ta = dynamic_cast <const ChannelListAttribute *> (a)) {
+        const ChannelList cl = ta->value();
+        PyObject *CS = PyDict_New();
+        for (ChannelList::ConstIterator j = cl.begin(); j != cl.end(); ++j) {
+            PyObject *ptarg = Py_BuildValue("(i)", j.channel().type);
+            PyObject *pt = PyObject_CallObject(imath("PixelType"), ptarg);
+            PyObject *chanarg = Py_BuildValue("Nii",
+                pt,
+                j.channel().xSampling,
+                j.channel().ySampling);
+            PyObject *C = PyObject_CallObject(imath("Channel"), chanarg);
+            PyDict_SetItemString(CS, j.name(), C);
+            Py_DECREF(C);
+            Py_DECREF(ptarg);
+            Py_DECREF(chanarg);
+        }
+        ob = CS;
+    } else if (const FloatAttribute *ta = dynamic_cast <const FloatAttribute *> (a)) {
+        ob = PyFloat_FromDouble(ta->value());
+    } else if (const IntAttribute *ta = dynamic_cast <const IntAttribute *> (a)) {
+        ob = PyInt_FromLong(ta->value());
+    } else if (const V2fAttribute *ta = dynamic_cast <const V2fAttribute *> (a)) {
+        PyObject *args = Py_BuildValue("ff", ta->value().x, ta->value().y);
+        ob = PyObject_CallObject(imath("V2f"), args);
+        Py_DECREF(args);
+    } else if (const StringAttribute *ta = dynamic_cast <const StringAttribute *> (a)) {
+        ob = PyString_FromString(ta->value().c_str());
+    } else if (const TileDescriptionAttribute *ta = dynamic_cast<const TileDescriptionAttribute *>(a)) {
+        const TileDescription td = ta->value();
+        PyObject *m = PyObject_Call1(imath("LevelMode"), Py_BuildValue("(i)", td.mode));
+        PyObject *r = PyObject_Call1(imath("LevelRoundingMode"), Py_BuildValue("(i)", td.roundingMode));
+        ob = PyObject_Call1(imath("TileDescription"), Py_BuildValue("(iiNN)", td.xSize, td.ySize, m, r));
+    } else if (const ChromaticitiesAttribute *ta = dynamic_cast<const ChromaticitiesAttribute *>(a)) {
+        const Chromaticities &ch(ta->value());
+        PyObject *rgbwargs[4];
+        rgbwargs[0] = Py_BuildValue("ff", ch.red[0], ch.red[1]);
+        rgbwargs[1] = Py_BuildValue("ff", ch.green[0], ch.green[1]);
+        rgbwargs[2] = Py_BuildValue("ff", ch.blue[0], ch.blue[1]);
+        rgbwargs[3] = Py_BuildValue("ff", ch.white[0], ch.white[1]);
+        PyObject *chromas[4];
+        chromas[0] = PyObject_CallObject(imath("chromaticity"), rgbwargs[0]);
+        chromas[1] = PyObject_CallObject(imath("chromaticity"), rgbwargs[1]);
+        chromas[2] = PyObject_CallObject(imath("chromaticity"), rgbwargs[2]);
+        chromas[3] = PyObject_CallObject(imath("chromaticity"), rgbwargs[3]);
+        PyObject *cargs = Py_BuildValue("NNNN", chromas[0], chromas[1], chromas[2], chromas[3]);
+        ob = PyObject_CallObject(imath("Chromaticities"), cargs);
+        Py_DECREF(cargs);
+        Py_DECREF(rgbwargs[0]);
+        Py_DECREF(rgbwargs[1]);
+        Py_DECREF(rgbwargs[2]);
+        Py_DECREF(rgbwargs[3]);
+#ifdef INCLUDED_IMF_STRINGVECTOR_ATTRIBUTE_H
+    } else if (const StringVectorAttribute *ta = dynamic_cast<const StringVectorAttribute *>(a)) {
+        StringVector sv = ta->value();
+        ob = PyList_New(sv.size());
+        for (size_t i = 0; i < sv.size(); i++)
+            PyList_SetItem(ob, i, PyString_FromString(sv[i].c_str()));
+#endif
+    } else {
+        // Unknown type for this object, so set its value to None.
+        // printf("Baffled by type %s\n", a->typeName());
+        ob = Py_None;
+        Py_INCREF(ob);
+    }
+    return ob;
+}
+
+static PyObject *dict_from_header(const Header &h)
+{
+    PyObject *object = PyDict_New();
+    for (Header::ConstIterator i = h.begin(); i != h.end(); ++i) {
+        PyObject *ob = value_from_attribute(&i.attribute());
+        PyDict_SetItemString(object, i.name(), ob);
+        Py_DECREF(ob);
+    }
+    return object;
+}
+
+// Returns the header of an input file as a dict.  Values that cannot
+// be modified (numbers, strings and None) are converted the first time
+// only and kept in *cache.  The others, such as the channels dict and
+// the Imath boxes, are converted on every call, so the caller owns the
+// whole dict and may edit it freely.  If a name is given, only that
+// attribute is converted.
+
+static PyObject *cachedheader(const Header &h, PyObject **cache, PyObject *args)
+{
+    char *name = NULL;
+    if (!PyArg_ParseTuple(args, "|s:header", &name))
+        return NULL;
+    if (name != NULL) {
+        Header::ConstIterator i = h.find(name);
+        if (i == h.end()) {
+            PyErr_SetString(PyExc_KeyError, name);
+            return NULL;
+        }
+        return value_from_attribute(&i.attribute());
+    }
+    if (*cache == NULL)
+        *cache = PyDict_New();
+    PyObject *object = PyDict_New();
+    for (Header::ConstIterator i = h.begin(); i != h.end(); ++i) {
+        PyObject *ob = PyDict_GetItemString(*cache, i.name());
+        if (ob != NULL) {
+            Py_INCREF(ob);
+        } else {
+            ob = value_from_attribute(&i.attribute());
+            if (ob == Py_None || PyFloat_Check(ob) || PyLong_Check(ob) ||
+                PyBytes_Check(ob) || PyUnicode_Check(ob))
+                PyDict_SetItemString(*cache, i.name(), ob);
+        }
+        PyDict_SetItemString(object, i.name(), ob);
+        Py_DECREF(ob);
+    }
+    return object;
+}
+
+enum HeaderField { DATA_WINDOW, DISPLAY_WINDOW, CHANNEL_NAMES, COMPRESSION };
+
+// Converts one of the required header attributes, without building the
+// header dict.
+
+template <class C, HeaderField F>
+static PyObject *headerfield(PyObject *self, PyObject *args)
+{
+    C *pc = (C *)self;
+    if (!pc->is_opened) {
+	PyErr_SetString(PyExc_OSError, "cannot read header from closed file");
+	return NULL;
+    }
+    const Header &h = pc->i.header();
+    switch (F) {
+    case DATA_WINDOW:
+        return value_from_attribute(&h.typedAttribute<Box2iAttribute>("dataWindow"));
+    case DISPLAY_WINDOW:
+        return value_from_attribute(&h.typedAttribute<Box2iAttribute>("displayWindow"));
+    case COMPRESSION:
+        return value_from_attribute(&h.typedAttribute<CompressionAttribute>("compression"));
+    default:
+        break;
+    }
+    PyObject *names = PyList_New(0);
+    for (ChannelList::ConstIterator i = h.channels().begin(); i != h.channels().end(); ++i) {
+        PyObject *name = PyUnicode_FromString(i.name());
+        PyList_Append(names, name);
+        Py_DECREF(name);
+    }
+    return names;
+}
+
+static PyObject *inheader(PyObject *self, PyObject *args)
+{
+    if (!((InputFileC *)self)->is_opened) {
+	PyErr_SetString(PyExc_OSError, "cannot read header from closed file");
+	return NULL;
+    }
+    InputFile *file = &((InputFileC *)self)->i;
+    return cachedheader(file->header(), &((InputFileC *)self)->header, args);
+}
+
+static PyObject *inheader_tiled(PyObject *self, PyObject *args)
+{
+    if (!((TiledInputFileC *)self)->is_opened) {
+	PyErr_SetString(PyExc_OSError, "cannot read header from closed file");
+	return NULL;
+    }
+    TiledInputFile *file = &((TiledInputFileC *)self)->i;
+    return cachedheader(file->header(), &((TiledInputFileC *)self)->header, args);
+}
+
+static PyObject *isComplete(PyObject *self, PyObject *args)
+{
+    InputFile *file = &((InputFileC *)self)->i;
+    return PyBool_FromLong(file->isComplete());
+}
+
+
+
+////////////////////////////////////////////////////////////////////////
+//    Awaitable reads and writes
+////////////////////////////////////////////////////////////////////////
+
+// The _async methods call the method of the same name on a thread of
+// asyncPool and return an asyncio future that the event loop resolves
+// with its result.  The decode or encode runs with the GIL released, so
+// the loop keeps running, and the size of the pool limits how many run
+// at once.  The pool is never deleted: its threads must not outlive the
+// interpreter's exit waiting for tasks.  Instead an atexit hook waits
+// for the tasks still queued, which need the interpreter to run.
+
+static IlmThread::ThreadPool *asyncPool = NULL;
+static IlmThread::TaskGroup *asyncGroup = NULL;
+static PyObject *asyncio_module = NULL;
+static PyObject *asyncResolve = NULL;
+
+// Registered with atexit: waits for every queued task to finish.
+
+static PyObject *async_drain(PyObject *self, PyObject *args)
+{
+    IlmThread::TaskGroup *group = asyncGroup;
+    asyncGroup = new IlmThread::TaskGroup;
+    {
+        ReleaseGIL nogil;
+        delete group;
+    }
+    Py_RETURN_NONE;
+}
+
+static PyMethodDef async_drain_def = {"_drain", async_drain, METH_NOARGS};
+
+static IlmThread::ThreadPool &asyncpool()
+{
+    if (asyncPool == NULL) {
+        asyncPool = new IlmThread::ThreadPool(std::max(1u, std::thread::hardware_concurrency()));
+        asyncGroup = new IlmThread::TaskGroup;
+        PyObject *atexit = PyImport_ImportModule("atexit");
+        PyObject *drain = PyCFunction_New(&async_drain_def, NULL);
+        PyObject *r = (atexit == NULL || drain == NULL) ? NULL :
+            PyObject_CallMethod(atexit, (char*)"register", (char*)"O", drain);
+        if (r == NULL)
+            PyErr_Clear();
+        Py_XDECREF(r);
+        Py_XDECREF(drain);
+        Py_XDECREF(atexit);
+    }
+    return *asyncPool;
+}
+
+// Called on the event loop with (future, result, exception).
+
+static PyObject *async_resolve(PyObject *self, PyObject *args)
 {
-    PyObject *object;
+    PyObject *future, *result, *exc;
+    if (!PyArg_ParseTuple(args, "OOO", &future, &result, &exc))
+        return NULL;
+    PyObject *cancelled = PyObject_CallMethod(future, (char*)"cancelled", NULL);
+    if (cancelled == NULL)
+        return NULL;
+    int skip = PyObject_IsTrue(cancelled);
+    Py_DECREF(cancelled);
+    if (skip)
+        Py_RETURN_NONE;
+    if (exc != Py_None)
+        return PyObject_CallMethod(future, (char*)"set_exception", (char*)"O", exc);
+    return PyObject_CallMethod(future, (char*)"set_result", (char*)"O", result);
+}
 
-    object = PyDict_New();
+static PyMethodDef async_resolve_def = {"_resolve", async_resolve, METH_VARARGS};
 
-    PyObject *pV2FFunc = PyObject_GetAttrString(pModuleImath, "V2f");
-    PyObject *pChanFunc = PyObject_GetAttrString(pModuleImath, "Channel");
-    PyObject *pPTFunc = PyObject_GetAttrString(pModuleImath, "PixelType");
-    PyObject *pBoxFunc = PyObject_GetAttrString(pModuleImath, "Box2i");
-    PyObject *pPointFunc = PyObject_GetAttrString(pModuleImath, "point");
-    PyObject *pPIFunc = PyObject_GetAttrString(pModuleImath, "PreviewImage");
-    PyObject *pLOFunc = PyObject_GetAttrString(pModuleImath, "LineOrder");
-    PyObject *pCFunc = PyObject_GetAttrString(pModuleImath, "Compression");
-    PyObject *pCHFunc = PyObject_GetAttrString(pModuleImath, "chromaticity");
-    PyObject *pCHSFunc = PyObject_GetAttrString(pModuleImath, "Chromaticities");
-    PyObject *pLevelMode = PyObject_GetAttrString(pModuleImath, "LevelMode");
-    PyObject *pLevelRoundingMode = PyObject_GetAttrString(pModuleImath, "LevelRoundingMode");
-    PyObject *pTileDescription = PyObject_GetAttrString(pModuleImath, "TileDescription");
-    PyObject *pRationalFunc = PyObject_GetAttrString(pModuleImath, "Rational");
-    PyObject *pKeyCodeFunc = PyObject_GetAttrString(pModuleImath, "KeyCode");
-    PyObject *pTimeCodeFunc = PyObject_GetAttrString(pModuleImath, "TimeCode");
+class AsyncTask : public IlmThread::Task
+{
+  public:
+    // Steals the references.
+    AsyncTask(IlmThread::TaskGroup *group, PyObject *method, PyObject *args,
+              PyObject *kw, PyObject *loop, PyObject *future)
+        : Task(group), _method(method), _args(args), _kw(kw), _loop(loop), _future(future) {}
 
-    for (Header::ConstIterator i = h.begin(); i != h.end(); ++i) {
-        const Attribute *a = &i.attribute();
-        PyObject *ob = NULL;
-
-        // cout << i.name() << " (type " << a->typeName() << ")\n";
-        if (const Box2iAttribute *ta = dynamic_cast <const Box2iAttribute *> (a)) {
-
-            PyObject *ptargs[2];
-            ptargs[0] = Py_BuildValue("ii", ta->value().min.x, ta->value().min.y);
-            ptargs[1] = Py_BuildValue("ii", ta->value().max.x, ta->value().max.y);
-            PyObject *pt[2];
-            pt[0] = PyObject_CallObject(pPointFunc, ptargs[0]);
-            pt[1] = PyObject_CallObject(pPointFunc, ptargs[1]);
-            PyObject *boxArgs = Py_BuildValue("NN", pt[0], pt[1]);
-
-            ob = PyObject_CallObject(pBoxFunc, boxArgs);
-            Py_DECREF(boxArgs);
-            Py_DECREF(ptargs[0]);
-            Py_DECREF(ptargs[1]);
-        } else if (const KeyCodeAttribute *ka = dynamic_cast <const KeyCodeAttribute *> (a)) {
-            PyObject *args = Py_BuildValue("iiiiiii",
-                                           ka->value().filmMfcCode(),
-                                           ka->value().filmType(),
-                                           ka->value().prefix(),
-                                           ka->value().count(),
-                                           ka->value().perfOffset(),
-                                           ka->value().perfsPerFrame(),
-                                           ka->value().perfsPerCount());
-                ob = PyObject_CallObject(pKeyCodeFunc, args);
-                Py_DECREF(args);
-        } else if (const TimeCodeAttribute *ta = dynamic_cast <const TimeCodeAttribute *> (a)) {
-                PyObject *args = Py_BuildValue("iiiiiiiiiiiiiiiiii",
-                                               ta->value().hours(),
-                                               ta->value().minutes(),
-                                               ta->value().seconds(),
-                                               ta->value().frame(),
-                                               ta->value().dropFrame(),
-                                               ta->value().colorFrame(),
-                                               ta->value().fieldPhase(),
-                                               ta->value().bgf0(),
-                                               ta->value().bgf1(),
-                                               ta->value().bgf2(),
-                                               ta->value().binaryGroup(1),
-                                               ta->value().binaryGroup(2),
-                                               ta->value().binaryGroup(3),
-                                               ta->value().binaryGroup(4),
-                                               ta->value().binaryGroup(5),
-                                               ta->value().binaryGroup(6),
-                                               ta->value().binaryGroup(7),
-                                               ta->value().binaryGroup(8));
-                ob = PyObject_CallObject(pTimeCodeFunc, args);
-                Py_DECREF(args);
-
-        } else if (const RationalAttribute *ra = dynamic_cast <const RationalAttribute *> (a)) {
-            PyObject *args = Py_BuildValue("ii", ra->value().n, ra->value().d);
-            ob = PyObject_CallObject(pRationalFunc, args);
-            Py_DECREF(args);
-        } else if (const PreviewImageAttribute *pia = dynamic_cast <const PreviewImageAttribute *> (a)) {
-            int size = pia->value().width() * pia->value().height() * 4;
+    void execute()
+    {
+        // Nothing can be run, or released, once the interpreter is gone.
+        if (!Py_IsInitialized())
+            return;
+        AcquireGIL gil;
+        PyObject *exc = Py_None;
+        PyObject *result = PyObject_Call(_method, _args, _kw);
+        if (result == NULL) {
+            PyObject *type, *tb;
+            PyErr_Fetch(&type, &exc, &tb);
+            PyErr_NormalizeException(&type, &exc, &tb);
 #if PY_MAJOR_VERSION >= 3
-            const char fmt[] = "iiy#";
-#else
-            const char fmt[] = "iis#";
-#endif
-            PyObject *args = Py_BuildValue(fmt, pia->value().width(), pia->value().height(), (char*)pia->value().pixels(), size);
-            ob = PyObject_CallObject(pPIFunc, args);
-
-            Py_DECREF(args);
-        } else if (const LineOrderAttribute *ta = dynamic_cast <const LineOrderAttribute *> (a)) {
-            PyObject *args = PyTuple_Pack(1, PyInt_FromLong(ta->value()));
-            ob = PyObject_CallObject(pLOFunc, args);
-            Py_DECREF(args);
-        } else if (const CompressionAttribute *ta = dynamic_cast <const CompressionAttribute *> (a)) {
-            PyObject *args = PyTuple_Pack(1, PyInt_FromLong(ta->value()));
-            ob = PyObject_CallObject(pCFunc, args);
-            Py_DECREF(args);
-        } else if (const ChannelListAttribute *ta = dynamic_cast <const ChannelListAttribute *> (a)) {
-            const ChannelList cl = ta->value();
-            PyObject *CS = PyDict_New();
-            for (ChannelList::ConstIterator j = cl.begin(); j != cl.end(); ++j) {
-                PyObject *ptarg = Py_BuildValue("(i)", j.channel().type);
-                PyObject *pt = PyObject_CallObject(pPTFunc, ptarg);
-                PyObject *chanarg = Py_BuildValue("Nii",
-                    pt,
-                    j.channel().xSampling,
-                    j.channel().ySampling);
-                PyObject *C = PyObject_CallObject(pChanFunc, chanarg);
-                PyDict_SetItemString(CS, j.name(), C);
-                Py_DECREF(C);
-                Py_DECREF(ptarg);
-                Py_DECREF(chanarg);
-            }
-            ob = CS;
-        } else if (const FloatAttribute *ta = dynamic_cast <const FloatAttribute *> (a)) {
-            ob = PyFloat_FromDouble(ta->value());
-        } else if (const IntAttribute *ta = dynamic_cast <const IntAttribute *> (a)) {
-            ob = PyInt_FromLong(ta->value());
-        } else if (const V2fAttribute *ta = dynamic_cast <const V2fAttribute *> (a)) {
-            PyObject *args = Py_BuildValue("ff", ta->value().x, ta->value().y);
-            ob = PyObject_CallObject(pV2FFunc, args);
-            Py_DECREF(args);
-        } else if (const StringAttribute *ta = dynamic_cast <const StringAttribute *> (a)) {
-            ob = PyString_FromString(ta->value().c_str());
-        } else if (const TileDescriptionAttribute *ta = dynamic_cast<const TileDescriptionAttribute *>(a)) {
-            const TileDescription td = ta->value();
-            PyObject *m = PyObject_Call1(pLevelMode, Py_BuildValue("(i)", td.mode));
-            PyObject *r = PyObject_Call1(pLevelRoundingMode, Py_BuildValue("(i)", td.roundingMode));
-            ob = PyObject_Call1(pTileDescription, Py_BuildValue("(iiNN)", td.xSize, td.ySize, m, r));
-        } else if (const ChromaticitiesAttribute *ta = dynamic_cast<const ChromaticitiesAttribute *>(a)) {
-            const Chromaticities &ch(ta->value());
-            PyObject *rgbwargs[4];
-            rgbwargs[0] = Py_BuildValue("ff", ch.red[0], ch.red[1]);
-            rgbwargs[1] = Py_BuildValue("ff", ch.green[0], ch.green[1]);
-            rgbwargs[2] = Py_BuildValue("ff", ch.blue[0], ch.blue[1]);
-            rgbwargs[3] = Py_BuildValue("ff", ch.white[0], ch.white[1]);
-            PyObject *chromas[4];
-            chromas[0] = PyObject_CallObject(pCHFunc, rgbwargs[0]);
-            chromas[1] = PyObject_CallObject(pCHFunc, rgbwargs[1]);
-            chromas[2] = PyObject_CallObject(pCHFunc, rgbwargs[2]);
-            chromas[3] = PyObject_CallObject(pCHFunc, rgbwargs[3]);
-            PyObject *cargs = Py_BuildValue("NNNN", chromas[0], chromas[1], chromas[2], chromas[3]);
-            ob = PyObject_CallObject(pCHSFunc, cargs);
-            Py_DECREF(cargs);
-            Py_DECREF(rgbwargs[0]);
-            Py_DECREF(rgbwargs[1]);
-            Py_DECREF(rgbwargs[2]);
-            Py_DECREF(rgbwargs[3]);
-#ifdef INCLUDED_IMF_STRINGVECTOR_ATTRIBUTE_H
-        } else if (const StringVectorAttribute *ta = dynamic_cast<const StringVectorAttribute *>(a)) {
-            StringVector sv = ta->value();
-            ob = PyList_New(sv.size());
-            for (size_t i = 0; i < sv.size(); i++)
-                PyList_SetItem(ob, i, PyString_FromString(sv[i].c_str()));
+            if (tb != NULL)
+                PyException_SetTraceback(exc, tb);
 #endif
+            Py_XDECREF(type);
+            Py_XDECREF(tb);
+            Py_INCREF(Py_None);
+            result = Py_None;
         } else {
-            // Unknown type for this object, so set its value to None.
-            // printf("Baffled by type %s\n", a->typeName());
-            ob = Py_None;
-            Py_INCREF(ob);
+            Py_INCREF(exc);
         }
-        PyDict_SetItemString(object, i.name(), ob);
-        Py_DECREF(ob);
+        PyObject *r = PyObject_CallMethod(_loop, (char*)"call_soon_threadsafe", (char*)"OOOO",
+                                          asyncResolve, _future, result, exc);
+        // The loop may have been closed while the call ran.
+        if (r == NULL)
+            PyErr_Clear();
+        Py_XDECREF(r);
+        Py_DECREF(result);
+        Py_DECREF(exc);
+        Py_DECREF(_method);
+        Py_DECREF(_args);
+        Py_XDECREF(_kw);
+        Py_DECREF(_loop);
+        Py_DECREF(_future);
     }
 
-    Py_DECREF(pV2FFunc);
-    Py_DECREF(pChanFunc);
-    Py_DECREF(pPTFunc);
-    Py_DECREF(pBoxFunc);
-    Py_DECREF(pPointFunc);
-    Py_DECREF(pPIFunc);
-    Py_DECREF(pLOFunc);
-    Py_DECREF(pCFunc);
-    Py_DECREF(pLevelMode);
-    Py_DECREF(pLevelRoundingMode);
-    Py_DECREF(pTileDescription);
-    Py_DECREF(pRationalFunc);
-    Py_DECREF(pKeyCodeFunc);
-    Py_DECREF(pTimeCodeFunc);
+  private:
+    PyObject *_method;
+    PyObject *_args;
+    PyObject *_kw;
+    PyObject *_loop;
+    PyObject *_future;
+};
 
-    return object;
+static PyObject *asynccall(PyObject *self, const char *name, PyObject *args, PyObject *kw)
+{
+    if (asyncio_module == NULL) {
+        asyncio_module = PyImport_ImportModule("asyncio");
+        if (asyncio_module == NULL)
+            return NULL;
+        asyncResolve = PyCFunction_New(&async_resolve_def, NULL);
+    }
+    PyObject *method = PyObject_GetAttrString(self, name);
+    if (method == NULL)
+        return NULL;
+    // The future belongs to the running loop; there is none outside a
+    // coroutine, and the RuntimeError says so.
+#if PY_VERSION_HEX >= 0x03070000
+    PyObject *loop = PyObject_CallMethod(asyncio_module, (char*)"get_running_loop", NULL);
+#else
+    PyObject *loop = PyObject_CallMethod(asyncio_module, (char*)"get_event_loop", NULL);
+#endif
+    PyObject *future = (loop == NULL) ? NULL : PyObject_CallMethod(loop, (char*)"create_future", NULL);
+    if (future == NULL) {
+        Py_DECREF(method);
+        Py_XDECREF(loop);
+        return NULL;
+    }
+    Py_INCREF(args);
+    Py_XINCREF(kw);
+    Py_INCREF(future);
+    IlmThread::ThreadPool &pool = asyncpool();
+    pool.addTask(new AsyncTask(asyncGroup, method, args, kw, loop, future));
+    return future;
 }
 
-static PyObject *inheader(PyObject *self, PyObject *args)
+enum AsyncMethod {
+    ASYNC_CHANNEL,
+    ASYNC_CHANNELS,
+    ASYNC_CHANNEL_INTO,
+    ASYNC_CHANNELS_INTO,
+    ASYNC_CHANNELS_INTERLEAVED,
+    ASYNC_WRITEPIXELS
+};
+
+static const char *asyncMethodNames[] = {
+    "channel",
+    "channels",
+    "channel_into",
+    "channels_into",
+    "channels_interleaved",
+    "writePixels"
+};
+
+template <AsyncMethod M>
+static PyObject *asyncmethod(PyObject *self, PyObject *args, PyObject *kw)
 {
-    if (!((InputFileC *)self)->is_opened) {
-	PyErr_SetString(PyExc_OSError, "cannot read header from closed file");
-	return NULL;
-    }
-    InputFile *file = &((InputFileC *)self)->i;
-    return dict_from_header(file->header());
+    return asynccall(self, asyncMethodNames[M], args, kw);
 }
 
-static PyObject *inheader_tiled(PyObject *self, PyObject *args)
+PyObject *set_async_thread_count(PyObject *self, PyObject *args)
 {
-    if (!((TiledInputFileC *)self)->is_opened) {
-	PyErr_SetString(PyExc_OSError, "cannot read header from closed file");
-	return NULL;
+    int n = 0;
+    if (!PyArg_ParseTuple(args, "i:setAsyncThreadCount", &n))
+        return NULL;
+    if (n < 1) {
+        PyErr_SetString(PyExc_TypeError, "Async thread count must be >= 1");
+        return NULL;
     }
-    TiledInputFile *file = &((TiledInputFileC *)self)->i;
-    return dict_from_header(file->header());
+    try
+    {
+        asyncpool().setNumThreads(n);
+    }
+    catch (const std::exception &e)
+    {
+        PyErr_SetString(PyExc_OSError, e.what());
+        return NULL;
+    }
+    Py_RETURN_NONE;
 }
 
-static PyObject *isComplete(PyObject *self, PyObject *args)
+PyObject *get_async_thread_count(PyObject *self, PyObject *args)
 {
-    InputFile *file = &((InputFileC *)self)->i;
-    return PyBool_FromLong(file->isComplete());
+    return PyLong_FromLong(asyncpool().numThreads());
 }
 
-
-
 /* Method tables */
 static PyMethodDef InputFile_methods[] = {
   {"header", inheader, METH_VARARGS},
+  {"dataWindow", headerfield<InputFileC, DATA_WINDOW>, METH_NOARGS},
+  {"displayWindow", headerfield<InputFileC, DISPLAY_WINDOW>, METH_NOARGS},
+  {"channelNames", headerfield<InputFileC, CHANNEL_NAMES>, METH_NOARGS},
+  {"compression", headerfield<InputFileC, COMPRESSION>, METH_NOARGS},
   {"channel", (PyCFunction)channel, METH_VARARGS | METH_KEYWORDS},
   {"channels", (PyCFunction)channels, METH_VARARGS | METH_KEYWORDS},
+  {"channel_into", (PyCFunction)channel_into, METH_VARARGS | METH_KEYWORDS},
+  {"channels_into", (PyCFunction)channels_into, METH_VARARGS | METH_KEYWORDS},
+  {"channels_interleaved", (PyCFunction)channels_interleaved, METH_VARARGS | METH_KEYWORDS},
+  {"channels_tonemapped", (PyCFunction)channels_tonemapped, METH_VARARGS | METH_KEYWORDS},
+  {"thumbnail", (PyCFunction)thumbnail, METH_VARARGS | METH_KEYWORDS},
+  {"iter_blocks", (PyCFunction)iter_blocks, METH_VARARGS | METH_KEYWORDS},
+  {"channel_async", (PyCFunction)asyncmethod<ASYNC_CHANNEL>, METH_VARARGS | METH_KEYWORDS},
+  {"channels_async", (PyCFunction)asyncmethod<ASYNC_CHANNELS>, METH_VARARGS | METH_KEYWORDS},
+  {"channel_into_async", (PyCFunction)asyncmethod<ASYNC_CHANNEL_INTO>, METH_VARARGS | METH_KEYWORDS},
+  {"channels_into_async", (PyCFunction)asyncmethod<ASYNC_CHANNELS_INTO>, METH_VARARGS | METH_KEYWORDS},
+  {"channels_interleaved_async", (PyCFunction)asyncmethod<ASYNC_CHANNELS_INTERLEAVED>, METH_VARARGS | METH_KEYWORDS},
   {"close", inclose, METH_VARARGS},
   {"isComplete", isComplete, METH_VARARGS},
   {NULL, NULL},
@@ -977,10 +3751,27 @@ static PyMethodDef InputFile_methods[] = {
 
 static PyMethodDef TiledInputFile_methods[] = {
   {"header", inheader_tiled, METH_VARARGS},
+  {"dataWindow", headerfield<TiledInputFileC, DATA_WINDOW>, METH_NOARGS},
+  {"displayWindow", headerfield<TiledInputFileC, DISPLAY_WINDOW>, METH_NOARGS},
+  {"channelNames", headerfield<TiledInputFileC, CHANNEL_NAMES>, METH_NOARGS},
+  {"compression", headerfield<TiledInputFileC, COMPRESSION>, METH_NOARGS},
   {"channel", (PyCFunction)channel_tiled, METH_VARARGS | METH_KEYWORDS},
   {"channels", (PyCFunction)channels_tiled, METH_VARARGS | METH_KEYWORDS},
+  {"channel_into", (PyCFunction)channel_into_tiled, METH_VARARGS | METH_KEYWORDS},
+  {"channels_into", (PyCFunction)channels_into_tiled, METH_VARARGS | METH_KEYWORDS},
+  {"channels_interleaved", (PyCFunction)channels_interleaved_tiled, METH_VARARGS | METH_KEYWORDS},
+  {"channel_async", (PyCFunction)asyncmethod<ASYNC_CHANNEL>, METH_VARARGS | METH_KEYWORDS},
+  {"channels_async", (PyCFunction)asyncmethod<ASYNC_CHANNELS>, METH_VARARGS | METH_KEYWORDS},
+  {"channel_into_async", (PyCFunction)asyncmethod<ASYNC_CHANNEL_INTO>, METH_VARARGS | METH_KEYWORDS},
+  {"channels_into_async", (PyCFunction)asyncmethod<ASYNC_CHANNELS_INTO>, METH_VARARGS | METH_KEYWORDS},
+  {"channels_interleaved_async", (PyCFunction)asyncmethod<ASYNC_CHANNELS_INTERLEAVED>, METH_VARARGS | METH_KEYWORDS},
   {"numXTiles", tiles_x, METH_VARARGS},
   {"numYTiles", tiles_y, METH_VARARGS},
+  {"numLevels", levels_tiled, METH_VARARGS},
+  {"numXLevels", xlevels_tiled, METH_VARARGS},
+  {"numYLevels", ylevels_tiled, METH_VARARGS},
+  {"levelWidth", levelwidth_tiled, METH_VARARGS},
+  {"levelHeight", levelheight_tiled, METH_VARARGS},
   {"close", inclose_tiled, METH_VARARGS},
   {"isComplete", isComplete_tiled, METH_VARARGS},
   {NULL, NULL},
@@ -992,9 +3783,12 @@ static void
 InputFile_dealloc(PyObject *self)
 {
     InputFileC *object = ((InputFileC *)self);
+    Py_DECREF(inclose(self, NULL));
+    Py_XDECREF(object->header);
     if (object->fo)
         Py_DECREF(object->fo);
-    Py_DECREF(inclose(self, NULL));
+    if (object->lock)
+        freefilelock(object->lock);
     PyObject_Del(self);
 }
 
@@ -1002,9 +3796,12 @@ static void
 TiledInputFile_dealloc(PyObject *self)
 {
     TiledInputFileC *object = ((TiledInputFileC *)self);
+    Py_DECREF(inclose_tiled(self, NULL));
+    Py_XDECREF(object->header);
     if (object->fo)
         Py_DECREF(object->fo);
-    Py_DECREF(inclose_tiled(self, NULL));
+    if (object->lock)
+        freefilelock(object->lock);
     PyObject_Del(self);
 }
 
@@ -1123,32 +3920,38 @@ int makeInputFile(PyObject *self, PyObject *args, PyObject *kwds)
       if (PyString_Check(fo)) {
           filename = PyString_AsString(fo);
           object->fo = NULL;
-          object->istream = NULL;
+          object->istream = MMap_IStream::open(filename);
       } else if (PyUnicode_Check(fo)) {
           filename = PyUTF8_AsSstring(fo);
           object->fo = NULL;
-          object->istream = NULL;
+          object->istream = MMap_IStream::open(filename);
       } else {
           object->fo = fo;
           Py_INCREF(fo);
-          object->istream = new C_IStream(fo);
+          object->istream = MMap_IStream::open(fo);
+          if (object->istream == NULL)
+              object->istream = new C_IStream(fo);
       }
     } else {
        return -1;
     }
 
+    if (object->lock == NULL)
+        object->lock = newfilelock(&object->is_opened);
+
     try
     {
+      ReleaseGIL nogil;
       if (numthreads < 0)
 	{
-	  if (filename != NULL)
+	  if (object->istream == NULL)
 	    new(&object->i) InputFile(filename);
 	  else
 	    new(&object->i) InputFile(*object->istream);
 	}
       else
 	{
-	  if (filename != NULL)
+	  if (object->istream == NULL)
 	    new(&object->i) InputFile(filename, numthreads);
 	  else
 	    new(&object->i) InputFile(*object->istream, numthreads);
@@ -1157,6 +3960,8 @@ int makeInputFile(PyObject *self, PyObject *args, PyObject *kwds)
     catch (const std::exception &e)
     {
        // Py_DECREF(object);
+       delete object->istream;
+       object->istream = NULL;
        PyErr_SetString(PyExc_OSError, e.what());
        return -1;
     }
@@ -1176,32 +3981,38 @@ int makeTiledInputFile(PyObject *self, PyObject *args, PyObject *kwds)
       if (PyString_Check(fo)) {
           filename = PyString_AsString(fo);
           object->fo = NULL;
-          object->istream = NULL;
+          object->istream = MMap_IStream::open(filename);
       } else if (PyUnicode_Check(fo)) {
           filename = PyUTF8_AsSstring(fo);
           object->fo = NULL;
-          object->istream = NULL;
+          object->istream = MMap_IStream::open(filename);
       } else {
           object->fo = fo;
           Py_INCREF(fo);
-          object->istream = new C_IStream(fo);
+          object->istream = MMap_IStream::open(fo);
+          if (object->istream == NULL)
+              object->istream = new C_IStream(fo);
       }
     } else {
        return -1;
     }
 
+    if (object->lock == NULL)
+        object->lock = newfilelock(&object->is_opened);
+
     try
     {
+      ReleaseGIL nogil;
       if (numthreads < 0)
 	{
-	  if (filename != NULL)
+	  if (object->istream == NULL)
 	    new(&object->i) TiledInputFile(filename);
 	  else
 	    new(&object->i) TiledInputFile(*object->istream);
 	}
       else
 	{
-	  if (filename != NULL)
+	  if (object->istream == NULL)
 	    new(&object->i) TiledInputFile(filename, numthreads);
 	  else
 	    new(&object->i) TiledInputFile(*object->istream, numthreads);
@@ -1210,6 +4021,8 @@ int makeTiledInputFile(PyObject *self, PyObject *args, PyObject *kwds)
     catch (const std::exception &e)
     {
        // Py_DECREF(object);
+       delete object->istream;
+       object->istream = NULL;
        PyErr_SetString(PyExc_OSError, e.what());
        return -1;
     }
@@ -1379,67 +4192,39 @@ Header makeHeaderFromDict(int &ok, PyObject *header_dict)
     return header;
 }
 
-////////////////////////////////////////////////////////////////////////
-//    OutputFile
-////////////////////////////////////////////////////////////////////////
-
-
-typedef struct {
-    PyObject_HEAD
-    OutputFile o;
-    C_OStream *ostream;
-    PyObject *fo;
-    int is_opened;
-} OutputFileC;
-
-static void releaseviews(std::vector<Py_buffer> &views)
-{
-    for (size_t i=0; i < views.size(); i++)
-        PyBuffer_Release(&views[i]);
-}
-
-static PyObject *outwrite(PyObject *self, PyObject *args)
+// Inserts a slice for each channel that has data in the dict pixeldata,
+// which maps channel names to strings or buffer objects holding the
+// channel's samples for the width x height pixels starting at (ox, oy).
+// A buffer must either be contiguous and exactly the right size, or be a
+// strided buffer of shape (height, width), such as a crop, a flipped
+// view or one channel of an interleaved numpy array, whose strides the
+// slice takes over.  On success the buffer views are appended to views,
+// and must be released after writing.  Returns false with an exception
+// set.
+
+static bool insertwriteslices(FrameBuffer &frameBuffer,
+                              std::vector<Py_buffer> &views,
+                              const ChannelList &channels,
+                              PyObject *pixeldata,
+                              int ox, int oy,
+                              int width, int height)
 {
-    if (!((OutputFileC *)self)->is_opened) {
-	PyErr_SetString(PyExc_OSError, "cannot write to closed file");
-	return NULL;
-    }
-    OutputFile *file = &((OutputFileC *)self)->o;
-
-    // long height = PyLong_AsLong(PyTuple_GetItem(args, 1));
-    Box2i dw = file->header().dataWindow();
-    int width = dw.max.x - dw.min.x + 1;
-    int height = dw.max.y - dw.min.y + 1;
-    PyObject *pixeldata;
-        
-    if (!PyArg_ParseTuple(args, "O!|i:writePixels", &PyDict_Type, &pixeldata, &height))
-       return NULL;
-
-    ssize_t currentScanLine = file->currentScanLine();
-    if (file->header().lineOrder() == DECREASING_Y) {
-        // With DECREASING_Y, currentScanLine() returns the maximum Y value of
-        // the window on the first call, and decrements at each scan line.
-        // We have to adjust to point to the correct address in the client buffer.
-        currentScanLine = dw.max.y - currentScanLine + dw.min.y;
-    }
-
-    FrameBuffer frameBuffer;
-    std::vector<Py_buffer> views;
-
-    const ChannelList &channels = file->header().channels();
     for (ChannelList::ConstIterator i = channels.begin();
          i != channels.end();
          ++i) {
-        PyObject *channel_spec = PyDict_GetItem(pixeldata, PyUnicode_FromString(i.name()));
+        PyObject *name = PyUnicode_FromString(i.name());
+        PyObject *channel_spec = PyDict_GetItem(pixeldata, name);
+        Py_DECREF(name);
         if (channel_spec != NULL) {
             Imf::PixelType pt = i.channel().type;
 	    int typeSize = (int) compute_typesize(pt);
             if (typeSize < 0) typeSize = 4;
             int xSampling = i.channel().xSampling;
             int ySampling = i.channel().ySampling;
-            int yStride = typeSize * width;
+            Py_ssize_t xStride = typeSize;
+            Py_ssize_t yStride = typeSize * (width / xSampling);
             char *srcPixels;
-            ssize_t expectedSize = (height * yStride) / (xSampling * ySampling);
+            ssize_t expectedSize = (ssize_t)yStride * (height / ySampling);
             Py_ssize_t bufferSize;
 
             if (PyString_Check(channel_spec)) {
@@ -1447,39 +4232,354 @@ static PyObject *outwrite(PyObject *self, PyObject *args)
                 srcPixels = PyString_AsString(channel_spec);
             } else if (PyObject_CheckBuffer(channel_spec)) {
                 Py_buffer view;
-                if (PyObject_GetBuffer(channel_spec, &view, PyBUF_CONTIG_RO) != 0) {
+                if (PyObject_GetBuffer(channel_spec, &view, PyBUF_STRIDES) != 0) {
                     releaseviews(views);
                     PyErr_Format(PyExc_TypeError, "Unsupported buffer structure for channel '%s'", i.name());
-                    return NULL;
+                    return false;
                 }
                 views.push_back(view);
                 bufferSize = view.len;
                 srcPixels = (char*)view.buf;
+                if (!PyBuffer_IsContiguous(&view, 'C')) {
+                    if (view.ndim != 2 ||
+                        view.itemsize != typeSize ||
+                        view.shape[0] != height / ySampling ||
+                        view.shape[1] != width / xSampling) {
+                        releaseviews(views);
+                        PyErr_Format(PyExc_TypeError, "Data for channel '%s' must be contiguous, or have shape (%d, %d) and item size %d",
+                                     i.name(), height / ySampling, width / xSampling, typeSize);
+                        return false;
+                    }
+                    xStride = view.strides[1];
+                    yStride = view.strides[0];
+                    bufferSize = expectedSize;
+                }
             } else {
                 releaseviews(views);
                 PyErr_Format(PyExc_TypeError, "Data for channel '%s' must be a string or support buffer protocol", i.name());
-                return NULL;
+                return false;
             }
 
             if (bufferSize != expectedSize) {
                 releaseviews(views);
                 PyErr_Format(PyExc_TypeError, "Data for channel '%s' should have size %zu but got %zu", i.name(), expectedSize, bufferSize);
-                return NULL;
+                return false;
             }
 
+            // Negative strides, as in a flipped view, wrap around in the
+            // slice's unsigned strides and still address the right bytes.
             frameBuffer.insert(i.name(),                        // name
                 Slice(pt,                                       // type
-                      srcPixels - dw.min.x * typeSize / xSampling - currentScanLine * yStride / ySampling,                         // base
-                      typeSize,                                 // xStride
+                      srcPixels - (ox / xSampling) * xStride - (oy / ySampling) * yStride, // base
+                      xStride,                                  // xStride
                       yStride,                                  // yStride
                       xSampling, ySampling));                   // subsampling
         }
     }
+    return true;
+}
+
+// Inserts one slice per channel in cnames, pointing into the single
+// interleaved buffer, which holds the channels of each pixel next to
+// each other in the order given, for the width x height pixels starting
+// at (ox, oy).  The buffer must either be contiguous and exactly the
+// right size, or be a strided buffer of shape (height, width, C).  All
+// the channels must have the same pixel type and sampling.  On success
+// the buffer view is appended to views, and must be released after
+// writing.  Returns false with an exception set.
+
+static bool insertinterleavedwriteslices(FrameBuffer &frameBuffer,
+                                         std::vector<Py_buffer> &views,
+                                         const ChannelList &channels,
+                                         PyObject *cnames,
+                                         PyObject *buffer,
+                                         int ox, int oy,
+                                         int width, int height)
+{
+    std::vector<std::string> names;
+    if (!channelnames(cnames, names))
+        return false;
+    size_t nchannels = names.size();
+    if (nchannels == 0) {
+        PyErr_SetString(PyExc_TypeError, "No channels given");
+        return false;
+    }
+
+    std::vector<const Channel *> channelPtrs;
+    for (size_t i = 0; i < nchannels; i++) {
+        const Channel *channelPtr = channels.findChannel(names[i].c_str());
+        if (channelPtr == NULL) {
+            PyErr_Format(PyExc_TypeError, "There is no channel '%s' in the image", names[i].c_str());
+            return false;
+        }
+        channelPtrs.push_back(channelPtr);
+    }
+    const Channel *first = channelPtrs[0];
+    for (size_t i = 1; i < nchannels; i++) {
+        if (channelPtrs[i]->xSampling != first->xSampling ||
+            channelPtrs[i]->ySampling != first->ySampling) {
+            PyErr_Format(PyExc_TypeError, "Channels '%s' and '%s' have different sampling", names[0].c_str(), names[i].c_str());
+            return false;
+        }
+        if (channelPtrs[i]->type != first->type) {
+            PyErr_Format(PyExc_TypeError, "Channels '%s' and '%s' have different pixel types", names[0].c_str(), names[i].c_str());
+            return false;
+        }
+    }
+
+    Imf::PixelType pt = first->type;
+    int xSampling = first->xSampling;
+    int ySampling = first->ySampling;
+    width /= xSampling;
+    height /= ySampling;
+    Py_ssize_t typeSize = compute_typesize(pt);
+    Py_ssize_t cstride = typeSize;
+    Py_ssize_t xstride = typeSize * nchannels;
+    Py_ssize_t ystride = xstride * width;
+
+    Py_buffer view;
+    if (!PyObject_CheckBuffer(buffer) || PyObject_GetBuffer(buffer, &view, PyBUF_STRIDES) != 0) {
+        PyErr_SetString(PyExc_TypeError, "Interleaved pixels must support buffer protocol");
+        return false;
+    }
+    if (PyBuffer_IsContiguous(&view, 'C')) {
+        if (view.len != ystride * height) {
+            PyBuffer_Release(&view);
+            PyErr_Format(PyExc_TypeError, "Interleaved pixels should have size %zd but got %zd", ystride * height, view.len);
+            return false;
+        }
+    } else if (view.ndim == 3 &&
+               view.itemsize == typeSize &&
+               view.shape[0] == height &&
+               view.shape[1] == width &&
+               view.shape[2] == (Py_ssize_t)nchannels) {
+        cstride = view.strides[2];
+        xstride = view.strides[1];
+        ystride = view.strides[0];
+    } else {
+        PyBuffer_Release(&view);
+        PyErr_Format(PyExc_TypeError, "Interleaved pixels must be contiguous, or have shape (%d, %d, %zu) and item size %zd", height, width, nchannels, typeSize);
+        return false;
+    }
+    views.push_back(view);
+
+    char *pixels = (char *)view.buf;
+    for (size_t i = 0; i < nchannels; i++)
+        frameBuffer.insert(names[i].c_str(),
+                           Slice(pt,
+                                 pixels + i * cstride - (ox / xSampling) * xstride - (oy / ySampling) * ystride,
+                                 xstride,
+                                 ystride,
+                                 xSampling, ySampling));
+    return true;
+}
+
+// Inserts the slices for the pixels given to writePixels: a dict of
+// channel buffers, or one interleaved buffer if cnames is given.
+
+static bool insertpixelslices(FrameBuffer &frameBuffer,
+                              std::vector<Py_buffer> &views,
+                              const ChannelList &channels,
+                              PyObject *pixeldata,
+                              PyObject *cnames,
+                              int ox, int oy,
+                              int width, int height)
+{
+    if (cnames != NULL && cnames != Py_None)
+        return insertinterleavedwriteslices(frameBuffer, views, channels, cnames, pixeldata,
+                                            ox, oy, width, height);
+    if (!PyDict_Check(pixeldata)) {
+        PyErr_SetString(PyExc_TypeError, "Pixels must be a dict of channel data, or an interleaved buffer with cnames");
+        return false;
+    }
+    return insertwriteslices(frameBuffer, views, channels, pixeldata, ox, oy, width, height);
+}
+
+// Channel buffers bound to a scan line file or part by bind, which
+// writeRows encodes without building a frame buffer on each call.  The
+// buffers hold rows scan lines, and scan line y is taken from buffer row
+// (y - dw.min.y) % rows, so a small ring of rows can be reused for a
+// whole image.  frameBuffer maps the first pass through the rows, and
+// installed the pass that was last given to the file, or -1.
+
+struct WriteBinding {
+    FrameBuffer frameBuffer;
+    FrameBuffer current;
+    std::vector<Py_buffer> views;
+    PyObject *owner;
+    int rows;
+    int installed;
+};
+
+// Binds the pixels given to bind, as for writePixels, to a file with
+// this header.  Returns NULL with an exception set.
+
+static WriteBinding *makebinding(const Header &header, PyObject *pixeldata, int rows, PyObject *cnames)
+{
+    if (header.lineOrder() == DECREASING_Y) {
+        PyErr_SetString(PyExc_TypeError, "bind needs INCREASING_Y or RANDOM_Y line order");
+        return NULL;
+    }
+    Box2i dw = header.dataWindow();
+    int width = dw.max.x - dw.min.x + 1;
+    int height = dw.max.y - dw.min.y + 1;
+    if (rows == 0)
+        rows = height;
+    if (rows < 1 || rows > height) {
+        PyErr_Format(PyExc_TypeError, "rows must be between 1 and %d", height);
+        return NULL;
+    }
+    for (ChannelList::ConstIterator i = header.channels().begin(); i != header.channels().end(); ++i) {
+        if (rows % i.channel().ySampling != 0) {
+            PyErr_Format(PyExc_TypeError, "rows must be a multiple of the y sampling of channel '%s'", i.name());
+            return NULL;
+        }
+    }
+
+    WriteBinding *b = new WriteBinding;
+    if (!insertpixelslices(b->frameBuffer, b->views, header.channels(), pixeldata, cnames,
+                           dw.min.x, dw.min.y, width, rows)) {
+        delete b;
+        return NULL;
+    }
+    // Strings are not held by a view, so keep the pixels alive, copying
+    // a dict so that later changes to it do not matter.
+    if (cnames == NULL || cnames == Py_None) {
+        b->owner = PyDict_Copy(pixeldata);
+    } else {
+        Py_INCREF(pixeldata);
+        b->owner = pixeldata;
+    }
+    b->rows = rows;
+    b->installed = -1;
+    return b;
+}
+
+static void freebinding(WriteBinding *&b)
+{
+    if (b != NULL) {
+        releaseviews(b->views);
+        Py_XDECREF(b->owner);
+        delete b;
+        b = NULL;
+    }
+}
+
+// Encodes the next n scan lines of the file or part from its binding,
+// by default up to the end of the bound rows, and feeds them to the
+// preview if there is one.  Returns false with an exception set.
+
+template <class F>
+static bool writerows(F &file, WriteBinding &b, FileLock *lock, int n, Downsampler *preview)
+{
+    Box2i dw = file.header().dataWindow();
+    int y = file.currentScanLine();
+    int k = y - dw.min.y;
+    int left = dw.max.y - y + 1;
+    if (n == 0)
+        n = std::min(b.rows - k % b.rows, left);
+    if (n < 1 || n > left) {
+        PyErr_Format(PyExc_TypeError, "Cannot write %d scan lines when %d are left", n, left);
+        return false;
+    }
+    if (k % b.rows + n > b.rows) {
+        PyErr_Format(PyExc_TypeError, "Writing %d scan lines from bound row %d would run past the %d bound rows", n, k % b.rows, b.rows);
+        return false;
+    }
+
+    try
+    {
+        ReleaseGIL nogil(lock);
+        int pass = k / b.rows;
+        if (pass != b.installed) {
+            b.current = FrameBuffer();
+            for (FrameBuffer::ConstIterator i = b.frameBuffer.begin(); i != b.frameBuffer.end(); ++i) {
+                Slice slice = i.slice();
+                slice.base -= (ptrdiff_t)(pass * b.rows / slice.ySampling) * (ptrdiff_t)slice.yStride;
+                b.current.insert(i.name(), slice);
+            }
+            file.setFrameBuffer(b.current);
+            b.installed = pass;
+        }
+        file.writePixels(n);
+        if (preview != NULL) {
+            std::vector<float> row;
+            for (int r = y; r < y + n; r++)
+                previewrow(*preview, b.current, dw, r, row);
+        }
+    }
+    catch (const std::exception &e)
+    {
+        PyErr_SetString(PyExc_OSError, e.what());
+        return false;
+    }
+    return true;
+}
+
+////////////////////////////////////////////////////////////////////////
+//    OutputFile
+////////////////////////////////////////////////////////////////////////
+
+
+typedef struct {
+    PyObject_HEAD
+    OutputFile o;
+    C_OStream *ostream;
+    PyObject *fo;
+    int is_opened;
+    FileLock *lock;
+    Downsampler *preview;
+    WriteBinding *binding;
+} OutputFileC;
+
+static PyObject *outwrite(PyObject *self, PyObject *args, PyObject *kw)
+{
+    if (!((OutputFileC *)self)->is_opened) {
+	PyErr_SetString(PyExc_OSError, "cannot write to closed file");
+	return NULL;
+    }
+    OutputFile *file = &((OutputFileC *)self)->o;
+
+    // long height = PyLong_AsLong(PyTuple_GetItem(args, 1));
+    Box2i dw = file->header().dataWindow();
+    int width = dw.max.x - dw.min.x + 1;
+    int height = dw.max.y - dw.min.y + 1;
+    PyObject *pixeldata;
+    PyObject *cnames = NULL;
+
+    char *keywords[] = { (char*)"pixels", (char*)"scanlines", (char*)"cnames", NULL };
+    if (!PyArg_ParseTupleAndKeywords(args, kw, "O|iO:writePixels", keywords, &pixeldata, &height, &cnames))
+       return NULL;
+
+    ssize_t currentScanLine = file->currentScanLine();
+    if (file->header().lineOrder() == DECREASING_Y) {
+        // With DECREASING_Y, currentScanLine() returns the maximum Y value of
+        // the window on the first call, and decrements at each scan line.
+        // We have to adjust to point to the correct address in the client buffer.
+        currentScanLine = dw.max.y - currentScanLine + dw.min.y;
+    }
+
+    FrameBuffer frameBuffer;
+    std::vector<Py_buffer> views;
 
+    if (!insertpixelslices(frameBuffer, views, file->header().channels(), pixeldata, cnames,
+                           dw.min.x, currentScanLine, width, height))
+        return NULL;
+
+    Downsampler *preview = ((OutputFileC *)self)->preview;
+    if (((OutputFileC *)self)->binding != NULL)
+        ((OutputFileC *)self)->binding->installed = -1;
     try
     {
+        ReleaseGIL nogil(((OutputFileC *)self)->lock);
         file->setFrameBuffer(frameBuffer);
         file->writePixels(height);
+        if (preview != NULL) {
+            std::vector<float> row;
+            for (int y = currentScanLine; y < currentScanLine + height; y++)
+                if (y >= dw.min.y && y <= dw.max.y)
+                    previewrow(*preview, frameBuffer, dw, y, row);
+        }
     }
     catch (const std::exception &e)
     {
@@ -1487,7 +4587,54 @@ static PyObject *outwrite(PyObject *self, PyObject *args)
         PyErr_SetString(PyExc_OSError, e.what());
         return NULL;
     }
-    releaseviews(views);
+    releaseviews(views);
+    Py_RETURN_NONE;
+}
+
+static PyObject *outbind(PyObject *self, PyObject *args, PyObject *kw)
+{
+    OutputFileC *oc = (OutputFileC *)self;
+    if (!oc->is_opened) {
+	PyErr_SetString(PyExc_OSError, "cannot write to closed file");
+	return NULL;
+    }
+    PyObject *pixeldata;
+    int rows = 0;
+    PyObject *cnames = NULL;
+    char *keywords[] = { (char*)"pixels", (char*)"rows", (char*)"cnames", NULL };
+    if (!PyArg_ParseTupleAndKeywords(args, kw, "O|iO:bind", keywords, &pixeldata, &rows, &cnames))
+       return NULL;
+
+    WriteBinding *b = makebinding(oc->o.header(), pixeldata, rows, cnames);
+    if (b == NULL)
+        return NULL;
+    freebinding(oc->binding);
+    oc->binding = b;
+    Py_RETURN_NONE;
+}
+
+static PyObject *outwriterows(PyObject *self, PyObject *args)
+{
+    OutputFileC *oc = (OutputFileC *)self;
+    if (!oc->is_opened) {
+	PyErr_SetString(PyExc_OSError, "cannot write to closed file");
+	return NULL;
+    }
+    int n = 0;
+    if (!PyArg_ParseTuple(args, "|i:writeRows", &n))
+       return NULL;
+    if (oc->binding == NULL) {
+        PyErr_SetString(PyExc_TypeError, "No pixels are bound");
+        return NULL;
+    }
+    if (!writerows(oc->o, *oc->binding, oc->lock, n, oc->preview))
+        return NULL;
+    Py_RETURN_NONE;
+}
+
+static PyObject *outunbind(PyObject *self, PyObject *args)
+{
+    freebinding(((OutputFileC *)self)->binding);
     Py_RETURN_NONE;
 }
 
@@ -1506,17 +4653,62 @@ static PyObject *outclose(PyObject *self, PyObject *args)
     OutputFileC *oc = (OutputFileC *)self;
     if (oc->is_opened) {
       oc->is_opened = 0;
+      freebinding(oc->binding);
       OutputFile *file = &oc->o;
-      file->~OutputFile();
+      std::string error;
+      {
+        ReleaseGIL nogil(oc->lock, true);
+        // The file is finished and destroyed even if the preview fails.
+        if (oc->preview != NULL) {
+          try
+          {
+            std::vector<PreviewRgba> pixels;
+            previewpixels(*oc->preview, pixels);
+            file->updatePreviewImage(&pixels[0]);
+          }
+          catch (const std::exception &e)
+          {
+            error = e.what();
+          }
+          delete oc->preview;
+          oc->preview = NULL;
+        }
+        try
+        {
+          file->~OutputFile();
+          if (oc->ostream)
+            oc->ostream->flush();
+        }
+        catch (const std::exception &e)
+        {
+          if (error.empty())
+            error = e.what();
+        }
+      }
+      if (!error.empty()) {
+        PyErr_SetString(PyExc_OSError, error.c_str());
+        return NULL;
+      }
     }
     Py_RETURN_NONE;
 }
 
+static PyObject *outcallbacks(PyObject *self, PyObject *args)
+{
+    OutputFileC *oc = (OutputFileC *)self;
+    return PyLong_FromLong(oc->ostream ? oc->ostream->callbacks() : 0);
+}
+
 /* Method table */
 static PyMethodDef OutputFile_methods[] = {
-  {"writePixels", outwrite, METH_VARARGS},
+  {"writePixels", (PyCFunction)outwrite, METH_VARARGS | METH_KEYWORDS},
+  {"writePixels_async", (PyCFunction)asyncmethod<ASYNC_WRITEPIXELS>, METH_VARARGS | METH_KEYWORDS},
+  {"bind", (PyCFunction)outbind, METH_VARARGS | METH_KEYWORDS},
+  {"writeRows", outwriterows, METH_VARARGS},
+  {"unbind", outunbind, METH_VARARGS},
   {"currentScanLine", outcurrentscanline, METH_VARARGS},
   {"close", outclose, METH_VARARGS},
+  {"callbackCount", outcallbacks, METH_VARARGS},
   {NULL, NULL},
 };
 
@@ -1524,9 +4716,18 @@ static void
 OutputFile_dealloc(PyObject *self)
 {
     OutputFileC *object = ((OutputFileC *)self);
+    PyObject *r = outclose(self, NULL);
+    if (r != NULL)
+        Py_DECREF(r);
+    else
+        PyErr_WriteUnraisable(self);
+    delete object->ostream;
+    delete object->preview;
+    freebinding(object->binding);
     if (object->fo)
         Py_DECREF(object->fo);
-    Py_DECREF(outclose(self, NULL));
+    if (object->lock)
+        freefilelock(object->lock);
     PyObject_Del(self);
 }
 
@@ -1589,8 +4790,10 @@ int makeOutputFile(PyObject *self, PyObject *args, PyObject *kwds)
     OutputFileC *object = (OutputFileC *)self;
 
     int numthreads = -1;
+    int preview = 0;
 
-    if (PyArg_ParseTuple(args, "OO!|i:OutputFile", &fo, &PyDict_Type, &header_dict, &numthreads)) {
+    char *keywords[] = { (char*)"file", (char*)"header", (char*)"numThreads", (char*)"preview", NULL };
+    if (PyArg_ParseTupleAndKeywords(args, kwds, "OO!|ii:OutputFile", keywords, &fo, &PyDict_Type, &header_dict, &numthreads, &preview)) {
       if (PyString_Check(fo)) {
           filename = PyString_AsString(fo);
           object->fo = NULL;
@@ -1613,8 +4816,30 @@ int makeOutputFile(PyObject *self, PyObject *args, PyObject *kwds)
     if (!ok)
       return -1;
 
+    // The preview is filtered from the pixels as they are written, and
+    // stored in the placeholder attribute when the file is closed.
+    if (preview < 0) {
+      PyErr_SetString(PyExc_TypeError, "preview must be >= 0");
+      return -1;
+    }
+    delete object->preview;
+    object->preview = NULL;
+    if (preview > 0) {
+      Box2i dw = header.dataWindow();
+      int sw = dw.max.x - dw.min.x + 1;
+      int sh = dw.max.y - dw.min.y + 1;
+      int width, height;
+      thumbnailsize(sw, sh, preview, width, height);
+      header.setPreviewImage(PreviewImage(width, height));
+      object->preview = new Downsampler(sw, sh, width, height, 4, false);
+    }
+
+    if (object->lock == NULL)
+        object->lock = newfilelock(&object->is_opened);
+
     try
     {
+      ReleaseGIL nogil;
       if (numthreads < 0)
 	{
 	  if (filename != NULL)
@@ -1639,6 +4864,462 @@ int makeOutputFile(PyObject *self, PyObject *args, PyObject *kwds)
     return 0;
 }
 
+////////////////////////////////////////////////////////////////////////
+//    TiledOutputFile
+////////////////////////////////////////////////////////////////////////
+
+typedef struct {
+    PyObject_HEAD
+    TiledOutputFile o;
+    C_OStream *ostream;
+    PyObject *fo;
+    int is_opened;
+    FileLock *lock;
+} TiledOutputFileC;
+
+// Box-filters the sw x sh plane src down to dw x dh.  Each destination
+// pixel averages the source pixels that it covers, and at least one.
+
+static void downsample(const std::vector<float> &src, int sw, int sh,
+                       std::vector<float> &dst, int dw, int dh)
+{
+    dst.assign((size_t)dw * dh, 0.0f);
+    for (int y = 0; y < dh; y++) {
+        int y0 = (int)((PY_LONG_LONG)y * sh / dh);
+        int y1 = std::max(y0 + 1, (int)((PY_LONG_LONG)(y + 1) * sh / dh));
+        for (int x = 0; x < dw; x++) {
+            int x0 = (int)((PY_LONG_LONG)x * sw / dw);
+            int x1 = std::max(x0 + 1, (int)((PY_LONG_LONG)(x + 1) * sw / dw));
+            float sum = 0.0f;
+            for (int sy = y0; sy < y1; sy++)
+                for (int sx = x0; sx < x1; sx++)
+                    sum += src[(size_t)sy * sw + sx];
+            dst[(size_t)y * dw + x] = sum / ((x1 - x0) * (y1 - y0));
+        }
+    }
+}
+
+// A level's channels, as float planes in the order of the frame buffer.
+
+struct LevelPlanes {
+    int width, height;
+    std::vector<std::vector<float> > planes;
+};
+
+// Encodes level (lx, ly) from planes, converting back to each channel's
+// pixel type.
+
+template <class F>
+static void writelevel(F &file, const FrameBuffer &level0,
+                       const LevelPlanes &level, int lx, int ly)
+{
+    const Box2i &dw = file.header().dataWindow();
+    std::vector<std::vector<char> > pixels(level.planes.size());
+    FrameBuffer frameBuffer;
+    size_t c = 0;
+    for (FrameBuffer::ConstIterator i = level0.begin(); i != level0.end(); ++i, ++c) {
+        Imf::PixelType pt = i.slice().type;
+        size_t typeSize = compute_typesize(pt);
+        pixels[c].resize(typeSize * level.width * level.height);
+        char *p = &pixels[c][0];
+        for (size_t k = 0; k < level.planes[c].size(); k++)
+            storesample(pt, p + k * typeSize, level.planes[c][k]);
+        size_t yStride = typeSize * level.width;
+        frameBuffer.insert(i.name(),
+            Slice(pt, p - dw.min.x * typeSize - dw.min.y * yStride, typeSize, yStride));
+    }
+    file.setFrameBuffer(frameBuffer);
+    file.writeTiles(0, file.numXTiles(lx) - 1, 0, file.numYTiles(ly) - 1, lx, ly);
+}
+
+// Generates and encodes every level below (0, 0) of a MIPMAP or RIPMAP
+// file from level0, the frame buffer that level (0, 0) was written from.
+// Each level is box-filtered from the next larger one: mipmap level
+// (l, l) from (l - 1, l - 1), and ripmap level (lx, ly) from (lx - 1, ly),
+// or from (0, ly - 1) at the start of a row.
+
+template <class F>
+static void writelevels(F &file, const FrameBuffer &level0)
+{
+    const Box2i &dw = file.header().dataWindow();
+    LevelPlanes top;
+    top.width = dw.max.x - dw.min.x + 1;
+    top.height = dw.max.y - dw.min.y + 1;
+    for (FrameBuffer::ConstIterator i = level0.begin(); i != level0.end(); ++i) {
+        const Slice &slice = i.slice();
+        std::vector<float> plane((size_t)top.width * top.height);
+        for (int y = 0; y < top.height; y++)
+            for (int x = 0; x < top.width; x++)
+                plane[(size_t)y * top.width + x] = loadsample(slice.type,
+                    slice.base + (dw.min.x + x) * slice.xStride + (dw.min.y + y) * slice.yStride);
+        top.planes.push_back(plane);
+    }
+
+    LevelMode mode = file.header().tileDescription().mode;
+    int nx = (mode == RIPMAP_LEVELS) ? file.numXLevels() : 1;
+    int ny = (mode == RIPMAP_LEVELS) ? file.numYLevels() : file.numLevels();
+    LevelPlanes rowstart = top;
+    for (int ly = 0; ly < ny; ly++) {
+        LevelPlanes prev = rowstart;
+        for (int lx = 0; lx < nx; lx++) {
+            if (lx == 0 && ly == 0)
+                continue;
+            int tlx = (mode == RIPMAP_LEVELS) ? lx : ly;
+            LevelPlanes level;
+            level.width = file.levelWidth(tlx);
+            level.height = file.levelHeight(ly);
+            level.planes.resize(prev.planes.size());
+            for (size_t c = 0; c < prev.planes.size(); c++)
+                downsample(prev.planes[c], prev.width, prev.height,
+                           level.planes[c], level.width, level.height);
+            writelevel(file, level0, level, tlx, ly);
+            if (lx == 0)
+                rowstart = level;
+            prev = level;
+        }
+    }
+}
+
+// Encodes the tiles tilex_min..tilex_max, tiley_min..tiley_max of level
+// (lx, ly) from pixeldata, which holds each channel's samples for the
+// pixels covered by those tiles.  The library compresses the tiles on
+// its worker threads.  If generate is set and the tiles are the whole of
+// level (0, 0), the lower levels of a MIPMAP or RIPMAP file are
+// generated from them and written too.
+
+template <class F>
+static PyObject *writetiles(F &file, FileLock *lock, PyObject *pixeldata,
+                            int tile_minx, int tile_maxx,
+                            int tile_miny, int tile_maxy,
+                            int lx, int ly, bool generate = false)
+{
+    Box2i box;
+    if (!tilerange(file, tile_minx, tile_maxx, tile_miny, tile_maxy, lx, ly, box))
+        return NULL;
+    int width = box.max.x - box.min.x + 1;
+    int height = box.max.y - box.min.y + 1;
+
+    FrameBuffer frameBuffer;
+    std::vector<Py_buffer> views;
+    if (!insertwriteslices(frameBuffer, views, file.header().channels(), pixeldata,
+                           box.min.x, box.min.y, width, height))
+        return NULL;
+
+    generate = generate &&
+               file.header().tileDescription().mode != ONE_LEVEL &&
+               lx == 0 && ly == 0 &&
+               tile_minx == 0 && tile_maxx == file.numXTiles(0) - 1 &&
+               tile_miny == 0 && tile_maxy == file.numYTiles(0) - 1;
+
+    try
+    {
+        ReleaseGIL nogil(lock);
+        file.setFrameBuffer(frameBuffer);
+        file.writeTiles(tile_minx, tile_maxx, tile_miny, tile_maxy, lx, ly);
+        if (generate)
+            writelevels(file, frameBuffer);
+    }
+    catch (const std::exception &e)
+    {
+        releaseviews(views);
+        PyErr_SetString(PyExc_OSError, e.what());
+        return NULL;
+    }
+    releaseviews(views);
+    Py_RETURN_NONE;
+}
+
+// The writing methods of TiledOutputFile, which are also used for the
+// TiledOutputParts of a MultiPartOutputFile.
+
+template <class F>
+static PyObject *tiledwritetile(F &file, FileLock *lock, PyObject *args, PyObject *kw)
+{
+    PyObject *pixeldata;
+    int dx, dy;
+    int lx = 0;
+    int ly = -1;
+    char *keywords[] = { (char*)"pixels", (char*)"dx", (char*)"dy", (char*)"lx", (char*)"ly", NULL };
+    if (!PyArg_ParseTupleAndKeywords(args, kw, "O!ii|ii:writeTile", keywords, &PyDict_Type, &pixeldata, &dx, &dy, &lx, &ly))
+        return NULL;
+    if (ly == -1)
+        ly = lx;
+    return writetiles(file, lock, pixeldata, dx, dx, dy, dy, lx, ly);
+}
+
+template <class F>
+static PyObject *tiledwritetiles(F &file, FileLock *lock, PyObject *args, PyObject *kw)
+{
+    PyObject *pixeldata;
+    int lx = 0;
+    int ly = -1;
+    int tile_minx = 0;
+    int tile_miny = 0;
+    int tile_maxx = -1;
+    int tile_maxy = -1;
+    PyObject *generate = Py_True;
+    char *keywords[] = { (char*)"pixels", (char*)"tilex_min", (char*)"tilex_max", (char*)"tiley_min", (char*)"tiley_max", (char*)"lx", (char*)"ly", (char*)"generateLevels", NULL };
+    if (!PyArg_ParseTupleAndKeywords(args, kw, "O!|iiiiiiO:writeTiles", keywords, &PyDict_Type, &pixeldata, &tile_minx, &tile_maxx, &tile_miny, &tile_maxy, &lx, &ly, &generate))
+        return NULL;
+    if (!tiledefaults(file, tile_maxx, tile_maxy, lx, ly))
+        return NULL;
+    return writetiles(file, lock, pixeldata, tile_minx, tile_maxx, tile_miny, tile_maxy, lx, ly, PyObject_IsTrue(generate));
+}
+
+static PyObject *writetile_tiled(PyObject *self, PyObject *args, PyObject *kw)
+{
+    TiledOutputFileC *oc = (TiledOutputFileC *)self;
+    if (!oc->is_opened) {
+	PyErr_SetString(PyExc_OSError, "cannot write to closed file");
+	return NULL;
+    }
+    return tiledwritetile(oc->o, oc->lock, args, kw);
+}
+
+static PyObject *writetiles_tiled(PyObject *self, PyObject *args, PyObject *kw)
+{
+    TiledOutputFileC *oc = (TiledOutputFileC *)self;
+    if (!oc->is_opened) {
+	PyErr_SetString(PyExc_OSError, "cannot write to closed file");
+	return NULL;
+    }
+    return tiledwritetiles(oc->o, oc->lock, args, kw);
+}
+
+static PyObject *tiles_x_out(PyObject *self, PyObject *args)
+{
+    TiledOutputFileC *oc = (TiledOutputFileC *)self;
+    if (!oc->is_opened) {
+	PyErr_SetString(PyExc_OSError, "cannot read from closed file");
+	return NULL;
+    }
+    int lx = 0;
+    if (!PyArg_ParseTuple(args, "|i:numXTiles", &lx))
+        return NULL;
+    try
+    {
+        return PyLong_FromLong(oc->o.numXTiles(lx));
+    }
+    catch (const std::exception &e)
+    {
+        PyErr_SetString(PyExc_OSError, e.what());
+        return NULL;
+    }
+}
+
+static PyObject *tiles_y_out(PyObject *self, PyObject *args)
+{
+    TiledOutputFileC *oc = (TiledOutputFileC *)self;
+    if (!oc->is_opened) {
+	PyErr_SetString(PyExc_OSError, "cannot read from closed file");
+	return NULL;
+    }
+    int ly = 0;
+    if (!PyArg_ParseTuple(args, "|i:numYTiles", &ly))
+        return NULL;
+    try
+    {
+        return PyLong_FromLong(oc->o.numYTiles(ly));
+    }
+    catch (const std::exception &e)
+    {
+        PyErr_SetString(PyExc_OSError, e.what());
+        return NULL;
+    }
+}
+
+static PyObject *levels_out(PyObject *self, PyObject *args)
+{
+    TiledOutputFileC *oc = (TiledOutputFileC *)self;
+    return levelquery(oc->o, oc->is_opened, args, NUM_LEVELS);
+}
+
+static PyObject *xlevels_out(PyObject *self, PyObject *args)
+{
+    TiledOutputFileC *oc = (TiledOutputFileC *)self;
+    return levelquery(oc->o, oc->is_opened, args, NUM_X_LEVELS);
+}
+
+static PyObject *ylevels_out(PyObject *self, PyObject *args)
+{
+    TiledOutputFileC *oc = (TiledOutputFileC *)self;
+    return levelquery(oc->o, oc->is_opened, args, NUM_Y_LEVELS);
+}
+
+static PyObject *levelwidth_out(PyObject *self, PyObject *args)
+{
+    TiledOutputFileC *oc = (TiledOutputFileC *)self;
+    return levelquery(oc->o, oc->is_opened, args, LEVEL_WIDTH);
+}
+
+static PyObject *levelheight_out(PyObject *self, PyObject *args)
+{
+    TiledOutputFileC *oc = (TiledOutputFileC *)self;
+    return levelquery(oc->o, oc->is_opened, args, LEVEL_HEIGHT);
+}
+
+static PyObject *outclose_tiled(PyObject *self, PyObject *args)
+{
+    TiledOutputFileC *oc = (TiledOutputFileC *)self;
+    if (oc->is_opened) {
+      oc->is_opened = 0;
+      TiledOutputFile *file = &oc->o;
+      try
+      {
+        ReleaseGIL nogil(oc->lock, true);
+        file->~TiledOutputFile();
+        if (oc->ostream)
+          oc->ostream->flush();
+      }
+      catch (const std::exception &e)
+      {
+        PyErr_SetString(PyExc_OSError, e.what());
+        return NULL;
+      }
+    }
+    Py_RETURN_NONE;
+}
+
+static PyObject *outcallbacks_tiled(PyObject *self, PyObject *args)
+{
+    TiledOutputFileC *oc = (TiledOutputFileC *)self;
+    return PyLong_FromLong(oc->ostream ? oc->ostream->callbacks() : 0);
+}
+
+static PyMethodDef TiledOutputFile_methods[] = {
+  {"writeTile", (PyCFunction)writetile_tiled, METH_VARARGS | METH_KEYWORDS},
+  {"writeTiles", (PyCFunction)writetiles_tiled, METH_VARARGS | METH_KEYWORDS},
+  {"numXTiles", tiles_x_out, METH_VARARGS},
+  {"numYTiles", tiles_y_out, METH_VARARGS},
+  {"numLevels", levels_out, METH_VARARGS},
+  {"numXLevels", xlevels_out, METH_VARARGS},
+  {"numYLevels", ylevels_out, METH_VARARGS},
+  {"levelWidth", levelwidth_out, METH_VARARGS},
+  {"levelHeight", levelheight_out, METH_VARARGS},
+  {"close", outclose_tiled, METH_VARARGS},
+  {"callbackCount", outcallbacks_tiled, METH_VARARGS},
+  {NULL, NULL},
+};
+
+static void
+TiledOutputFile_dealloc(PyObject *self)
+{
+    TiledOutputFileC *object = ((TiledOutputFileC *)self);
+    PyObject *r = outclose_tiled(self, NULL);
+    if (r != NULL)
+        Py_DECREF(r);
+    else
+        PyErr_WriteUnraisable(self);
+    delete object->ostream;
+    if (object->fo)
+        Py_DECREF(object->fo);
+    if (object->lock)
+        freefilelock(object->lock);
+    PyObject_Del(self);
+}
+
+static PyObject *
+TiledOutputFile_Repr(PyObject *self)
+{
+    return PyUnicode_FromString("TiledOutputFile represented");
+}
+
+static PyTypeObject TiledOutputFile_Type = {
+    PyVarObject_HEAD_INIT(&PyType_Type, 0)
+    "OpenEXR.TiledOutputFile",
+    sizeof(TiledOutputFileC),
+    0,
+    (destructor)TiledOutputFile_dealloc,
+    0,
+    0,
+    0,
+    0,
+    (reprfunc)TiledOutputFile_Repr,
+    0,
+    0,
+    0,
+
+    0,
+    0,
+    0,
+    0,
+    0,
+
+    0,
+
+    Py_TPFLAGS_DEFAULT | Py_TPFLAGS_BASETYPE,
+
+    "OpenEXR Tiled Output file object",
+
+    0,
+    0,
+    0,
+    0,
+    0,
+    0,
+
+    TiledOutputFile_methods
+
+    /* the rest are NULLs */
+};
+
+int makeTiledOutputFile(PyObject *self, PyObject *args, PyObject *kwds)
+{
+    PyObject *fo;
+    PyObject *header_dict;
+
+    char *filename = NULL;
+
+    TiledOutputFileC *object = (TiledOutputFileC *)self;
+
+    int numthreads = -1;
+
+    if (PyArg_ParseTuple(args, "OO!|i:TiledOutputFile", &fo, &PyDict_Type, &header_dict, &numthreads)) {
+      if (PyString_Check(fo)) {
+          filename = PyString_AsString(fo);
+          object->fo = NULL;
+          object->ostream = NULL;
+      } else if (PyUnicode_Check(fo)) {
+          filename = PyUTF8_AsSstring(fo);
+          object->fo = NULL;
+          object->ostream = NULL;
+      } else {
+          object->fo = fo;
+          Py_INCREF(fo);
+          object->ostream = new C_OStream(fo);
+      }
+    } else {
+      return -1;
+    }
+
+    int ok;
+    Header header = makeHeaderFromDict(ok, header_dict);
+    if (!ok)
+      return -1;
+
+    if (object->lock == NULL)
+        object->lock = newfilelock(&object->is_opened);
+
+    if (numthreads < 0)
+        numthreads = globalThreadCount();
+
+    try
+    {
+      ReleaseGIL nogil;
+      if (filename != NULL)
+        new(&object->o) TiledOutputFile(filename, header, numthreads);
+      else
+        new(&object->o) TiledOutputFile(*object->ostream, header, numthreads);
+    }
+    catch (const std::exception &e)
+    {
+        PyErr_SetString(PyExc_OSError, e.what());
+        return -1;
+    }
+    object->is_opened = 1;
+    return 0;
+}
+
 PyObject *set_global_thread_count(PyObject *self, PyObject *args)
 {
   int n = 0;
@@ -1661,6 +5342,24 @@ PyObject *get_global_thread_count(PyObject *self, PyObject *args)
   return PyLong_FromLong(globalThreadCount());
 }
 
+PyObject *set_stream_buffer_size(PyObject *self, PyObject *args)
+{
+  Py_ssize_t n = 0;
+  if (!PyArg_ParseTuple(args, "n:setStreamBufferSize", &n))
+    return NULL;
+  if (n < 0) {
+    PyErr_SetString(PyExc_TypeError, "Stream buffer size must be >= 0");
+    return NULL;
+  }
+  streamBufferSize = n;
+  Py_RETURN_NONE;
+}
+
+PyObject *get_stream_buffer_size(PyObject *self, PyObject *args)
+{
+  return PyLong_FromSsize_t(streamBufferSize);
+}
+
 
 ////////////////////////////////////////////////////////////////////////
 
@@ -1706,6 +5405,440 @@ PyObject *_isTiledOpenExrFile(PyObject *self, PyObject *args)
 }
 #endif
 
+////////////////////////////////////////////////////////////////////////
+//    Batch header reading
+////////////////////////////////////////////////////////////////////////
+
+// Reads the header of an image file, or of the first part of a
+// multi-part file.  Only the bytes of the header are read: the offset
+// tables and pixels are not touched.
+
+static void readheaderfrom(IStream &is, Header &header)
+{
+    char magic[8];
+    is.read(magic, sizeof(magic));
+    if (!isImfMagic(magic))
+        throw std::runtime_error("File is not an OpenEXR file.");
+    int version = (unsigned char)magic[4] |
+                  ((unsigned char)magic[5] << 8) |
+                  ((unsigned char)magic[6] << 16) |
+                  ((unsigned char)magic[7] << 24);
+    if (!supportsFlags(getFlags(version)))
+        throw std::runtime_error("File has an unsupported version or flags.");
+    header.readFrom(is, version);
+}
+
+static void readheader(const std::string &path, Header &header)
+{
+    std::unique_ptr<MMap_IStream> mapped(MMap_IStream::open(path.c_str()));
+    if (mapped.get() != NULL) {
+        readheaderfrom(*mapped, header);
+    } else {
+        StdIFStream is(path.c_str());
+        readheaderfrom(is, header);
+    }
+}
+
+class HeaderTask : public IlmThread::Task
+{
+  public:
+    HeaderTask(IlmThread::TaskGroup *group, const std::string &path,
+               Header *header, std::string *error)
+        : Task(group), _path(path), _header(header), _error(error) {}
+
+    void execute()
+    {
+        try
+        {
+            readheader(_path, *_header);
+        }
+        catch (const std::exception &e)
+        {
+            *_error = e.what();
+            if (_error->empty())
+                *_error = "Cannot read header.";
+        }
+    }
+
+  private:
+    std::string _path;
+    Header *_header;
+    std::string *_error;
+};
+
+// Converts a path given as str, bytes or os.PathLike to a file system
+// path.  Returns false with an exception set.
+
+static bool path_from_object(PyObject *o, std::string &path)
+{
+#if PY_MAJOR_VERSION >= 3
+    PyObject *b;
+    if (!PyUnicode_FSConverter(o, &b))
+        return false;
+    path.assign(PyBytes_AS_STRING(b), PyBytes_GET_SIZE(b));
+    Py_DECREF(b);
+#else
+    char *s = PyString_AsString(o);
+    if (s == NULL)
+        return false;
+    path = s;
+#endif
+    return true;
+}
+
+// Headers are read and converted this many files at a time, which
+// bounds the memory held by parsed headers.
+
+static const size_t headerBatchSize = 1024;
+
+static PyObject *read_headers(PyObject *self, PyObject *args, PyObject *kw)
+{
+    PyObject *paths;
+    int threads = -1;
+    PyObject *attributes = Py_None;
+    char *keywords[] = { (char*)"paths", (char*)"threads", (char*)"attributes", NULL };
+    if (!PyArg_ParseTupleAndKeywords(args, kw, "O|iO:read_headers", keywords, &paths, &threads, &attributes))
+        return NULL;
+    if (threads < 0)
+        threads = std::max(1u, std::thread::hardware_concurrency());
+
+    // A single attribute name is not split into characters, as a
+    // string of channel names would be.
+    std::vector<std::string> names;
+    if (PyUnicode_Check(attributes) || PyBytes_Check(attributes)) {
+        PyObject *one = PyTuple_Pack(1, attributes);
+        bool ok = channelnames(one, names);
+        Py_DECREF(one);
+        if (!ok)
+            return NULL;
+    } else if (attributes != Py_None && !channelnames(attributes, names)) {
+        return NULL;
+    }
+
+    PyObject *pseq = PySequence_Fast(paths, "paths must be iterable");
+    if (pseq == NULL)
+        return NULL;
+    Py_ssize_t n = PySequence_Fast_GET_SIZE(pseq);
+    std::vector<std::string> filenames(n);
+    for (Py_ssize_t i = 0; i < n; i++) {
+        if (!path_from_object(PySequence_Fast_GET_ITEM(pseq, i), filenames[i])) {
+            Py_DECREF(pseq);
+            return NULL;
+        }
+    }
+    Py_DECREF(pseq);
+
+    PyObject *retval = PyList_New(n);
+    IlmThread::ThreadPool pool(threads);
+    for (size_t start = 0; start < filenames.size(); start += headerBatchSize) {
+        size_t count = std::min(headerBatchSize, filenames.size() - start);
+        std::vector<Header> headers(count);
+        std::vector<std::string> errors(count);
+        {
+            ReleaseGIL nogil;
+            IlmThread::TaskGroup group;
+            for (size_t i = 0; i < count; i++)
+                pool.addTask(new HeaderTask(&group, filenames[start + i], &headers[i], &errors[i]));
+        }
+        for (size_t i = 0; i < count; i++) {
+            PyObject *ob;
+            if (!errors[i].empty()) {
+                ob = PyObject_CallFunction(PyExc_OSError, (char*)"s", errors[i].c_str());
+            } else if (attributes == Py_None) {
+                ob = dict_from_header(headers[i]);
+            } else {
+                ob = PyDict_New();
+                for (size_t j = 0; j < names.size(); j++) {
+                    Header::ConstIterator a = headers[i].find(names[j]);
+                    if (a != headers[i].end()) {
+                        PyObject *v = value_from_attribute(&a.attribute());
+                        PyDict_SetItemString(ob, names[j].c_str(), v);
+                        Py_DECREF(v);
+                    }
+                }
+            }
+            if (ob == NULL) {
+                Py_DECREF(retval);
+                return NULL;
+            }
+            PyList_SET_ITEM(retval, start + i, ob);
+        }
+    }
+    return retval;
+}
+
+////////////////////////////////////////////////////////////////////////
+//    Reading image sequences
+////////////////////////////////////////////////////////////////////////
+
+// One file of a read_many call.  A FrameTask decodes the whole data
+// window of the named channels into planes, or sets error, and then
+// posts done.
+
+struct FrameJob
+{
+    std::string path;
+    std::vector<PixelType> types;
+    std::vector<int> widths;
+    std::vector<int> heights;
+    std::vector<std::unique_ptr<char[]> > planes;
+    std::vector<size_t> sizes;
+    std::string error;
+    PyObject *errtype;
+    IlmThread::Semaphore done;
+
+    FrameJob(const std::string &p): path(p), errtype(NULL), done(0) {}
+};
+
+template <class F>
+static void decodeframe(F &file, const std::vector<std::string> &names,
+                        bool convert, PixelType pt, FrameJob &job)
+{
+    const Header &header = file.header();
+    Box2i dw = header.dataWindow();
+    int width = dw.max.x - dw.min.x + 1;
+    int height = dw.max.y - dw.min.y + 1;
+
+    FrameBuffer frameBuffer;
+    job.planes.resize(names.size());
+    for (size_t i = 0; i < names.size(); i++) {
+        const Channel *channelPtr = header.channels().findChannel(names[i]);
+        if (channelPtr == NULL) {
+            job.errtype = PyExc_TypeError;
+            throw std::runtime_error("There is no channel '" + names[i] + "' in the image");
+        }
+        PixelType t = convert ? pt : channelPtr->type;
+        int xSampling = channelPtr->xSampling;
+        int ySampling = channelPtr->ySampling;
+        int w = width / xSampling;
+        int h = height / ySampling;
+        size_t typeSize = compute_typesize(t);
+        job.types.push_back(t);
+        job.widths.push_back(w);
+        job.heights.push_back(h);
+        job.sizes.push_back(typeSize * w * h);
+        job.planes[i].reset(new char[job.sizes[i]]);
+        frameBuffer.insert(names[i].c_str(),
+                           Slice(t,
+                                 job.planes[i].get() - (dw.min.x / xSampling) * typeSize - (dw.min.y / ySampling) * typeSize * w,
+                                 typeSize, typeSize * w,
+                                 xSampling, ySampling,
+                                 0.0));
+    }
+    decodescanlines(file, dw, frameBuffer, dw);
+}
+
+class FrameTask : public IlmThread::Task
+{
+  public:
+    FrameTask(IlmThread::TaskGroup *group, FrameJob *job,
+              const std::vector<std::string> *names, bool convert, PixelType pt)
+        : Task(group), _job(job), _names(names), _convert(convert), _pt(pt) {}
+
+    void execute()
+    {
+        try
+        {
+            // Each file is decoded on one thread; the pool supplies the
+            // parallelism across files.
+            std::unique_ptr<MMap_IStream> mapped(MMap_IStream::open(_job->path.c_str()));
+            if (mapped.get() != NULL) {
+                InputFile file(*mapped, 0);
+                decodeframe(file, *_names, _convert, _pt, *_job);
+            } else {
+                InputFile file(_job->path.c_str(), 0);
+                decodeframe(file, *_names, _convert, _pt, *_job);
+            }
+        }
+        catch (const std::exception &e)
+        {
+            _job->planes.clear();
+            _job->error = e.what();
+            if (_job->error.empty())
+                _job->error = "Cannot read file.";
+        }
+        _job->done.post();
+    }
+
+  private:
+    FrameJob *_job;
+    const std::vector<std::string> *_names;
+    bool _convert;
+    PixelType _pt;
+};
+
+// The iterator returned by read_many.  At most inflight files are
+// queued or decoded ahead of the one being returned.  With no worker
+// threads nothing is decoded ahead: frames_next decodes each file when
+// it is requested.
+
+typedef struct {
+    PyObject_HEAD
+    IlmThread::ThreadPool *pool;
+    IlmThread::TaskGroup *group;
+    std::vector<std::string> *paths;
+    std::vector<std::string> *names;
+    std::deque<FrameJob *> *queue;
+    size_t submitted;
+    int inflight;
+    int threads;
+    int convert;
+    PixelType pt;
+    int as_numpy;
+} FrameReaderC;
+
+static void frames_submit(FrameReaderC *it)
+{
+    while ((int)it->queue->size() < it->inflight && it->submitted < it->paths->size()) {
+        FrameJob *job = new FrameJob((*it->paths)[it->submitted++]);
+        it->queue->push_back(job);
+        // With no worker threads the task runs here, so drop the GIL.
+        ReleaseGIL nogil;
+        it->pool->addTask(new FrameTask(it->group, job, it->names, it->convert, it->pt));
+    }
+}
+
+static PyObject *frames_next(PyObject *self)
+{
+    FrameReaderC *it = (FrameReaderC *)self;
+    frames_submit(it);
+    if (it->queue->empty())
+        return NULL;
+    FrameJob *job = it->queue->front();
+    it->queue->pop_front();
+    {
+        ReleaseGIL nogil;
+        job->done.wait();
+    }
+    if (it->threads > 0)
+        frames_submit(it);
+
+    PyObject *retval;
+    if (!job->error.empty()) {
+        retval = PyObject_CallFunction(job->errtype ? job->errtype : PyExc_OSError, (char*)"s", job->error.c_str());
+    } else {
+        retval = PyList_New(job->planes.size());
+        for (size_t i = 0; retval != NULL && i < job->planes.size(); i++) {
+            const char *plane = job->planes[i].get();
+            size_t size = job->sizes[i];
+            PyObject *a;
+            if (it->as_numpy) {
+                a = newarray(job->types[i], Py_BuildValue("(ii)", job->heights[i], job->widths[i]));
+                Py_buffer view;
+                if (a != NULL && PyObject_GetBuffer(a, &view, PyBUF_WRITABLE | PyBUF_C_CONTIGUOUS) == 0) {
+                    memcpy(view.buf, plane, size);
+                    PyBuffer_Release(&view);
+                } else {
+                    Py_CLEAR(a);
+                }
+            } else {
+                a = PyString_FromStringAndSize(plane, size);
+            }
+            if (a == NULL) {
+                Py_CLEAR(retval);
+                break;
+            }
+            PyList_SET_ITEM(retval, i, a);
+        }
+    }
+    delete job;
+    return retval;
+}
+
+static void frames_dealloc(PyObject *self)
+{
+    FrameReaderC *it = (FrameReaderC *)self;
+    {
+        // Deleting the group waits for the tasks still running.
+        ReleaseGIL nogil;
+        delete it->group;
+        delete it->pool;
+    }
+    for (size_t i = 0; i < it->queue->size(); i++)
+        delete (*it->queue)[i];
+    delete it->queue;
+    delete it->paths;
+    delete it->names;
+    PyObject_Del(self);
+}
+
+static PyTypeObject FrameReader_Type = {
+    PyVarObject_HEAD_INIT(&PyType_Type, 0)
+    "OpenEXR.FrameReader",
+    sizeof(FrameReaderC),
+    0,
+    (destructor)frames_dealloc,
+};
+
+static PyObject *read_many(PyObject *self, PyObject *args, PyObject *kw)
+{
+    PyObject *paths;
+    PyObject *clist;
+    PyObject *pixel_type = NULL;
+    int threads = -1;
+    PyObject *as_numpy = Py_False;
+    int inflight = 0;
+    char *keywords[] = { (char*)"paths", (char*)"cnames", (char*)"pixel_type", (char*)"threads", (char*)"numpy", (char*)"inflight", NULL };
+    if (!PyArg_ParseTupleAndKeywords(args, kw, "OO|OiOi:read_many", keywords, &paths, &clist, &pixel_type, &threads, &as_numpy, &inflight))
+        return NULL;
+    if (threads < 0)
+        threads = std::max(1u, std::thread::hardware_concurrency());
+    if (inflight < 0) {
+        PyErr_SetString(PyExc_TypeError, "inflight must be >= 0");
+        return NULL;
+    }
+    if (inflight == 0 || threads == 0)
+        inflight = threads == 0 ? 1 : 2 * threads;
+
+    PixelType pt = HALF;
+    if (pixel_type == Py_None)
+        pixel_type = NULL;
+    if (pixel_type != NULL && !pixeltype_from_object(pixel_type, pt))
+        return NULL;
+    if (PyObject_IsTrue(as_numpy) && numpy_module == NULL) {
+        numpy_module = PyImport_ImportModule("numpy");
+        if (numpy_module == NULL) {
+            PyErr_SetString(PyExc_ImportError, "numpy=True requires numpy");
+            return NULL;
+        }
+    }
+
+    std::vector<std::string> names;
+    if (!channelnames(clist, names))
+        return NULL;
+
+    PyObject *pseq = PySequence_Fast(paths, "paths must be iterable");
+    if (pseq == NULL)
+        return NULL;
+    Py_ssize_t n = PySequence_Fast_GET_SIZE(pseq);
+    std::vector<std::string> filenames(n);
+    for (Py_ssize_t i = 0; i < n; i++) {
+        if (!path_from_object(PySequence_Fast_GET_ITEM(pseq, i), filenames[i])) {
+            Py_DECREF(pseq);
+            return NULL;
+        }
+    }
+    Py_DECREF(pseq);
+
+    FrameReaderC *it = PyObject_New(FrameReaderC, &FrameReader_Type);
+    if (it == NULL)
+        return NULL;
+    it->pool = new IlmThread::ThreadPool(threads);
+    it->group = new IlmThread::TaskGroup;
+    it->paths = new std::vector<std::string>(filenames);
+    it->names = new std::vector<std::string>(names);
+    it->queue = new std::deque<FrameJob *>;
+    it->submitted = 0;
+    it->inflight = inflight;
+    it->threads = threads;
+    it->convert = pixel_type != NULL;
+    it->pt = pt;
+    it->as_numpy = PyObject_IsTrue(as_numpy);
+    if (threads > 0)
+        frames_submit(it);
+    return (PyObject *)it;
+}
+
 #ifdef VERSION_HAS_MULTIPART
 
 ////////////////////////////////////////////////////////////////////////
@@ -1717,213 +5850,503 @@ typedef struct {
     PyObject_HEAD
     MultiPartInputFile i;
     PyObject *fo;
-    C_IStream *istream;
+    IStream *istream;
     int is_opened;
+    FileLock *lock;
+    std::vector<InputPart *> *parts;
+    std::vector<TiledInputPart *> *tiledparts;
 } MultiPartInputFileC;
 
+// Returns true if a part of a multi-part file holds tiles rather than
+// scan lines.  Single-part files read as multi-part ones have no type.
+
+static bool istiledpart(const Header &header)
+{
+    return header.hasType() ? isTiled(header.type()) : header.hasTileDescription();
+}
+
+// Returns the part object P for partNum of a MultiPartInputFile or
+// MultiPartOutputFile, made on first use and kept in cache until the
+// file is closed.  tiled says whether P is a tiled part; a part of the
+// other kind raises TypeError.  Returns NULL with an exception set.
+
+template <class P, class M>
+static P *cachedpart(M &file, std::vector<P *> &cache, int partNum, bool tiled)
+{
+    if (partNum < 0 || partNum >= file.parts()) {
+        PyErr_Format(PyExc_IndexError, "There is no part %i in the image", partNum);
+        return NULL;
+    }
+    if (istiledpart(file.header(partNum)) != tiled) {
+        PyErr_Format(PyExc_TypeError, tiled ? "Part %i is not tiled" : "Part %i is tiled", partNum);
+        return NULL;
+    }
+    if (cache.empty())
+        cache.resize(file.parts(), NULL);
+    if (cache[partNum] == NULL) {
+        try
+        {
+            cache[partNum] = new P(file, partNum);
+        }
+        catch (const std::exception &e)
+        {
+            PyErr_SetString(PyExc_OSError, e.what());
+            return NULL;
+        }
+    }
+    return cache[partNum];
+}
+
+template <class P>
+static void deleteparts(std::vector<P *> &cache)
+{
+    for (size_t i = 0; i < cache.size(); i++)
+        delete cache[i];
+    cache.clear();
+}
+
+// Splits the part number off the arguments of a multi-part file method,
+// leaving in rest and restkw the arguments of the single-part method
+// that it forwards to.  Returns false with an exception set.
+
+static bool splitpartnum(PyObject *args, PyObject *kw, int &partNum,
+                         PyObject *&rest, PyObject *&restkw)
+{
+    PyObject *p = NULL;
+    restkw = NULL;
+    if (PyTuple_GET_SIZE(args) > 0) {
+        p = PyTuple_GET_ITEM(args, 0);
+        rest = PyTuple_GetSlice(args, 1, PyTuple_GET_SIZE(args));
+    } else {
+        rest = PyTuple_New(0);
+    }
+    if (kw != NULL) {
+        restkw = PyDict_Copy(kw);
+        if (p == NULL && (p = PyDict_GetItemString(kw, "partNum")) != NULL)
+            PyDict_DelItemString(restkw, "partNum");
+    }
+    if (p == NULL) {
+        PyErr_SetString(PyExc_TypeError, "Required argument 'partNum' not found");
+    } else {
+        partNum = PyLong_AsLong(p);
+        if (!(partNum == -1 && PyErr_Occurred()))
+            return true;
+    }
+    Py_DECREF(rest);
+    Py_XDECREF(restkw);
+    return false;
+}
+
+typedef PyObject *(*TiledPartReader)(TiledInputPart &, FileLock *, PyObject *, PyObject *);
+
+// If the arguments of a MultiPartInputFile reading method name a tiled
+// part, reads it with reader, which takes the arguments of the
+// TiledInputFile method, and sets result.  Returns false for any other
+// part, which is read as scan lines.
+
+static bool readtiledpart(MultiPartInputFileC *pc, PyObject *args, PyObject *kw,
+                          TiledPartReader reader, PyObject *&result)
+{
+    int partNum;
+    PyObject *rest, *restkw;
+    if (!splitpartnum(args, kw, partNum, rest, restkw)) {
+        PyErr_Clear();
+        return false;
+    }
+    bool tiled = partNum >= 0 && partNum < pc->i.parts() && istiledpart(pc->i.header(partNum));
+    if (tiled) {
+        TiledInputPart *part = cachedpart(pc->i, *pc->tiledparts, partNum, true);
+        result = (part == NULL) ? NULL : reader(*part, pc->lock, rest, restkw);
+    }
+    Py_DECREF(rest);
+    Py_XDECREF(restkw);
+    return tiled;
+}
+
 static PyObject *inchannel_multipart(PyObject *self, PyObject *args, PyObject *kw)
 {
-    if (!((MultiPartInputFileC *)self)->is_opened) {
+    MultiPartInputFileC *pc = (MultiPartInputFileC *)self;
+    if (!pc->is_opened) {
 	PyErr_SetString(PyExc_OSError, "cannot read from closed file");
 	return NULL;
     }
-    MultiPartInputFile *file = &((MultiPartInputFileC *)self)->i;
-    
+    PyObject *tiled;
+    if (readtiledpart(pc, args, kw, tiledchannel<TiledInputPart>, tiled))
+        return tiled;
+
+    int miny = -1;
+    int maxy = -1;
+    int partNum;
+    char *cname;
+    PyObject *pixel_type = NULL;
+    PyObject *as_numpy = Py_False;
+    PyObject *window_obj = NULL;
+    char *keywords[] = { (char*)"partNum", (char*)"cname", (char*)"pixel_type", (char*)"scanLine1", (char*)"scanLine2", (char*)"numpy", (char*)"window", NULL };
+    if (!PyArg_ParseTupleAndKeywords(args, kw, "is|OiiOO", keywords, &partNum, &cname, &pixel_type, &miny, &maxy, &as_numpy, &window_obj))
+        return NULL;
+    Box2i box;
+    const Box2i *window;
+    if (!windowarg(window_obj, box, window))
+        return NULL;
+
+    InputPart *part = cachedpart(pc->i, *pc->parts, partNum, false);
+    if (part == NULL)
+        return NULL;
+    const Header &header = part->header();
+    Box2i dw = header.dataWindow();
+    if (miny == -1)
+        miny = dw.min.y;
+    if (maxy == -1)
+        maxy = dw.max.y;
+
+    std::vector<std::string> names(1, cname);
+    return onlyitem(readscanlines(*part, header, pc->lock, names, pixel_type, miny, maxy, PyObject_IsTrue(as_numpy), window));
+}
+
+static PyObject *inchannels_multipart(PyObject *self, PyObject *args, PyObject *kw)
+{
+    MultiPartInputFileC *pc = (MultiPartInputFileC *)self;
+    if (!pc->is_opened) {
+	PyErr_SetString(PyExc_OSError, "cannot read from closed file");
+	return NULL;
+    }
+    PyObject *tiled;
+    if (readtiledpart(pc, args, kw, tiledchannels<TiledInputPart>, tiled))
+        return tiled;
+
+    int miny = -1;
+    int maxy = -1;
+    int partNum;
+    PyObject *clist;
+    PyObject *pixel_type = NULL;
+    PyObject *as_numpy = Py_False;
+    PyObject *window_obj = NULL;
+    char *keywords[] = { (char*)"partNum", (char*)"cnames", (char*)"pixel_type", (char*)"scanLine1", (char*)"scanLine2", (char*)"numpy", (char*)"window", NULL };
+    if (!PyArg_ParseTupleAndKeywords(args, kw, "iO|OiiOO", keywords, &partNum, &clist, &pixel_type, &miny, &maxy, &as_numpy, &window_obj))
+        return NULL;
+    Box2i box;
+    const Box2i *window;
+    if (!windowarg(window_obj, box, window))
+        return NULL;
+
+    InputPart *part = cachedpart(pc->i, *pc->parts, partNum, false);
+    if (part == NULL)
+        return NULL;
+    const Header &header = part->header();
+    Box2i dw = header.dataWindow();
+    if (miny == -1)
+        miny = dw.min.y;
+    if (maxy == -1)
+        maxy = dw.max.y;
+
+    std::vector<std::string> names;
+    if (!channelnames(clist, names))
+        return NULL;
+    return readscanlines(*part, header, pc->lock, names, pixel_type, miny, maxy, PyObject_IsTrue(as_numpy), window);
+}
+
+static PyObject *inchannel_into_multipart(PyObject *self, PyObject *args, PyObject *kw)
+{
+    MultiPartInputFileC *pc = (MultiPartInputFileC *)self;
+    if (!pc->is_opened) {
+	PyErr_SetString(PyExc_OSError, "cannot read from closed file");
+	return NULL;
+    }
+    PyObject *tiled;
+    if (readtiledpart(pc, args, kw, tiledchannelinto<TiledInputPart>, tiled))
+        return tiled;
+
+    int miny = -1;
+    int maxy = -1;
+    int partNum;
+    char *cname;
+    PyObject *buffer;
+    PyObject *pixel_type = NULL;
+    char *keywords[] = { (char*)"partNum", (char*)"cname", (char*)"buffer", (char*)"pixel_type", (char*)"scanLine1", (char*)"scanLine2", NULL };
+    if (!PyArg_ParseTupleAndKeywords(args, kw, "isO|Oii", keywords, &partNum, &cname, &buffer, &pixel_type, &miny, &maxy))
+        return NULL;
+
+    InputPart *part = cachedpart(pc->i, *pc->parts, partNum, false);
+    if (part == NULL)
+        return NULL;
+    const Header &header = part->header();
+    Box2i dw = header.dataWindow();
+    if (miny == -1)
+        miny = dw.min.y;
+    if (maxy == -1)
+        maxy = dw.max.y;
+
+    std::vector<std::string> names(1, cname);
+    std::vector<PyObject *> bufs(1, buffer);
+    if (!readscanlinesinto(*part, header, pc->lock, names, bufs, pixel_type, miny, maxy))
+        return NULL;
+
+    Py_INCREF(buffer);
+    return buffer;
+}
+
+static PyObject *inchannels_into_multipart(PyObject *self, PyObject *args, PyObject *kw)
+{
+    MultiPartInputFileC *pc = (MultiPartInputFileC *)self;
+    if (!pc->is_opened) {
+	PyErr_SetString(PyExc_OSError, "cannot read from closed file");
+	return NULL;
+    }
+    PyObject *tiled;
+    if (readtiledpart(pc, args, kw, tiledchannelsinto<TiledInputPart>, tiled))
+        return tiled;
+
     int miny = -1;
     int maxy = -1;
     int partNum;
-    char *cname;
+    PyObject *clist;
+    PyObject *buffers;
     PyObject *pixel_type = NULL;
-    char *keywords[] = { (char*)"cname", (char*)"pixel_type", (char*)"scanLine1", (char*)"scanLine2", NULL };
-    if (!PyArg_ParseTupleAndKeywords(args, kw, "is|Oii", keywords, &partNum, &cname, &pixel_type, &miny, &maxy))
+    char *keywords[] = { (char*)"partNum", (char*)"cnames", (char*)"buffers", (char*)"pixel_type", (char*)"scanLine1", (char*)"scanLine2", NULL };
+    if (!PyArg_ParseTupleAndKeywords(args, kw, "iOO|Oii", keywords, &partNum, &clist, &buffers, &pixel_type, &miny, &maxy))
         return NULL;
 
-    InputPart *part = new InputPart(*file, partNum);
-    const Header& header = file->header(partNum);
-
-    // FIXME: Support TILEDIMAGE in header
-    
+    InputPart *part = cachedpart(pc->i, *pc->parts, partNum, false);
+    if (part == NULL)
+        return NULL;
+    const Header &header = part->header();
     Box2i dw = header.dataWindow();
-    
     if (miny == -1)
         miny = dw.min.y;
     if (maxy == -1)
         maxy = dw.max.y;
 
-    if (maxy < miny) {
-        PyErr_SetString(PyExc_TypeError, "scanLine1 must be <= scanLine2");
+    std::vector<std::string> names;
+    std::vector<PyObject *> bufs;
+    if (!namesandbuffers(clist, buffers, names, bufs))
         return NULL;
-    }
-    if (miny < dw.min.y) {
-        PyErr_SetString(PyExc_TypeError, "scanLine1 cannot be outside dataWindow");
-        return NULL;
-    }
-    if (maxy > dw.max.y) {
-        PyErr_SetString(PyExc_TypeError, "scanLine2 cannot be outside dataWindow");
+    if (!readscanlinesinto(*part, header, pc->lock, names, bufs, pixel_type, miny, maxy))
         return NULL;
-    }
-
-    ChannelList channels = header.channels();
-    Channel *channelPtr = channels.findChannel(cname);
-    if (channelPtr == NULL) {
-        return PyErr_Format(PyExc_TypeError, "There is no channel '%s' in part %i", cname, partNum);
-    }
-
-    Imf::PixelType pt;
-    if (pixel_type != NULL) {
-        if (PyObject_GetAttrString(pixel_type,"v") == NULL) {
-            return PyErr_Format(PyExc_TypeError, "Invalid PixelType object");
-        }
-        pt = PixelType(PyLong_AsLong(PyObject_StealAttrString(pixel_type, "v")));
-    } else {
-        pt = channelPtr->type;
-    }
-
-    int xSampling = channelPtr->xSampling;
-    int ySampling = channelPtr->ySampling;
-    int width  = (dw.max.x - dw.min.x + 1) / xSampling;
-    int height = (maxy - miny + 1) / ySampling;
-
-    size_t typeSize = compute_typesize(pt);
-
-    PyObject *r = PyString_FromStringAndSize(NULL, typeSize * width * height);
-
-    char *pixels = PyString_AsString(r);
-
-    try
-    {
-        FrameBuffer frameBuffer;
-        size_t xstride = typeSize;
-        size_t ystride = typeSize * width;
-        frameBuffer.insert(cname,
-                           Slice(pt,
-                                 pixels - dw.min.x * xstride / xSampling - miny * ystride / ySampling,
-                                 xstride,
-                                 ystride,
-                                 xSampling, ySampling,
-                                 0.0));
-        part->setFrameBuffer(frameBuffer);
-        part->readPixels(miny, maxy);
-    }
-    catch (const std::exception &e)
-    {
-       PyErr_SetString(PyExc_OSError, e.what());
-       return NULL;
-    }
 
-    return r;
+    Py_INCREF(buffers);
+    return buffers;
 }
 
-static PyObject *inchannels_multipart(PyObject *self, PyObject *args, PyObject *kw)
+static PyObject *inchannels_interleaved_multipart(PyObject *self, PyObject *args, PyObject *kw)
 {
-    if (!((MultiPartInputFileC *)self)->is_opened) {
+    MultiPartInputFileC *pc = (MultiPartInputFileC *)self;
+    if (!pc->is_opened) {
 	PyErr_SetString(PyExc_OSError, "cannot read from closed file");
 	return NULL;
     }
-    MultiPartInputFile *file = &((MultiPartInputFileC *)self)->i;
+    PyObject *tiled;
+    if (readtiledpart(pc, args, kw, tiledchannelsinterleaved<TiledInputPart>, tiled))
+        return tiled;
 
     int miny = -1;
     int maxy = -1;
-
     int partNum;
-
     PyObject *clist;
     PyObject *pixel_type = NULL;
-    char *keywords[] = { (char*)"cnames", (char*)"pixel_type", (char*)"scanLine1", (char*)"scanLine2", NULL };
-    if (!PyArg_ParseTupleAndKeywords(args, kw, "iO|Oii", keywords, &partNum, &clist, &pixel_type, &miny, &maxy))
+    PyObject *buffer = NULL;
+    PyObject *as_numpy = Py_False;
+    char *keywords[] = { (char*)"partNum", (char*)"cnames", (char*)"pixel_type", (char*)"scanLine1", (char*)"scanLine2", (char*)"buffer", (char*)"numpy", NULL };
+    if (!PyArg_ParseTupleAndKeywords(args, kw, "iO|OiiOO", keywords, &partNum, &clist, &pixel_type, &miny, &maxy, &buffer, &as_numpy))
         return NULL;
+    if (buffer == Py_None)
+        buffer = NULL;
 
-    InputPart *part = new InputPart(*file, partNum);
-    const Header& header = file->header(partNum);
-
+    InputPart *part = cachedpart(pc->i, *pc->parts, partNum, false);
+    if (part == NULL)
+        return NULL;
+    const Header &header = part->header();
     Box2i dw = header.dataWindow();
-
-    
-    
     if (miny == -1)
         miny = dw.min.y;
     if (maxy == -1)
         maxy = dw.max.y;
 
-    if (maxy < miny) {
-        PyErr_SetString(PyExc_TypeError, "scanLine1 must be <= scanLine2");
-        return NULL;
-    }
-    if (miny < dw.min.y) {
-        PyErr_SetString(PyExc_TypeError, "scanLine1 cannot be outside dataWindow");
-        return NULL;
-    }
-    if (maxy > dw.max.y) {
-        PyErr_SetString(PyExc_TypeError, "scanLine2 cannot be outside dataWindow");
-        return NULL;
-    }
+    return readscanlinesinterleaved(*part, header, pc->lock, clist, pixel_type, buffer, PyObject_IsTrue(as_numpy), miny, maxy);
+}
 
-    ChannelList channels = header.channels();
-    FrameBuffer frameBuffer;
+// Decodes the data window of a part, or level (0, 0) of a tiled part,
+// into frameBuffer, on a thread of the pool used by read_parts.
 
-    int width  = dw.max.x - dw.min.x + 1;
-    int height = maxy - miny + 1;
+class PartTask : public IlmThread::Task
+{
+  public:
+    PartTask(IlmThread::TaskGroup *group, InputPart *part, TiledInputPart *tiled,
+             const FrameBuffer *frameBuffer, std::string *error)
+        : Task(group), _part(part), _tiled(tiled), _frameBuffer(frameBuffer), _error(error) {}
 
-    PyObject *retval = PyList_New(0);
-    PyObject *iterator = PyObject_GetIter(clist);
-    if (iterator == NULL) {
-      PyErr_SetString(PyExc_TypeError, "Channel list must be iterable");
-      return NULL;
+    void execute()
+    {
+        try
+        {
+            if (_tiled != NULL) {
+                decodetiles(*_tiled, *_frameBuffer,
+                            0, _tiled->numXTiles(0) - 1, 0, _tiled->numYTiles(0) - 1,
+                            0, 0, NULL);
+            } else {
+                Box2i dw = _part->header().dataWindow();
+                decodescanlines(*_part, dw, *_frameBuffer, dw);
+            }
+        }
+        catch (const std::exception &e)
+        {
+            *_error = e.what();
+            if (_error->empty())
+                *_error = "Cannot read part.";
+        }
     }
-    PyObject *item;
-
-    while ((item = PyIter_Next(iterator)) != NULL) {
-      char *cname = PyUTF8_AsSstring(item);
-      Channel *channelPtr = channels.findChannel(cname);
-      if (channelPtr == NULL) {
-          return PyErr_Format(PyExc_TypeError, "There is no channel '%s' in part %i", cname, partNum);
-      }
 
-      Imf::PixelType pt;
-      if (pixel_type != NULL) {
-          pt = PixelType(PyLong_AsLong(PyObject_StealAttrString(pixel_type, "v")));
-      } else {
-          pt = channelPtr->type;
-      }
+  private:
+    InputPart *_part;
+    TiledInputPart *_tiled;
+    const FrameBuffer *_frameBuffer;
+    std::string *_error;
+};
 
-      // Use pt to compute typeSize
-      size_t typeSize = compute_typesize(pt);
-      if (typeSize < 0) {
-          PyErr_SetString(PyExc_TypeError, "Unknown type");
-          return NULL;
-      }
+static PyObject *read_parts_multipart(PyObject *self, PyObject *args, PyObject *kw)
+{
+    MultiPartInputFileC *pc = (MultiPartInputFileC *)self;
+    if (!pc->is_opened) {
+	PyErr_SetString(PyExc_OSError, "cannot read from closed file");
+	return NULL;
+    }
 
-      size_t xstride = typeSize;
-      size_t ystride = typeSize * width;
+    PyObject *partlist = Py_None;
+    PyObject *clist = Py_None;
+    PyObject *pixel_type = NULL;
+    PyObject *as_numpy = Py_False;
+    int threads = -1;
+    char *keywords[] = { (char*)"partNums", (char*)"cnames", (char*)"pixel_type", (char*)"numpy", (char*)"threads", NULL };
+    if (!PyArg_ParseTupleAndKeywords(args, kw, "|OOOOi:read_parts", keywords, &partlist, &clist, &pixel_type, &as_numpy, &threads))
+        return NULL;
+    if (pixel_type == Py_None)
+        pixel_type = NULL;
+    if (threads < 0)
+        threads = std::max(1u, std::thread::hardware_concurrency());
+
+    std::vector<int> nums;
+    if (partlist == Py_None) {
+        for (int i = 0; i < pc->i.parts(); i++)
+            nums.push_back(i);
+    } else {
+        PyObject *pseq = PySequence_Fast(partlist, "partNums must be iterable");
+        if (pseq == NULL)
+            return NULL;
+        for (Py_ssize_t i = 0; i < PySequence_Fast_GET_SIZE(pseq); i++) {
+            long partNum = PyLong_AsLong(PySequence_Fast_GET_ITEM(pseq, i));
+            if (partNum == -1 && PyErr_Occurred()) {
+                Py_DECREF(pseq);
+                return NULL;
+            }
+            if (std::find(nums.begin(), nums.end(), partNum) != nums.end()) {
+                Py_DECREF(pseq);
+                PyErr_Format(PyExc_TypeError, "Part %ld is listed more than once", partNum);
+                return NULL;
+            }
+            nums.push_back(partNum);
+        }
+        Py_DECREF(pseq);
+    }
+    std::vector<std::string> names;
+    if (clist != Py_None && !channelnames(clist, names))
+        return NULL;
+    bool numpy = PyObject_IsTrue(as_numpy);
+
+    // Buffers and slices are made for every part with the GIL held, then
+    // the parts are decoded together without it.
+    size_t n = nums.size();
+    std::vector<InputPart *> parts(n);
+    std::vector<TiledInputPart *> tiledparts(n);
+    std::vector<FrameBuffer> frameBuffers(n);
+    std::vector<std::vector<Py_buffer> > views(n);
+    std::vector<std::string> errors(n);
+    PyObject *retval = PyList_New(n);
+    for (size_t i = 0; retval != NULL && i < n; i++) {
+        bool tiled = nums[i] >= 0 && nums[i] < pc->i.parts() && istiledpart(pc->i.header(nums[i]));
+        if (tiled)
+            tiledparts[i] = cachedpart(pc->i, *pc->tiledparts, nums[i], true);
+        else
+            parts[i] = cachedpart(pc->i, *pc->parts, nums[i], false);
+        if (parts[i] == NULL && tiledparts[i] == NULL) {
+            Py_CLEAR(retval);
+            break;
+        }
+        const Header &header = pc->i.header(nums[i]);
+        Box2i dw = header.dataWindow();
+        std::vector<std::string> pnames = names;
+        if (clist == Py_None) {
+            for (ChannelList::ConstIterator c = header.channels().begin(); c != header.channels().end(); ++c)
+                pnames.push_back(c.name());
+        }
+        PyObject *list = newchannelbuffers(header.channels(), pnames, pixel_type,
+                                           dw.max.x - dw.min.x + 1, dw.max.y - dw.min.y + 1,
+                                           numpy);
+        std::vector<PyObject *> bufs;
+        if (list == NULL || !decodetargets(list, numpy, bufs)) {
+            Py_XDECREF(list);
+            Py_CLEAR(retval);
+            break;
+        }
+        bool ok = insertscanlineslices(frameBuffers[i], views[i], header, pnames, bufs, pixel_type, dw, false);
+        releasetargets(bufs);
+        if (!ok) {
+            Py_DECREF(list);
+            Py_CLEAR(retval);
+            break;
+        }
+        PyObject *d = PyDict_New();
+        for (size_t j = 0; j < pnames.size(); j++)
+            PyDict_SetItemString(d, pnames[j].c_str(), PyList_GET_ITEM(list, j));
+        Py_DECREF(list);
+        PyList_SET_ITEM(retval, i, d);
+    }
 
-      PyObject *r = PyString_FromStringAndSize(NULL, typeSize * width * height);
-      PyList_Append(retval, r);
-      Py_DECREF(r);
+    if (retval != NULL) {
+        try
+        {
+            ReleaseGIL nogil(pc->lock);
+            IlmThread::ThreadPool pool(threads);
+            IlmThread::TaskGroup group;
+            for (size_t i = 0; i < n; i++)
+                pool.addTask(new PartTask(&group, parts[i], tiledparts[i], &frameBuffers[i], &errors[i]));
+        }
+        catch (const std::exception &e)
+        {
+            Py_CLEAR(retval);
+            PyErr_SetString(PyExc_OSError, e.what());
+        }
+    }
+    for (size_t i = 0; i < n; i++)
+        releaseviews(views[i]);
+    for (size_t i = 0; retval != NULL && i < n; i++) {
+        if (!errors[i].empty()) {
+            Py_DECREF(retval);
+            PyErr_SetString(PyExc_OSError, errors[i].c_str());
+            return NULL;
+        }
+    }
+    return retval;
+}
 
-      char *pixels = PyString_AsString(r);
+// The level and tile queries of TiledInputFile, for a tiled part.
 
-      try
-      {
-          frameBuffer.insert(cname,
-                             Slice(pt,
-                                   pixels - dw.min.x * xstride - miny * ystride,
-                                   xstride,
-                                   ystride,
-                                   1,1,
-                                   0.0));
-      }
-      catch (const std::exception &e)
-      {
-         PyErr_SetString(PyExc_OSError, e.what());
-         return NULL;
-      }
-      Py_DECREF(item);
+template <LevelQuery Q>
+static PyObject *levelquery_multipart(PyObject *self, PyObject *args)
+{
+    MultiPartInputFileC *pc = (MultiPartInputFileC *)self;
+    int partNum;
+    PyObject *rest, *restkw;
+    if (!splitpartnum(args, NULL, partNum, rest, restkw))
+        return NULL;
+    PyObject *r = NULL;
+    if (!pc->is_opened) {
+        PyErr_SetString(PyExc_OSError, "file is closed");
+    } else {
+        TiledInputPart *part = cachedpart(pc->i, *pc->tiledparts, partNum, true);
+        if (part != NULL)
+            r = levelquery(*part, 1, rest, Q);
     }
-    Py_DECREF(iterator);
-    part->setFrameBuffer(frameBuffer);
-    part->readPixels(miny, maxy);
-
-    return retval;
+    Py_DECREF(rest);
+    return r;
 }
 
 static PyObject *inheader_multipart(PyObject *self, PyObject *args)
@@ -1969,7 +6392,12 @@ static PyObject *inclose_multipart(PyObject *self, PyObject *args)
     if (pc->is_opened) {
         pc->is_opened = 0;
         MultiPartInputFile *file = &((MultiPartInputFileC *)self)->i;
+        ReleaseGIL nogil(pc->lock, true);
+        deleteparts(*pc->parts);
+        deleteparts(*pc->tiledparts);
         file->~MultiPartInputFile();
+        delete pc->istream;
+        pc->istream = NULL;
     }
     Py_RETURN_NONE;
 }
@@ -1978,9 +6406,13 @@ static void
 MultiPartInputFile_dealloc(PyObject *self)
 {
     MultiPartInputFileC *object = ((MultiPartInputFileC *)self);
+    Py_DECREF(inclose_multipart(self, NULL));
+    delete object->parts;
+    delete object->tiledparts;
     if (object->fo)
         Py_DECREF(object->fo);
-    Py_DECREF(inclose_multipart(self, NULL));
+    if (object->lock)
+        freefilelock(object->lock);
     PyObject_Del(self);
 }
 
@@ -2006,32 +6438,42 @@ int makeMultiPartInputFile(PyObject *self, PyObject *args, PyObject *kwds)
       if (PyString_Check(fo)) {
           filename = PyString_AsString(fo);
           object->fo = NULL;
-          object->istream = NULL;
+          object->istream = MMap_IStream::open(filename);
       } else if (PyUnicode_Check(fo)) {
           filename = PyUTF8_AsSstring(fo);
           object->fo = NULL;
-          object->istream = NULL;
+          object->istream = MMap_IStream::open(filename);
       } else {
           object->fo = fo;
           Py_INCREF(fo);
-          object->istream = new C_IStream(fo);
+          object->istream = MMap_IStream::open(fo);
+          if (object->istream == NULL)
+              object->istream = new C_IStream(fo);
       }
     } else {
        return -1;
     }
 
+    if (object->lock == NULL)
+        object->lock = newfilelock(&object->is_opened);
+    if (object->parts == NULL)
+        object->parts = new std::vector<InputPart *>;
+    if (object->tiledparts == NULL)
+        object->tiledparts = new std::vector<TiledInputPart *>;
+
     try
     {
+      ReleaseGIL nogil;
       if (numthreads < 0)
 	{
-	  if (filename != NULL)
+	  if (object->istream == NULL)
 	    new(&object->i) MultiPartInputFile(filename, globalThreadCount(), reconstructChunkOffsetTable);
 	  else
 	    new(&object->i) MultiPartInputFile(*object->istream, globalThreadCount(), reconstructChunkOffsetTable);
 	}
       else
 	{
-	  if (filename != NULL)
+	  if (object->istream == NULL)
 	    new(&object->i) MultiPartInputFile(filename, numthreads, reconstructChunkOffsetTable);
 	  else
 	    new(&object->i) MultiPartInputFile(*object->istream, numthreads, reconstructChunkOffsetTable);
@@ -2040,6 +6482,8 @@ int makeMultiPartInputFile(PyObject *self, PyObject *args, PyObject *kwds)
     catch (const std::exception &e)
     {
        // Py_DECREF(object);
+       delete object->istream;
+       object->istream = NULL;
        PyErr_SetString(PyExc_OSError, e.what());
        return -1;
     }
@@ -2051,6 +6495,18 @@ int makeMultiPartInputFile(PyObject *self, PyObject *args, PyObject *kwds)
 static PyMethodDef MultiPartInputFile_methods[] = {
   {"header", inheader_multipart, METH_VARARGS},
   {"channel", (PyCFunction)inchannel_multipart, METH_VARARGS | METH_KEYWORDS},
+  {"channels", (PyCFunction)inchannels_multipart, METH_VARARGS | METH_KEYWORDS},
+  {"channel_into", (PyCFunction)inchannel_into_multipart, METH_VARARGS | METH_KEYWORDS},
+  {"channels_into", (PyCFunction)inchannels_into_multipart, METH_VARARGS | METH_KEYWORDS},
+  {"channels_interleaved", (PyCFunction)inchannels_interleaved_multipart, METH_VARARGS | METH_KEYWORDS},
+  {"read_parts", (PyCFunction)read_parts_multipart, METH_VARARGS | METH_KEYWORDS},
+  {"numXTiles", levelquery_multipart<NUM_X_TILES>, METH_VARARGS},
+  {"numYTiles", levelquery_multipart<NUM_Y_TILES>, METH_VARARGS},
+  {"numLevels", levelquery_multipart<NUM_LEVELS>, METH_VARARGS},
+  {"numXLevels", levelquery_multipart<NUM_X_LEVELS>, METH_VARARGS},
+  {"numYLevels", levelquery_multipart<NUM_Y_LEVELS>, METH_VARARGS},
+  {"levelWidth", levelquery_multipart<LEVEL_WIDTH>, METH_VARARGS},
+  {"levelHeight", levelquery_multipart<LEVEL_HEIGHT>, METH_VARARGS},
   {"parts", inparts_multipart, METH_VARARGS},
   {"close", inclose_multipart, METH_VARARGS},
   {"partComplete", partComplete_multipart, METH_VARARGS},
@@ -2107,6 +6563,10 @@ typedef struct {
     C_OStream *ostream;
     PyObject *fo;
     int is_opened;
+    FileLock *lock;
+    std::vector<OutputPart *> *parts;
+    std::vector<TiledOutputPart *> *tiledparts;
+    std::vector<WriteBinding *> *bindings;
 } MultiPartOutputFileC;
 
 // static void releaseviews(std::vector<Py_buffer> &views)
@@ -2115,26 +6575,28 @@ typedef struct {
 //         PyBuffer_Release(&views[i]);
 // }
 
-static PyObject *multioutwrite(PyObject *self, PyObject *args)
+static PyObject *multioutwrite(PyObject *self, PyObject *args, PyObject *kw)
 {
-    if (!((MultiPartOutputFileC *)self)->is_opened) {
+    MultiPartOutputFileC *oc = (MultiPartOutputFileC *)self;
+    if (!oc->is_opened) {
 	PyErr_SetString(PyExc_OSError, "cannot write to closed file");
 	return NULL;
     }
-    MultiPartOutputFile *file = &((MultiPartOutputFileC *)self)->o;
 
-    
     int height = -1;
     int partNum;
     PyObject *pixeldata;
-    
-        
-    if (!PyArg_ParseTuple(args, "iO!|i:writePixels", &partNum, &PyDict_Type, &pixeldata, &height))
+    PyObject *cnames = NULL;
+
+    char *keywords[] = { (char*)"partNum", (char*)"pixels", (char*)"scanlines", (char*)"cnames", NULL };
+    if (!PyArg_ParseTupleAndKeywords(args, kw, "iO|iO:writePixels", keywords, &partNum, &pixeldata, &height, &cnames))
        return NULL;
-    
-    Header header = file->header(partNum);
 
-    // long height = PyLong_AsLong(PyTuple_GetItem(args, 1));
+    OutputPart *part = cachedpart(oc->o, *oc->parts, partNum, false);
+    if (part == NULL)
+        return NULL;
+    const Header &header = part->header();
+
     Box2i dw = header.dataWindow();
     int width = dw.max.x - dw.min.x + 1;
     if(height == -1)
@@ -2142,7 +6604,6 @@ static PyObject *multioutwrite(PyObject *self, PyObject *args)
 
     FrameBuffer frameBuffer;
     std::vector<Py_buffer> views;
-    OutputPart* part = new OutputPart(*file, partNum);
 
     ssize_t currentScanLine = part->currentScanLine();
     if (header.lineOrder() == DECREASING_Y) {
@@ -2152,58 +6613,15 @@ static PyObject *multioutwrite(PyObject *self, PyObject *args)
         currentScanLine = dw.max.y - currentScanLine + dw.min.y;
     }
 
-    const ChannelList &channels = header.channels();
-    for (ChannelList::ConstIterator i = channels.begin();
-         i != channels.end();
-         ++i) {
-        PyObject *channel_spec = PyDict_GetItem(pixeldata, PyUnicode_FromString(i.name()));
-        if (channel_spec != NULL) {
-            Imf::PixelType pt = i.channel().type;
-	    int typeSize = (int) compute_typesize(pt);
-            if (typeSize < 0) typeSize = 4;
-            int xSampling = i.channel().xSampling;
-            int ySampling = i.channel().ySampling;
-            int yStride = typeSize * width;
-            char *srcPixels;
-            ssize_t expectedSize = (height * yStride) / (xSampling * ySampling);
-            Py_ssize_t bufferSize;
-
-            if (PyString_Check(channel_spec)) {
-                bufferSize = PyString_Size(channel_spec);
-                srcPixels = PyString_AsString(channel_spec);
-            } else if (PyObject_CheckBuffer(channel_spec)) {
-                Py_buffer view;
-                if (PyObject_GetBuffer(channel_spec, &view, PyBUF_CONTIG_RO) != 0) {
-                    releaseviews(views);
-                    PyErr_Format(PyExc_TypeError, "Unsupported buffer structure for channel '%s'", i.name());
-                    return NULL;
-                }
-                views.push_back(view);
-                bufferSize = view.len;
-                srcPixels = (char*)view.buf;
-            } else {
-                releaseviews(views);
-                PyErr_Format(PyExc_TypeError, "Data for channel '%s' must be a string or support buffer protocol", i.name());
-                return NULL;
-            }
-
-            if (bufferSize != expectedSize) {
-                releaseviews(views);
-                PyErr_Format(PyExc_TypeError, "Data for channel '%s' should have size %zu but got %zu", i.name(), expectedSize, bufferSize);
-                return NULL;
-            }
-
-            frameBuffer.insert(i.name(),                        // name
-                Slice(pt,                                       // type
-                      srcPixels - dw.min.x * typeSize / xSampling - currentScanLine * yStride / ySampling,                         // base
-                      typeSize,                                 // xStride
-                      yStride,                                  // yStride
-                      xSampling, ySampling));                   // subsampling
-        }
-    }
+    if (!insertpixelslices(frameBuffer, views, header.channels(), pixeldata, cnames,
+                           dw.min.x, currentScanLine, width, height))
+        return NULL;
+    if ((size_t)partNum < oc->bindings->size() && (*oc->bindings)[partNum] != NULL)
+        (*oc->bindings)[partNum]->installed = -1;
 
     try
     {
+        ReleaseGIL nogil(oc->lock);
         part->setFrameBuffer(frameBuffer);
         part->writePixels(height);
     }
@@ -2217,6 +6635,59 @@ static PyObject *multioutwrite(PyObject *self, PyObject *args)
     Py_RETURN_NONE;
 }
 
+typedef PyObject *(*TiledPartWriter)(TiledOutputPart &, FileLock *, PyObject *, PyObject *);
+
+// Calls writer, which takes the arguments of the TiledOutputFile method,
+// for the tiled part that the arguments start with.
+
+static PyObject *writetiledpart(PyObject *self, PyObject *args, PyObject *kw, TiledPartWriter writer)
+{
+    MultiPartOutputFileC *oc = (MultiPartOutputFileC *)self;
+    if (!oc->is_opened) {
+	PyErr_SetString(PyExc_OSError, "cannot write to closed file");
+	return NULL;
+    }
+    int partNum;
+    PyObject *rest, *restkw;
+    if (!splitpartnum(args, kw, partNum, rest, restkw))
+        return NULL;
+    TiledOutputPart *part = cachedpart(oc->o, *oc->tiledparts, partNum, true);
+    PyObject *r = (part == NULL) ? NULL : writer(*part, oc->lock, rest, restkw);
+    Py_DECREF(rest);
+    Py_XDECREF(restkw);
+    return r;
+}
+
+static PyObject *multiwritetile(PyObject *self, PyObject *args, PyObject *kw)
+{
+    return writetiledpart(self, args, kw, tiledwritetile<TiledOutputPart>);
+}
+
+static PyObject *multiwritetiles(PyObject *self, PyObject *args, PyObject *kw)
+{
+    return writetiledpart(self, args, kw, tiledwritetiles<TiledOutputPart>);
+}
+
+template <LevelQuery Q>
+static PyObject *levelquery_multiout(PyObject *self, PyObject *args)
+{
+    MultiPartOutputFileC *oc = (MultiPartOutputFileC *)self;
+    int partNum;
+    PyObject *rest, *restkw;
+    if (!splitpartnum(args, NULL, partNum, rest, restkw))
+        return NULL;
+    PyObject *r = NULL;
+    if (!oc->is_opened) {
+        PyErr_SetString(PyExc_OSError, "file is closed");
+    } else {
+        TiledOutputPart *part = cachedpart(oc->o, *oc->tiledparts, partNum, true);
+        if (part != NULL)
+            r = levelquery(*part, 1, rest, Q);
+    }
+    Py_DECREF(rest);
+    return r;
+}
+
 // static PyObject *outcurrentscanline(PyObject *self, PyObject *args)
 // {
 //     if (!((OutputFileC *)self)->is_opened) {
@@ -2227,22 +6698,134 @@ static PyObject *multioutwrite(PyObject *self, PyObject *args)
 //     return PyLong_FromLong(file->currentScanLine());
 // }
 
+static void freebindings(std::vector<WriteBinding *> &bindings)
+{
+    for (size_t i = 0; i < bindings.size(); i++)
+        freebinding(bindings[i]);
+    bindings.clear();
+}
+
+// Returns the binding slot of scan line part partNum, making the part
+// if need be.  Returns NULL with an exception set.
+
+static WriteBinding **bindingslot(MultiPartOutputFileC *oc, int partNum, OutputPart *&part)
+{
+    if (!oc->is_opened) {
+	PyErr_SetString(PyExc_OSError, "cannot write to closed file");
+	return NULL;
+    }
+    part = cachedpart(oc->o, *oc->parts, partNum, false);
+    if (part == NULL)
+        return NULL;
+    if (oc->bindings->empty())
+        oc->bindings->resize(oc->o.parts(), NULL);
+    return &(*oc->bindings)[partNum];
+}
+
+static PyObject *multioutbind(PyObject *self, PyObject *args, PyObject *kw)
+{
+    MultiPartOutputFileC *oc = (MultiPartOutputFileC *)self;
+    int partNum;
+    PyObject *pixeldata;
+    int rows = 0;
+    PyObject *cnames = NULL;
+    char *keywords[] = { (char*)"partNum", (char*)"pixels", (char*)"rows", (char*)"cnames", NULL };
+    if (!PyArg_ParseTupleAndKeywords(args, kw, "iO|iO:bind", keywords, &partNum, &pixeldata, &rows, &cnames))
+       return NULL;
+
+    OutputPart *part;
+    WriteBinding **slot = bindingslot(oc, partNum, part);
+    if (slot == NULL)
+        return NULL;
+    WriteBinding *b = makebinding(part->header(), pixeldata, rows, cnames);
+    if (b == NULL)
+        return NULL;
+    freebinding(*slot);
+    *slot = b;
+    Py_RETURN_NONE;
+}
+
+static PyObject *multioutwriterows(PyObject *self, PyObject *args)
+{
+    MultiPartOutputFileC *oc = (MultiPartOutputFileC *)self;
+    int partNum;
+    int n = 0;
+    if (!PyArg_ParseTuple(args, "i|i:writeRows", &partNum, &n))
+       return NULL;
+
+    OutputPart *part;
+    WriteBinding **slot = bindingslot(oc, partNum, part);
+    if (slot == NULL)
+        return NULL;
+    if (*slot == NULL) {
+        PyErr_Format(PyExc_TypeError, "No pixels are bound to part %i", partNum);
+        return NULL;
+    }
+    if (!writerows(*part, **slot, oc->lock, n, NULL))
+        return NULL;
+    Py_RETURN_NONE;
+}
+
+static PyObject *multioutunbind(PyObject *self, PyObject *args)
+{
+    MultiPartOutputFileC *oc = (MultiPartOutputFileC *)self;
+    int partNum;
+    if (!PyArg_ParseTuple(args, "i:unbind", &partNum))
+       return NULL;
+    if (oc->bindings != NULL && partNum >= 0 && (size_t)partNum < oc->bindings->size())
+        freebinding((*oc->bindings)[partNum]);
+    Py_RETURN_NONE;
+}
+
 static PyObject *multioutclose(PyObject *self, PyObject *args)
 {
     MultiPartOutputFileC *oc = (MultiPartOutputFileC *)self;
     if (oc->is_opened) {
       oc->is_opened = 0;
+      freebindings(*oc->bindings);
       MultiPartOutputFile *file = &oc->o;
-      file->~MultiPartOutputFile();
+      try
+      {
+        ReleaseGIL nogil(oc->lock, true);
+        deleteparts(*oc->parts);
+        deleteparts(*oc->tiledparts);
+        file->~MultiPartOutputFile();
+        if (oc->ostream)
+          oc->ostream->flush();
+      }
+      catch (const std::exception &e)
+      {
+        PyErr_SetString(PyExc_OSError, e.what());
+        return NULL;
+      }
     }
     Py_RETURN_NONE;
 }
 
+static PyObject *multioutcallbacks(PyObject *self, PyObject *args)
+{
+    MultiPartOutputFileC *oc = (MultiPartOutputFileC *)self;
+    return PyLong_FromLong(oc->ostream ? oc->ostream->callbacks() : 0);
+}
+
 /* Method table */
 static PyMethodDef MultiPartOutputFile_methods[] = {
-  {"writePixels", multioutwrite, METH_VARARGS},
+  {"writePixels", (PyCFunction)multioutwrite, METH_VARARGS | METH_KEYWORDS},
+  {"writeTile", (PyCFunction)multiwritetile, METH_VARARGS | METH_KEYWORDS},
+  {"writeTiles", (PyCFunction)multiwritetiles, METH_VARARGS | METH_KEYWORDS},
+  {"numXTiles", levelquery_multiout<NUM_X_TILES>, METH_VARARGS},
+  {"numYTiles", levelquery_multiout<NUM_Y_TILES>, METH_VARARGS},
+  {"numLevels", levelquery_multiout<NUM_LEVELS>, METH_VARARGS},
+  {"numXLevels", levelquery_multiout<NUM_X_LEVELS>, METH_VARARGS},
+  {"numYLevels", levelquery_multiout<NUM_Y_LEVELS>, METH_VARARGS},
+  {"levelWidth", levelquery_multiout<LEVEL_WIDTH>, METH_VARARGS},
+  {"levelHeight", levelquery_multiout<LEVEL_HEIGHT>, METH_VARARGS},
+  {"bind", (PyCFunction)multioutbind, METH_VARARGS | METH_KEYWORDS},
+  {"writeRows", multioutwriterows, METH_VARARGS},
+  {"unbind", multioutunbind, METH_VARARGS},
  // {"currentScanLine", outcurrentscanline, METH_VARARGS},
   {"close", multioutclose, METH_VARARGS},
+  {"callbackCount", multioutcallbacks, METH_VARARGS},
   {NULL, NULL},
 };
 
@@ -2250,9 +6833,19 @@ static void
 MultiPartOutputFile_dealloc(PyObject *self)
 {
     MultiPartOutputFileC *object = ((MultiPartOutputFileC *)self);
+    PyObject *r = multioutclose(self, NULL);
+    if (r != NULL)
+        Py_DECREF(r);
+    else
+        PyErr_WriteUnraisable(self);
+    delete object->ostream;
+    delete object->parts;
+    delete object->tiledparts;
+    delete object->bindings;
     if (object->fo)
         Py_DECREF(object->fo);
-    Py_DECREF(multioutclose(self, NULL));
+    if (object->lock)
+        freefilelock(object->lock);
     PyObject_Del(self);
 }
 
@@ -2349,15 +6942,26 @@ int makeMultiPartOutputFile(PyObject *self, PyObject *args, PyObject *kwds)
         if (!ok)
           return -1;
 
-        header.setType(SCANLINEIMAGE); // FIXME: Need to support TILEDIMAGE
+        if (!header.hasType())
+            header.setType(header.hasTileDescription() ? TILEDIMAGE : SCANLINEIMAGE);
         
         headers.push_back(header);
     
     }
 
 
+    if (object->lock == NULL)
+        object->lock = newfilelock(&object->is_opened);
+    if (object->parts == NULL)
+        object->parts = new std::vector<OutputPart *>;
+    if (object->tiledparts == NULL)
+        object->tiledparts = new std::vector<TiledOutputPart *>;
+    if (object->bindings == NULL)
+        object->bindings = new std::vector<WriteBinding *>;
+
     try
     {
+      ReleaseGIL nogil;
       if (numthreads < 0)
 	{
 	  if (filename != NULL)
@@ -2381,6 +6985,742 @@ int makeMultiPartOutputFile(PyObject *self, PyObject *args, PyObject *kwds)
     object->is_opened = 1;
     return 0;
 }
+
+////////////////////////////////////////////////////////////////////////
+//    Whole-file functions
+////////////////////////////////////////////////////////////////////////
+
+// Opens the filename or file object fo as a MultiPartInputFile, which
+// reads any kind of OpenEXR file, through a memory-mapped stream where
+// possible unless map is false.  istream holds the stream, if any, and
+// must outlive file.  Returns false with an exception set.
+
+static bool openmultipart(PyObject *fo, int numThreads,
+                          std::unique_ptr<IStream> &istream,
+                          std::unique_ptr<MultiPartInputFile> &file,
+                          bool map = true)
+{
+    std::string filename;
+    if (PyString_Check(fo) || PyUnicode_Check(fo)) {
+        if (!path_from_object(fo, filename))
+            return false;
+        if (map)
+            istream.reset(MMap_IStream::open(filename.c_str()));
+    } else {
+        if (map)
+            istream.reset(MMap_IStream::open(fo));
+        if (!istream)
+            istream.reset(new C_IStream(fo));
+    }
+
+    try
+    {
+        ReleaseGIL nogil;
+        if (istream)
+            file.reset(new MultiPartInputFile(*istream, numThreads));
+        else
+            file.reset(new MultiPartInputFile(filename.c_str(), numThreads));
+    }
+    catch (const std::exception &e)
+    {
+        PyErr_SetString(PyExc_OSError, e.what());
+        return false;
+    }
+    return true;
+}
+
+// Sets filename to the path fo names, or ostream to a stream that writes
+// to the file object fo.  Returns false with an exception set.
+
+static bool outputtarget(PyObject *fo, std::string &filename,
+                         std::unique_ptr<C_OStream> &ostream)
+{
+    if (PyString_Check(fo) || PyUnicode_Check(fo))
+        return path_from_object(fo, filename);
+    ostream.reset(new C_OStream(fo));
+    return true;
+}
+
+////////////////////////////////////////////////////////////////////////
+//    Deep images
+////////////////////////////////////////////////////////////////////////
+
+// Deep pixels are read into, and written from, a flat layout: a uint32
+// sample count for each pixel of the data window in row-major order,
+// and one contiguous buffer per channel holding the samples of every
+// pixel one after another.  The samples of pixel i start at offsets[i],
+// the sum of the counts of the pixels before it.
+
+static void readdeepcounts(DeepScanLineInputPart &part, const Box2i &dw)
+{
+    part.readPixelSampleCounts(dw.min.y, dw.max.y);
+}
+
+static void readdeepcounts(DeepTiledInputPart &part, const Box2i &dw)
+{
+    part.readPixelSampleCounts(0, part.numXTiles(0) - 1, 0, part.numYTiles(0) - 1, 0, 0);
+}
+
+static void readdeepsamples(DeepScanLineInputPart &part, const Box2i &dw)
+{
+    part.readPixels(dw.min.y, dw.max.y);
+}
+
+static void readdeepsamples(DeepTiledInputPart &part, const Box2i &dw)
+{
+    part.readTiles(0, part.numXTiles(0) - 1, 0, part.numYTiles(0) - 1, 0, 0);
+}
+
+// Reads the named channels of the deep part into the flat layout,
+// converting the samples to pixel_type if it is not NULL.  Returns the
+// tuple (counts, offsets, samples), or NULL with an exception set.
+
+template <class P>
+static PyObject *readdeep(P &part, const std::vector<std::string> &names,
+                          PyObject *pixel_type, bool as_numpy)
+{
+    const Header &header = part.header();
+    Box2i dw = header.dataWindow();
+    int width = dw.max.x - dw.min.x + 1;
+    int height = dw.max.y - dw.min.y + 1;
+    size_t n = (size_t)width * height;
+
+    std::vector<PixelType> types(names.size());
+    for (size_t i = 0; i < names.size(); i++) {
+        const Channel *channelPtr = header.channels().findChannel(names[i].c_str());
+        if (channelPtr == NULL) {
+            PyErr_Format(PyExc_TypeError, "There is no channel '%s' in the image", names[i].c_str());
+            return NULL;
+        }
+        types[i] = channelPtr->type;
+        if (pixel_type != NULL && !pixeltype_from_object(pixel_type, types[i]))
+            return NULL;
+    }
+
+    // The pointer slices go into the frame buffer before the counts are
+    // read, and are filled in once the size of the sample buffers is known.
+    char *countdata;
+    PyObject *counts = newflat("uint32", Py_BuildValue("(ii)", height, width),
+                               n * sizeof(unsigned int), as_numpy, countdata);
+    if (counts == NULL)
+        return NULL;
+    size_t xStride = sizeof(unsigned int);
+    size_t yStride = xStride * width;
+    DeepFrameBuffer frameBuffer;
+    frameBuffer.insertSampleCountSlice(Slice(UINT,
+                                             countdata - dw.min.x * xStride - dw.min.y * yStride,
+                                             xStride, yStride));
+    std::vector<std::vector<char *> > pointers(names.size(), std::vector<char *>(n));
+    for (size_t i = 0; i < names.size(); i++) {
+        frameBuffer.insert(names[i].c_str(),
+            DeepSlice(types[i],
+                      (char *)&pointers[i][0] - dw.min.x * sizeof(char *) - dw.min.y * width * sizeof(char *),
+                      sizeof(char *),
+                      width * sizeof(char *),
+                      compute_typesize(types[i])));
+    }
+    try
+    {
+        ReleaseGIL nogil;
+        part.setFrameBuffer(frameBuffer);
+        readdeepcounts(part, dw);
+    }
+    catch (const std::exception &e)
+    {
+        Py_DECREF(counts);
+        PyErr_SetString(PyExc_OSError, e.what());
+        return NULL;
+    }
+
+    char *offsetdata;
+    PyObject *offsets = newflat("uint64", Py_BuildValue("(n)", (Py_ssize_t)n + 1),
+                                (n + 1) * sizeof(uint64_t), as_numpy, offsetdata);
+    if (offsets == NULL) {
+        Py_DECREF(counts);
+        return NULL;
+    }
+    const unsigned int *count = (const unsigned int *)countdata;
+    uint64_t *offset = (uint64_t *)offsetdata;
+    offset[0] = 0;
+    for (size_t j = 0; j < n; j++)
+        offset[j + 1] = offset[j] + count[j];
+    size_t total = offset[n];
+
+    PyObject *samples = PyDict_New();
+    for (size_t i = 0; i < names.size(); i++) {
+        size_t typeSize = compute_typesize(types[i]);
+        char *data;
+        PyObject *a = newflat(numpy_dtype(types[i]), Py_BuildValue("(n)", (Py_ssize_t)total),
+                              total * typeSize, as_numpy, data);
+        if (a == NULL) {
+            Py_DECREF(counts);
+            Py_DECREF(offsets);
+            Py_DECREF(samples);
+            return NULL;
+        }
+        PyDict_SetItemString(samples, names[i].c_str(), a);
+        Py_DECREF(a);
+        for (size_t j = 0; j < n; j++)
+            pointers[i][j] = data + offset[j] * typeSize;
+    }
+
+    try
+    {
+        ReleaseGIL nogil;
+        readdeepsamples(part, dw);
+    }
+    catch (const std::exception &e)
+    {
+        Py_DECREF(counts);
+        Py_DECREF(offsets);
+        Py_DECREF(samples);
+        PyErr_SetString(PyExc_OSError, e.what());
+        return NULL;
+    }
+    return Py_BuildValue("(NNN)", counts, offsets, samples);
+}
+
+static PyObject *read_deep(PyObject *self, PyObject *args, PyObject *kw)
+{
+    PyObject *fo;
+    PyObject *clist = NULL;
+    PyObject *pixel_type = NULL;
+    PyObject *as_numpy = Py_False;
+    int partNum = 0;
+    char *keywords[] = { (char*)"file", (char*)"cnames", (char*)"pixel_type", (char*)"numpy", (char*)"partNum", NULL };
+    if (!PyArg_ParseTupleAndKeywords(args, kw, "O|OOOi:read_deep", keywords, &fo, &clist, &pixel_type, &as_numpy, &partNum))
+        return NULL;
+    if (pixel_type == Py_None)
+        pixel_type = NULL;
+
+    std::vector<std::string> names;
+    if (clist != NULL && clist != Py_None && !channelnames(clist, names))
+        return NULL;
+
+    std::unique_ptr<IStream> istream;
+    std::unique_ptr<MultiPartInputFile> file;
+    if (!openmultipart(fo, globalThreadCount(), istream, file))
+        return NULL;
+
+    if (partNum < 0 || partNum >= file->parts()) {
+        PyErr_Format(PyExc_IndexError, "There is no part %i in the image", partNum);
+        return NULL;
+    }
+    const Header &header = file->header(partNum);
+    if (!header.hasType() || !isDeepData(header.type())) {
+        PyErr_Format(PyExc_TypeError, "Part %i is not deep", partNum);
+        return NULL;
+    }
+    if (clist == NULL || clist == Py_None) {
+        for (ChannelList::ConstIterator i = header.channels().begin(); i != header.channels().end(); ++i)
+            names.push_back(i.name());
+    }
+
+    if (isTiled(header.type())) {
+        std::unique_ptr<DeepTiledInputPart> part;
+        try
+        {
+            part.reset(new DeepTiledInputPart(*file, partNum));
+        }
+        catch (const std::exception &e)
+        {
+            PyErr_SetString(PyExc_OSError, e.what());
+            return NULL;
+        }
+        return readdeep(*part, names, pixel_type, PyObject_IsTrue(as_numpy));
+    } else {
+        std::unique_ptr<DeepScanLineInputPart> part;
+        try
+        {
+            part.reset(new DeepScanLineInputPart(*file, partNum));
+        }
+        catch (const std::exception &e)
+        {
+            PyErr_SetString(PyExc_OSError, e.what());
+            return NULL;
+        }
+        return readdeep(*part, names, pixel_type, PyObject_IsTrue(as_numpy));
+    }
+}
+
+static PyObject *write_deep(PyObject *self, PyObject *args, PyObject *kw)
+{
+    PyObject *fo;
+    PyObject *header_dict;
+    PyObject *countsobj;
+    PyObject *pixeldata;
+    char *keywords[] = { (char*)"file", (char*)"header", (char*)"counts", (char*)"samples", NULL };
+    if (!PyArg_ParseTupleAndKeywords(args, kw, "OO!OO!:write_deep", keywords,
+                                     &fo, &PyDict_Type, &header_dict, &countsobj, &PyDict_Type, &pixeldata))
+        return NULL;
+
+    int ok;
+    Header header = makeHeaderFromDict(ok, header_dict);
+    if (!ok)
+        return NULL;
+    bool tiled = header.hasTileDescription();
+    if (tiled && header.tileDescription().mode != ONE_LEVEL) {
+        PyErr_SetString(PyExc_TypeError, "Deep tiled images must have a single level");
+        return NULL;
+    }
+    header.setType(tiled ? DEEPTILE : DEEPSCANLINE);
+
+    Box2i dw = header.dataWindow();
+    int width = dw.max.x - dw.min.x + 1;
+    int height = dw.max.y - dw.min.y + 1;
+    size_t n = (size_t)width * height;
+
+    std::vector<Py_buffer> views;
+    Py_buffer view;
+    if (!PyObject_CheckBuffer(countsobj) || PyObject_GetBuffer(countsobj, &view, PyBUF_CONTIG_RO) != 0) {
+        PyErr_SetString(PyExc_TypeError, "Sample counts must support buffer protocol");
+        return NULL;
+    }
+    views.push_back(view);
+    if ((size_t)view.len != n * sizeof(unsigned int)) {
+        releaseviews(views);
+        PyErr_Format(PyExc_TypeError, "Sample counts should have size %zu but got %zu", n * sizeof(unsigned int), (size_t)view.len);
+        return NULL;
+    }
+    char *countdata = (char *)view.buf;
+    const unsigned int *count = (const unsigned int *)countdata;
+    std::vector<size_t> offset(n + 1);
+    offset[0] = 0;
+    for (size_t j = 0; j < n; j++)
+        offset[j + 1] = offset[j] + count[j];
+    size_t total = offset[n];
+
+    size_t xStride = sizeof(unsigned int);
+    size_t yStride = xStride * width;
+    DeepFrameBuffer frameBuffer;
+    frameBuffer.insertSampleCountSlice(Slice(UINT,
+                                             countdata - dw.min.x * xStride - dw.min.y * yStride,
+                                             xStride, yStride));
+
+    // The library does not fill in deep channels that have no slice, so
+    // channels missing from samples are written as zeros.
+    const ChannelList &channels = header.channels();
+    std::vector<std::vector<char *> > pointers;
+    std::vector<std::vector<char> > zeros;
+    for (ChannelList::ConstIterator i = channels.begin(); i != channels.end(); ++i) {
+        PyObject *name = PyUnicode_FromString(i.name());
+        PyObject *channel_spec = PyDict_GetItem(pixeldata, name);
+        Py_DECREF(name);
+        PixelType pt = i.channel().type;
+        size_t typeSize = compute_typesize(pt);
+        char *data;
+        if (channel_spec == NULL) {
+            zeros.push_back(std::vector<char>(total * typeSize + 1));
+            data = &zeros.back()[0];
+        } else {
+            if (!PyObject_CheckBuffer(channel_spec) || PyObject_GetBuffer(channel_spec, &view, PyBUF_CONTIG_RO) != 0) {
+                releaseviews(views);
+                PyErr_Format(PyExc_TypeError, "Data for channel '%s' must support buffer protocol", i.name());
+                return NULL;
+            }
+            views.push_back(view);
+            if ((size_t)view.len != total * typeSize) {
+                releaseviews(views);
+                PyErr_Format(PyExc_TypeError, "Data for channel '%s' should have size %zu but got %zu", i.name(), total * typeSize, (size_t)view.len);
+                return NULL;
+            }
+            data = (char *)view.buf;
+        }
+        pointers.push_back(std::vector<char *>(n));
+        std::vector<char *> &p = pointers.back();
+        for (size_t j = 0; j < n; j++)
+            p[j] = data + offset[j] * typeSize;
+        frameBuffer.insert(i.name(),
+            DeepSlice(pt,
+                      (char *)&p[0] - dw.min.x * sizeof(char *) - dw.min.y * width * sizeof(char *),
+                      sizeof(char *),
+                      width * sizeof(char *),
+                      typeSize));
+    }
+
+    std::string filename;
+    std::unique_ptr<C_OStream> ostream;
+    if (!outputtarget(fo, filename, ostream)) {
+        releaseviews(views);
+        return NULL;
+    }
+
+    try
+    {
+        ReleaseGIL nogil;
+        {
+            std::unique_ptr<MultiPartOutputFile> file;
+            if (ostream)
+                file.reset(new MultiPartOutputFile(*ostream, &header, 1, false, globalThreadCount()));
+            else
+                file.reset(new MultiPartOutputFile(filename.c_str(), &header, 1, false, globalThreadCount()));
+            if (tiled) {
+                DeepTiledOutputPart part(*file, 0);
+                part.setFrameBuffer(frameBuffer);
+                part.writeTiles(0, part.numXTiles(0) - 1, 0, part.numYTiles(0) - 1, 0, 0);
+            } else {
+                DeepScanLineOutputPart part(*file, 0);
+                part.setFrameBuffer(frameBuffer);
+                part.writePixels(height);
+            }
+        }
+        if (ostream)
+            ostream->flush();
+    }
+    catch (const std::exception &e)
+    {
+        releaseviews(views);
+        PyErr_SetString(PyExc_OSError, e.what());
+        return NULL;
+    }
+    releaseviews(views);
+    Py_RETURN_NONE;
+}
+
+////////////////////////////////////////////////////////////////////////
+//    Copying and transcoding
+////////////////////////////////////////////////////////////////////////
+
+// Applies the dict updates to header.  A value of None removes the
+// attribute; other values are converted as in OutputFile headers.
+// Returns false with an exception set.
+
+static bool updateheader(Header &header, PyObject *updates)
+{
+    Py_ssize_t pos = 0;
+    PyObject *key, *value;
+    while (PyDict_Next(updates, &pos, &key, &value)) {
+        const char *name = PyUTF8_AsSstring(key);
+        if (name == NULL)
+            return false;
+        PyObject *single = NULL;
+        try {
+            if (value == Py_None) {
+                header.erase(name);
+                continue;
+            }
+            single = PyDict_New();
+            PyDict_SetItem(single, key, value);
+            int ok;
+            Header h = makeHeaderFromDict(ok, single);
+            Py_CLEAR(single);
+            if (!ok)
+                return false;
+            Header::ConstIterator i = h.find(name);
+            if (i == h.end()) {
+                PyErr_Format(PyExc_TypeError, "Cannot convert header attribute '%s'", name);
+                return false;
+            }
+            header.insert(name, i.attribute());
+        } catch (const std::exception &e) {
+            Py_XDECREF(single);
+            PyErr_SetString(PyExc_OSError, e.what());
+            return false;
+        }
+    }
+    return true;
+}
+
+// Returns true if the compressed chunks of a part with header a are
+// valid, unchanged, in a part with header b.
+
+static bool samelayout(const Header &a, const Header &b)
+{
+    if (a.dataWindow() != b.dataWindow() ||
+        a.lineOrder() != b.lineOrder() ||
+        a.compression() != b.compression() ||
+        !(a.channels() == b.channels()) ||
+        a.hasTileDescription() != b.hasTileDescription())
+        return false;
+    return !a.hasTileDescription() || a.tileDescription() == b.tileDescription();
+}
+
+// Returns true if a part with header a can be decoded into a part with
+// header b: only the compression, line order and channel types differ.
+
+static bool transcodable(const Header &a, const Header &b)
+{
+    if (a.dataWindow() != b.dataWindow() ||
+        a.hasTileDescription() != b.hasTileDescription() ||
+        (a.hasTileDescription() && !(a.tileDescription() == b.tileDescription())))
+        return false;
+    ChannelList::ConstIterator i = a.channels().begin();
+    ChannelList::ConstIterator j = b.channels().begin();
+    for (; i != a.channels().end() && j != b.channels().end(); ++i, ++j) {
+        if (strcmp(i.name(), j.name()) != 0 ||
+            i.channel().xSampling != j.channel().xSampling ||
+            i.channel().ySampling != j.channel().ySampling)
+            return false;
+    }
+    return i == a.channels().end() && j == b.channels().end();
+}
+
+// Holds one band of decoded pixels, rows high, for every channel of
+// header, in the output's pixel types.
+
+struct Band
+{
+    std::vector<std::vector<char> > data;
+    std::vector<size_t> yStride;
+
+    Band(const Header &header, int width, int rows)
+    {
+        const ChannelList &channels = header.channels();
+        for (ChannelList::ConstIterator i = channels.begin(); i != channels.end(); ++i) {
+            const Channel &c = i.channel();
+            yStride.push_back(compute_typesize(c.type) * ((width + c.xSampling - 1) / c.xSampling + 1));
+            data.push_back(std::vector<char>(yStride.back() * (rows / c.ySampling + 1)));
+        }
+    }
+
+    // Returns a frame buffer that places pixel (ox, oy) at the start of
+    // the band.
+    FrameBuffer framebuffer(const Header &header, int ox, int oy)
+    {
+        FrameBuffer frameBuffer;
+        const ChannelList &channels = header.channels();
+        size_t k = 0;
+        for (ChannelList::ConstIterator i = channels.begin(); i != channels.end(); ++i, ++k) {
+            const Channel &c = i.channel();
+            size_t typeSize = compute_typesize(c.type);
+            frameBuffer.insert(i.name(),
+                               Slice(c.type,
+                                     &data[k][0] - (ox / c.xSampling) * typeSize - (oy / c.ySampling) * yStride[k],
+                                     typeSize, yStride[k],
+                                     c.xSampling, c.ySampling));
+        }
+        return frameBuffer;
+    }
+};
+
+// Decodes a scan line part a band of whole chunks at a time and encodes
+// each band into out.  Both files run their thread pools over the
+// chunks of a band.
+
+static void transcodescanlines(InputPart &in, OutputPart &out)
+{
+    const Header &header = out.header();
+    Box2i dw = header.dataWindow();
+    int width = dw.max.x - dw.min.x + 1;
+    int chunk = std::max(linesperchunk(in.header()), linesperchunk(header));
+    int rows = chunk * std::max(1, 64 / chunk);
+    Band band(header, width, rows);
+
+    std::vector<int> starts;
+    for (int y = dw.min.y; y <= dw.max.y; y += rows)
+        starts.push_back(y);
+    if (header.lineOrder() == DECREASING_Y)
+        std::reverse(starts.begin(), starts.end());
+
+    for (size_t i = 0; i < starts.size(); i++) {
+        int y = starts[i];
+        int last = std::min(y + rows - 1, dw.max.y);
+        FrameBuffer frameBuffer = band.framebuffer(header, dw.min.x, y);
+        in.setFrameBuffer(frameBuffer);
+        in.readPixels(y, last);
+        out.setFrameBuffer(frameBuffer);
+        out.writePixels(last - y + 1);
+    }
+}
+
+// Decodes a tiled part a row of tiles at a time, for every level, and
+// encodes each row into out.
+
+static void transcodetiles(TiledInputPart &in, TiledOutputPart &out)
+{
+    const Header &header = out.header();
+    std::vector<std::pair<int, int> > levels;
+    switch (out.levelMode()) {
+    case ONE_LEVEL:
+        levels.push_back(std::make_pair(0, 0));
+        break;
+    case MIPMAP_LEVELS:
+        for (int l = 0; l < out.numLevels(); l++)
+            levels.push_back(std::make_pair(l, l));
+        break;
+    default:
+        for (int ly = 0; ly < out.numYLevels(); ly++)
+            for (int lx = 0; lx < out.numXLevels(); lx++)
+                levels.push_back(std::make_pair(lx, ly));
+        break;
+    }
+
+    for (size_t l = 0; l < levels.size(); l++) {
+        int lx = levels[l].first, ly = levels[l].second;
+        Box2i lw = out.dataWindowForLevel(lx, ly);
+        Band band(header, lw.max.x - lw.min.x + 1, out.tileYSize());
+        int nx = out.numXTiles(lx);
+        for (int ty = 0; ty < out.numYTiles(ly); ty++) {
+            Box2i tw = out.dataWindowForTile(0, ty, lx, ly);
+            FrameBuffer frameBuffer = band.framebuffer(header, lw.min.x, tw.min.y);
+            in.setFrameBuffer(frameBuffer);
+            in.readTiles(0, nx - 1, ty, ty, lx, ly);
+            out.setFrameBuffer(frameBuffer);
+            out.writeTiles(0, nx - 1, ty, ty, lx, ly);
+        }
+    }
+}
+
+// Writes every part of src to dst.  The header of each part is first
+// updated by updates (if not NULL), then given compression and, for
+// HALF and FLOAT channels, pixel type pt (if set).  Parts whose layout
+// is unchanged are copied as compressed chunks; the rest are decoded
+// and re-encoded.
+
+static PyObject *copyparts(PyObject *src, PyObject *dst, PyObject *updates,
+                           const Compression *compression, const PixelType *pt,
+                           int threads)
+{
+    if (threads < 0)
+        threads = globalThreadCount();
+
+    std::unique_ptr<IStream> istream;
+    std::unique_ptr<MultiPartInputFile> in;
+    if (!openmultipart(src, threads, istream, in))
+        return NULL;
+
+    int parts = in->parts();
+    std::vector<Header> headers;
+    std::vector<bool> raw;
+    for (int i = 0; i < parts; i++) {
+        const Header &ih = in->header(i);
+        Header h = ih;
+        if (updates != NULL && !updateheader(h, updates))
+            return NULL;
+        if (compression != NULL)
+            h.compression() = *compression;
+        if (pt != NULL) {
+            for (ChannelList::Iterator j = h.channels().begin(); j != h.channels().end(); ++j)
+                if (j.channel().type != UINT)
+                    j.channel().type = *pt;
+        }
+        // The output parts are opened by type, so it cannot be removed.
+        h.setType(ih.type());
+        raw.push_back(samelayout(ih, h));
+        if (!raw.back()) {
+            if (isDeepData(ih.type())) {
+                PyErr_Format(PyExc_TypeError, "Part %i is deep, and can only be copied unchanged", i);
+                return NULL;
+            }
+            if (!transcodable(ih, h)) {
+                PyErr_Format(PyExc_TypeError, "Part %i: only the compression, line order and channel types can change", i);
+                return NULL;
+            }
+        }
+        headers.push_back(h);
+    }
+
+    // TiledInputFile::rawTileData reads into a buffer that is never
+    // allocated for memory-mapped streams, so quick tiled copies must
+    // read the file through an ordinary stream.
+    bool rawtiles = false;
+    for (int i = 0; i < parts; i++)
+        rawtiles |= raw[i] && in->header(i).type() == TILEDIMAGE;
+    if (rawtiles && istream && istream->isMemoryMapped()) {
+        in.reset();
+        istream.reset();
+        if (!openmultipart(src, threads, istream, in, false))
+            return NULL;
+    }
+
+    std::string filename;
+    std::unique_ptr<C_OStream> ostream;
+    if (!outputtarget(dst, filename, ostream))
+        return NULL;
+
+    try
+    {
+        ReleaseGIL nogil;
+        {
+            std::unique_ptr<MultiPartOutputFile> out;
+            if (ostream)
+                out.reset(new MultiPartOutputFile(*ostream, &headers[0], parts, false, threads));
+            else
+                out.reset(new MultiPartOutputFile(filename.c_str(), &headers[0], parts, false, threads));
+            for (int i = 0; i < parts; i++) {
+                const std::string &type = in->header(i).type();
+                if (type == DEEPSCANLINE) {
+                    DeepScanLineInputPart ip(*in, i);
+                    DeepScanLineOutputPart(*out, i).copyPixels(ip);
+                } else if (type == DEEPTILE) {
+                    DeepTiledInputPart ip(*in, i);
+                    DeepTiledOutputPart(*out, i).copyPixels(ip);
+                } else if (type == TILEDIMAGE) {
+                    TiledInputPart ip(*in, i);
+                    TiledOutputPart op(*out, i);
+                    if (raw[i])
+                        op.copyPixels(ip);
+                    else
+                        transcodetiles(ip, op);
+                } else {
+                    InputPart ip(*in, i);
+                    OutputPart op(*out, i);
+                    if (raw[i])
+                        op.copyPixels(ip);
+                    else
+                        transcodescanlines(ip, op);
+                }
+            }
+        }
+        if (ostream)
+            ostream->flush();
+    }
+    catch (const std::exception &e)
+    {
+        PyErr_SetString(PyExc_OSError, e.what());
+        return NULL;
+    }
+    Py_RETURN_NONE;
+}
+
+static PyObject *copy_file(PyObject *self, PyObject *args, PyObject *kw)
+{
+    PyObject *src, *dst;
+    PyObject *updates = NULL;
+    char *keywords[] = { (char*)"src", (char*)"dst", (char*)"header", NULL };
+    if (!PyArg_ParseTupleAndKeywords(args, kw, "OO|O!:copy", keywords, &src, &dst, &PyDict_Type, &updates))
+        return NULL;
+    return copyparts(src, dst, updates, NULL, NULL, -1);
+}
+
+static PyObject *transcode_file(PyObject *self, PyObject *args, PyObject *kw)
+{
+    PyObject *src, *dst;
+    PyObject *compression_obj = NULL;
+    PyObject *pixel_type = NULL;
+    PyObject *updates = NULL;
+    int threads = -1;
+    char *keywords[] = { (char*)"src", (char*)"dst", (char*)"compression", (char*)"pixel_type", (char*)"header", (char*)"threads", NULL };
+    if (!PyArg_ParseTupleAndKeywords(args, kw, "OO|OOO!i:transcode", keywords,
+                                     &src, &dst, &compression_obj, &pixel_type, &PyDict_Type, &updates, &threads))
+        return NULL;
+
+    Compression compression;
+    if (compression_obj != NULL && compression_obj != Py_None) {
+        PyObject *v = PyObject_GetAttrString(compression_obj, "v");
+        long c;
+        if (v == NULL) {
+            PyErr_Clear();
+            c = PyLong_AsLong(compression_obj);
+        } else {
+            c = PyLong_AsLong(v);
+            Py_DECREF(v);
+        }
+        if (PyErr_Occurred() || c < 0 || c >= NUM_COMPRESSION_METHODS) {
+            PyErr_SetString(PyExc_TypeError, "Invalid Compression object");
+            return NULL;
+        }
+        compression = Compression(c);
+    }
+    PixelType pt;
+    if (pixel_type != NULL && pixel_type != Py_None && !pixeltype_from_object(pixel_type, pt))
+        return NULL;
+
+    return copyparts(src, dst, updates,
+                     (compression_obj != NULL && compression_obj != Py_None) ? &compression : NULL,
+                     (pixel_type != NULL && pixel_type != Py_None) ? &pt : NULL,
+                     threads);
+}
 #endif
 
 ////////////////////////////////////////////////////////////////////////
@@ -2389,7 +7729,19 @@ static PyMethodDef methods[] = {
     {"Header", makeHeader, METH_VARARGS},
     {"setGlobalThreadCount", set_global_thread_count, METH_VARARGS},
     {"globalThreadCount", get_global_thread_count, METH_VARARGS},
+    {"setAsyncThreadCount", set_async_thread_count, METH_VARARGS},
+    {"asyncThreadCount", get_async_thread_count, METH_VARARGS},
+    {"setStreamBufferSize", set_stream_buffer_size, METH_VARARGS},
+    {"streamBufferSize", get_stream_buffer_size, METH_VARARGS},
     {"isOpenExrFile", _isOpenExrFile, METH_VARARGS},
+    {"read_headers", (PyCFunction)read_headers, METH_VARARGS | METH_KEYWORDS},
+    {"read_many", (PyCFunction)read_many, METH_VARARGS | METH_KEYWORDS},
+#ifdef VERSION_HAS_MULTIPART
+    {"read_deep", (PyCFunction)read_deep, METH_VARARGS | METH_KEYWORDS},
+    {"write_deep", (PyCFunction)write_deep, METH_VARARGS | METH_KEYWORDS},
+    {"copy", (PyCFunction)copy_file, METH_VARARGS | METH_KEYWORDS},
+    {"transcode", (PyCFunction)transcode_file, METH_VARARGS | METH_KEYWORDS},
+#endif
 #ifdef VERSION_HAS_ISTILED
     {"isTiledOpenExrFile", _isTiledOpenExrFile, METH_VARARGS},
 #endif
@@ -2414,14 +7766,28 @@ MOD_INIT(OpenEXR)
     TiledInputFile_Type.tp_init = makeTiledInputFile;
     OutputFile_Type.tp_new = PyType_GenericNew;
     OutputFile_Type.tp_init = makeOutputFile;
+    TiledOutputFile_Type.tp_new = PyType_GenericNew;
+    TiledOutputFile_Type.tp_init = makeTiledOutputFile;
 
     if (PyType_Ready(&InputFile_Type) != 0)
         return MOD_ERROR_VAL;
+    ScanLineBlocks_Type.tp_flags = Py_TPFLAGS_DEFAULT;
+    ScanLineBlocks_Type.tp_iter = PyObject_SelfIter;
+    ScanLineBlocks_Type.tp_iternext = blocks_next;
+    if (PyType_Ready(&ScanLineBlocks_Type) != 0)
+        return MOD_ERROR_VAL;
+    FrameReader_Type.tp_flags = Py_TPFLAGS_DEFAULT;
+    FrameReader_Type.tp_iter = PyObject_SelfIter;
+    FrameReader_Type.tp_iternext = frames_next;
+    if (PyType_Ready(&FrameReader_Type) != 0)
+        return MOD_ERROR_VAL;
     if (PyType_Ready(&TiledInputFile_Type) != 0)
         return MOD_ERROR_VAL;
 
     if (PyType_Ready(&OutputFile_Type) != 0)
         return MOD_ERROR_VAL;
+    if (PyType_Ready(&TiledOutputFile_Type) != 0)
+        return MOD_ERROR_VAL;
 
 #ifdef VERSION_HAS_MULTIPART
     MultiPartInputFile_Type.tp_new = PyType_GenericNew;
@@ -2437,6 +7803,7 @@ MOD_INIT(OpenEXR)
     PyModule_AddObject(m, "InputFile", (PyObject *)&InputFile_Type);
     PyModule_AddObject(m, "TiledInputFile", (PyObject *)&TiledInputFile_Type);
     PyModule_AddObject(m, "OutputFile", (PyObject *)&OutputFile_Type);
+    PyModule_AddObject(m, "TiledOutputFile", (PyObject *)&TiledOutputFile_Type);
 #ifdef VERSION_HAS_MULTIPART
     PyModule_AddObject(m, "MultiPartInputFile", (PyObject *)&MultiPartInputFile_Type);
     PyModule_AddObject(m, "MultiPartOutputFile", (PyObject *)&MultiPartOutputFile_Type);
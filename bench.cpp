@@ -1,23 +1,229 @@
-#include <ImfRgba.h>
-#include <ImfRgbaFile.h>
+// Native counterpart of bench.py: times the same cases through the
+// OpenEXR C++ library, so that bench.py can report the cost of the
+// Python binding as a ratio.  Build it with, for example,
+//
+//   c++ -O2 -std=c++14 bench.cpp -o bench $(pkg-config --cflags --libs OpenEXR)
+//
+// and pass it to bench.py with --native ./bench.  Each line of standard
+// input describes one case:
+//
+//   direction layout target compression type channels threads width height repeat path
+//
+// where direction is read or write, layout is scanline, tiled or
+// multipart, target is path or file (an in-memory stream, standing in
+// for a Python file object), and compression and type are the integer
+// values of Imath.Compression and Imath.PixelType.  Read cases read the
+// file at path, which bench.py wrote; write cases with a path target
+// write to it.  For each line the best time in seconds over repeat runs
+// and the size of the file in bytes are printed.
+
+#include <ImfChannelList.h>
+#include <ImfFrameBuffer.h>
+#include <ImfHeader.h>
+#include <ImfInputFile.h>
+#include <ImfInputPart.h>
+#include <ImfMultiPartInputFile.h>
+#include <ImfMultiPartOutputFile.h>
+#include <ImfOutputFile.h>
+#include <ImfOutputPart.h>
+#include <ImfPartType.h>
+#include <ImfStdIO.h>
+#include <ImfThreading.h>
+#include <ImfTiledInputFile.h>
+#include <ImfTiledOutputFile.h>
+#include <half.h>
+
+#include <algorithm>
+#include <chrono>
+#include <cstdio>
+#include <fstream>
+#include <iostream>
+#include <sstream>
+#include <string>
+#include <vector>
 
 using namespace Imf;
+using namespace Imath;
+
+struct Case
+{
+    std::string direction, layout, target, path;
+    int compression, type, channels, threads, width, height, repeat;
+};
+
+// The channel names and pixel values match bench.py, so that both
+// write identical files.
+
+static std::string channelname(int c, int channels)
+{
+    if (channels <= 4)
+        return std::string(1, "RGBA"[c]);
+    char name[8];
+    snprintf(name, sizeof(name), "C%02d", c);
+    return name;
+}
+
+static int pixelvalue(long x, long y, long c)
+{
+    return (x * 7 + y * 13 + c * 31) % 1024 + (x * x * 3 + y * y * 5 + x * y * 11 + c * 17) % 97;
+}
+
+static size_t typesize(PixelType type)
+{
+    return type == HALF ? 2 : 4;
+}
+
+static Header makeheader(const Case &k, bool tiled)
+{
+    Header header(k.width, k.height);
+    header.compression() = Compression(k.compression);
+    for (int c = 0; c < k.channels; c++)
+        header.channels().insert(channelname(c, k.channels), Channel(PixelType(k.type)));
+    if (tiled)
+        header.setTileDescription(TileDescription(64, 64, ONE_LEVEL));
+    return header;
+}
+
+static std::vector<std::vector<char> > makepixels(const Case &k)
+{
+    std::vector<std::vector<char> > pixels(k.channels);
+    size_t n = (size_t)k.width * k.height;
+    for (int c = 0; c < k.channels; c++) {
+        pixels[c].resize(n * typesize(PixelType(k.type)));
+        for (int y = 0; y < k.height; y++) {
+            for (int x = 0; x < k.width; x++) {
+                size_t i = (size_t)y * k.width + x;
+                int v = pixelvalue(x, y, c);
+                if (k.type == HALF)
+                    ((half *)&pixels[c][0])[i] = half(v / 1024.0f);
+                else if (k.type == FLOAT)
+                    ((float *)&pixels[c][0])[i] = v / 1024.0f;
+                else
+                    ((unsigned int *)&pixels[c][0])[i] = v;
+            }
+        }
+    }
+    return pixels;
+}
 
-void
-writeRgba1 (const char fileName[],
-            const Rgba *pixels,
-            int width,
-            int height)
+static FrameBuffer makeframebuffer(const Case &k, std::vector<std::vector<char> > &pixels)
 {
-    RgbaOutputFile file (fileName, width, height, WRITE_RGBA);
-    file.setFrameBuffer (pixels, 1, width);
-    file.writePixels (height);
+    FrameBuffer frameBuffer;
+    size_t xStride = typesize(PixelType(k.type));
+    for (int c = 0; c < k.channels; c++)
+        frameBuffer.insert(channelname(c, k.channels),
+                           Slice(PixelType(k.type), &pixels[c][0], xStride, xStride * k.width));
+    return frameBuffer;
 }
 
-main() {
-    Rgba *pixels = new Rgba[1980 * 1080];
-    int i;
+static void write(const Case &k, OStream &os, std::vector<std::vector<char> > &pixels)
+{
+    FrameBuffer frameBuffer = makeframebuffer(k, pixels);
+    if (k.layout == "tiled") {
+        TiledOutputFile file(os, makeheader(k, true), k.threads);
+        file.setFrameBuffer(frameBuffer);
+        file.writeTiles(0, file.numXTiles() - 1, 0, file.numYTiles() - 1);
+    } else if (k.layout == "multipart") {
+        std::vector<Header> headers(2, makeheader(k, false));
+        for (int p = 0; p < 2; p++) {
+            headers[p].setName(p ? "part1" : "part0");
+            headers[p].setType(SCANLINEIMAGE);
+        }
+        MultiPartOutputFile file(os, &headers[0], 2, false, k.threads);
+        for (int p = 0; p < 2; p++) {
+            OutputPart part(file, p);
+            part.setFrameBuffer(frameBuffer);
+            part.writePixels(k.height);
+        }
+    } else {
+        OutputFile file(os, makeheader(k, false), k.threads);
+        file.setFrameBuffer(frameBuffer);
+        file.writePixels(k.height);
+    }
+}
 
-    for (i = 0; i < 10; i++)
-        writeRgba1("/dev/null", pixels, 1980, 1080);
+static void read(const Case &k, IStream &is)
+{
+    std::vector<std::vector<char> > pixels(k.channels, std::vector<char>((size_t)k.width * k.height * typesize(PixelType(k.type))));
+    FrameBuffer frameBuffer = makeframebuffer(k, pixels);
+    if (k.layout == "tiled") {
+        TiledInputFile file(is, k.threads);
+        file.setFrameBuffer(frameBuffer);
+        file.readTiles(0, file.numXTiles() - 1, 0, file.numYTiles() - 1);
+    } else if (k.layout == "multipart") {
+        MultiPartInputFile file(is, k.threads);
+        for (int p = 0; p < file.parts(); p++) {
+            InputPart part(file, p);
+            part.setFrameBuffer(frameBuffer);
+            part.readPixels(0, k.height - 1);
+        }
+    } else {
+        InputFile file(is, k.threads);
+        file.setFrameBuffer(frameBuffer);
+        file.readPixels(0, k.height - 1);
+    }
+}
+
+// Runs case k once and returns the size of the file.
+
+static size_t run(const Case &k, std::vector<std::vector<char> > &pixels, const std::string &contents)
+{
+    if (k.direction == "write") {
+        if (k.target == "file") {
+            StdOSStream os;
+            write(k, os, pixels);
+            return os.str().size();
+        }
+        {
+            StdOFStream os(k.path.c_str());
+            write(k, os, pixels);
+        }
+        std::ifstream f(k.path.c_str(), std::ios::binary | std::ios::ate);
+        return f.tellg();
+    }
+    if (k.target == "file") {
+        StdISStream is;
+        is.str(contents);
+        read(k, is);
+    } else {
+        StdIFStream is(k.path.c_str());
+        read(k, is);
+    }
+    return contents.size();
+}
+
+int main()
+{
+    std::string line;
+    while (std::getline(std::cin, line)) {
+        Case k;
+        std::istringstream fields(line);
+        if (!(fields >> k.direction >> k.layout >> k.target >> k.compression >> k.type
+                     >> k.channels >> k.threads >> k.width >> k.height >> k.repeat >> k.path))
+            continue;
+        try {
+            setGlobalThreadCount(k.threads);
+            std::vector<std::vector<char> > pixels;
+            std::string contents;
+            if (k.direction == "write") {
+                pixels = makepixels(k);
+            } else {
+                std::ifstream f(k.path.c_str(), std::ios::binary);
+                contents.assign(std::istreambuf_iterator<char>(f), std::istreambuf_iterator<char>());
+            }
+            double best = 1e30;
+            size_t size = 0;
+            for (int i = 0; i < k.repeat; i++) {
+                std::chrono::steady_clock::time_point t0 = std::chrono::steady_clock::now();
+                size = run(k, pixels, contents);
+                std::chrono::duration<double> t = std::chrono::steady_clock::now() - t0;
+                best = std::min(best, t.count());
+            }
+            std::cout << best << " " << size << std::endl;
+        } catch (const std::exception &e) {
+            std::cerr << e.what() << std::endl;
+            std::cout << "error 0" << std::endl;
+        }
+    }
+    return 0;
 }
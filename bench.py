@@ -1,14 +1,274 @@
+"""
+Benchmarks the binding over a grid of cases, optionally against the same
+cases run natively by bench.cpp, and reports the binding's overhead as
+the ratio of the two times.
+
+Each axis of the grid is a comma-separated option:
+
+  --direction   read, write
+  --compression Imath.Compression names (NO, ZIP, ...) or 'all'
+  --type        HALF, FLOAT, UINT
+  --layout      scanline, tiled (64x64 tiles), multipart (two scan line parts)
+  --target      path (a file on disk), file (a Python file-like object)
+  --channels    channel counts
+  --threads     thread counts, as for setGlobalThreadCount
+
+For example
+
+  python bench.py --native ./bench --json baseline.json
+  python bench.py --native ./bench --check baseline.json
+
+The second command re-runs the cases of baseline.json and exits with
+status 1 if any of them became slower, or has a larger overhead ratio,
+by more than --tolerance.
+"""
+
+import argparse
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
 import OpenEXR
 import Imath
 
-(w, h) = (1920, 1080)
+COMPRESSIONS = ["NO", "RLE", "ZIPS", "ZIP", "PIZ", "PXR24", "B44", "B44A", "DWAA", "DWAB"]
+TYPES = ["UINT", "HALF", "FLOAT"]
+AXES = [
+    ("direction", ["read", "write"]),
+    ("layout", ["scanline", "tiled", "multipart"]),
+    ("target", ["path", "file"]),
+    ("compression", COMPRESSIONS),
+    ("type", TYPES),
+    ("channels", [4]),
+    ("threads", [0]),
+]
 
-data = ".." * w * h
+def channelnames(n):
+    """ The channel names bench.cpp uses for n channels """
+    if n <= 4:
+        return list("RGBA"[:n])
+    return ["C%02d" % c for c in range(n)]
 
-for i in range(10):
+def pixels(k, w, h):
+    """ The pixels bench.cpp writes, as a dict of strings """
+    (y, x) = np.mgrid[:h, :w].astype(np.int64)
+    data = {}
+    for (c, name) in enumerate(channelnames(k['channels'])):
+        v = (x * 7 + y * 13 + c * 31) % 1024 + (x * x * 3 + y * y * 5 + x * y * 11 + c * 17) % 97
+        if k['type'] == "UINT":
+            data[name] = v.astype(np.uint32).tobytes()
+        else:
+            data[name] = (v / 1024.0).astype(np.float16 if k['type'] == "HALF" else np.float32).tobytes()
+    return data
+
+def headers(k, w, h):
     hdr = OpenEXR.Header(w, h)
-    chan = Imath.Channel(Imath.PixelType(OpenEXR.HALF))
-    hdr['channels'] = {'R' : chan, 'G' : chan, 'B' : chan, 'A' : chan}
-    x = OpenEXR.OutputFile("/dev/null", hdr)
-    x.writePixels({'R': data, 'G': data, 'B': data, 'A' : data})
+    hdr['compression'] = Imath.Compression(getattr(Imath.Compression, k['compression'] + "_COMPRESSION"))
+    chan = Imath.Channel(Imath.PixelType(getattr(Imath.PixelType, k['type'])))
+    hdr['channels'] = dict((name, chan) for name in channelnames(k['channels']))
+    if k['layout'] == "tiled":
+        hdr['tiles'] = Imath.TileDescription(64, 64, Imath.LevelMode(Imath.LevelMode.ONE_LEVEL))
+    if k['layout'] != "multipart":
+        return [hdr]
+    parts = []
+    for p in range(2):
+        part = dict(hdr)
+        part['name'] = b"part%d" % p
+        parts.append(part)
+    return parts
+
+def write(k, target, hdrs, data):
+    threads = k['threads']
+    if k['layout'] == "multipart":
+        x = OpenEXR.MultiPartOutputFile(target, hdrs, threads)
+        for p in range(len(hdrs)):
+            x.writePixels(p, data)
+    elif k['layout'] == "tiled":
+        x = OpenEXR.TiledOutputFile(target, hdrs[0], threads)
+        x.writeTiles(data)
+    else:
+        x = OpenEXR.OutputFile(target, hdrs[0], threads)
+        x.writePixels(data)
     x.close()
+
+def read(k, source):
+    names = channelnames(k['channels'])
+    threads = k['threads']
+    if k['layout'] == "multipart":
+        x = OpenEXR.MultiPartInputFile(source, threads)
+        for p in range(x.parts()):
+            x.channels(p, names)
+    elif k['layout'] == "tiled":
+        OpenEXR.TiledInputFile(source, threads).channels(names)
+    else:
+        OpenEXR.InputFile(source, threads).channels(names)
+
+def best(fn, repeat):
+    t = []
+    for i in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        t.append(time.perf_counter() - t0)
+    return min(t)
+
+class Native:
+    """ Runs cases through the bench program built from bench.cpp """
+
+    def __init__(self, path):
+        self.p = subprocess.Popen([path], stdin = subprocess.PIPE, stdout = subprocess.PIPE, universal_newlines = True)
+
+    def run(self, k, w, h, repeat, path):
+        line = "%s %s %s %d %d %d %d %d %d %d %s\n" % (
+            k['direction'], k['layout'], k['target'],
+            getattr(Imath.Compression, k['compression'] + "_COMPRESSION"),
+            getattr(Imath.PixelType, k['type']),
+            k['channels'], k['threads'], w, h, repeat, path)
+        self.p.stdin.write(line)
+        self.p.stdin.flush()
+        (t, size) = self.p.stdout.readline().split()
+        return (None if t == "error" else float(t), int(size))
+
+    def close(self):
+        self.p.stdin.close()
+        self.p.wait()
+
+def run(k, w, h, repeat, native, dir):
+    """ Times case k and returns its result record """
+    hdrs = headers(k, w, h)
+    data = pixels(k, w, h)
+    path = os.path.join(dir, "bench.exr")
+    OpenEXR.setGlobalThreadCount(k['threads'])
+
+    if k['direction'] == "write":
+        if k['target'] == "file":
+            def once():
+                f = io.BytesIO()
+                write(k, f, hdrs, data)
+                return len(f.getvalue())
+        else:
+            def once():
+                write(k, path, hdrs, data)
+                return os.path.getsize(path)
+        size = once()
+        t = best(once, repeat)
+    else:
+        write(k, path, hdrs, data)
+        size = os.path.getsize(path)
+        if k['target'] == "file":
+            with open(path, "rb") as f:
+                contents = f.read()
+            t = best(lambda: read(k, io.BytesIO(contents)), repeat)
+        else:
+            t = best(lambda: read(k, path), repeat)
+
+    r = dict(k)
+    r['python'] = t
+    r['bytes'] = size
+    r['mb_s'] = sum(len(v) for v in data.values()) * len(hdrs) / t / 1e6
+    if native is not None:
+        (r['native'], native_size) = native.run(k, w, h, repeat, path)
+        if r['native'] is not None:
+            r['ratio'] = t / r['native']
+        if native_size != size:
+            r['native_bytes'] = native_size
+    return r
+
+def key(r):
+    return tuple(r[a] for (a, _) in AXES)
+
+def report(r, baseline = None):
+    s = "%-5s %-9s %-4s %-5s %-5s %3d %2d %9.2f ms %8.1f MB/s" % (
+        r['direction'], r['layout'], r['target'], r['compression'], r['type'],
+        r['channels'], r['threads'], 1000 * r['python'], r['mb_s'])
+    if 'ratio' in r:
+        s += " %9.2f ms %6.2fx" % (1000 * r['native'], r['ratio'])
+    if baseline is not None:
+        s += "  was %.2f ms" % (1000 * baseline['python'])
+        if 'ratio' in r and 'ratio' in baseline:
+            s += " %.2fx" % baseline['ratio']
+    print(s)
+    sys.stdout.flush()
+
+def regressed(r, b, tolerance):
+    if r['python'] > b['python'] * (1 + tolerance):
+        return True
+    return 'ratio' in r and 'ratio' in b and r['ratio'] > b['ratio'] * (1 + tolerance)
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    for (axis, default) in AXES:
+        parser.add_argument("--" + axis, default = ",".join(str(v) for v in default))
+    parser.add_argument("--size", default = "640x480", help = "image size, WxH")
+    parser.add_argument("--repeat", type = int, default = 3, help = "runs per case; the best is reported")
+    parser.add_argument("--native", help = "bench program built from bench.cpp")
+    parser.add_argument("--json", help = "write the results to this file")
+    parser.add_argument("--check", help = "re-run the cases of this JSON file and report regressions")
+    parser.add_argument("--tolerance", type = float, default = 0.15, help = "allowed slowdown for --check")
+    args = parser.parse_args()
+
+    (w, h) = [int(v) for v in args.size.split("x")]
+    repeat = args.repeat
+    baseline = {}
+    if args.check:
+        with open(args.check) as f:
+            old = json.load(f)
+        (w, h) = (old['width'], old['height'])
+        repeat = old['repeat']
+        cases = [dict((a, r[a]) for (a, _) in AXES) for r in old['results']]
+        baseline = dict((key(r), r) for r in old['results'])
+    else:
+        grid = [{}]
+        for (axis, _) in AXES:
+            values = getattr(args, axis).split(",")
+            if axis == "compression" and values == ["all"]:
+                values = COMPRESSIONS
+            values = [int(v) if axis in ("channels", "threads") else v.upper() if axis in ("compression", "type") else v
+                      for v in values]
+            grid = [dict(k, **{axis: v}) for k in grid for v in values]
+        cases = grid
+        for k in cases:
+            k['compression'] = k['compression'].replace("_COMPRESSION", "")
+            if k['compression'] not in COMPRESSIONS or k['type'] not in TYPES:
+                parser.error("unknown compression or type in %r" % k)
+
+    native = Native(args.native) if args.native else None
+    dir = tempfile.mkdtemp()
+    results = []
+    failures = []
+    try:
+        for k in cases:
+            r = run(k, w, h, repeat, native, dir)
+            results.append(r)
+            b = baseline.get(key(r))
+            report(r, b)
+            if b is not None and regressed(r, b, args.tolerance):
+                failures.append(r)
+    finally:
+        shutil.rmtree(dir)
+        if native is not None:
+            native.close()
+
+    if args.json:
+        with open(args.json, "w") as f:
+            version = OpenEXR.__version__
+            json.dump({'version': version.decode() if isinstance(version, bytes) else version,
+                       'openexr': "%x" % OpenEXR.OPENEXR_VERSION_HEX,
+                       'python': platform.python_version(),
+                       'machine': platform.machine(),
+                       'width': w, 'height': h, 'repeat': repeat,
+                       'results': results}, f, indent = 1)
+    if args.check:
+        print("%d of %d cases regressed by more than %d%%" % (len(failures), len(results), 100 * args.tolerance))
+        for r in failures:
+            report(r, baseline[key(r)])
+        sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
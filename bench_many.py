@@ -0,0 +1,48 @@
+import os
+import shutil
+import tempfile
+import time
+import OpenEXR
+import Imath
+
+# Compares decoding an image sequence with a Python loop over InputFile,
+# the same loop with the library's own threads, and read_many.  The
+# frames are small ZIPS files, where threads within a frame do little.
+
+(w, h) = (640, 360)
+frames = 200
+threads = 8
+
+dir = tempfile.mkdtemp()
+hdr = OpenEXR.Header(w, h)
+hdr['compression'] = Imath.Compression(Imath.Compression.ZIPS_COMPRESSION)
+chan = Imath.Channel(Imath.PixelType(OpenEXR.HALF))
+hdr['channels'] = {'R' : chan, 'G' : chan, 'B' : chan}
+data = bytes(bytearray(range(256))) * (2 * w * h // 256)
+paths = []
+for i in range(frames):
+    paths.append(os.path.join(dir, "frame.%04d.exr" % i))
+    x = OpenEXR.OutputFile(paths[-1], hdr)
+    x.writePixels({'R': data, 'G': data, 'B': data})
+    x.close()
+
+def bench(name, read):
+    t0 = time.time()
+    read()
+    t = (time.time() - t0) / frames
+    print("%-24s %8.2f ms/frame" % (name, 1000 * t))
+    return t
+
+def loop():
+    for p in paths:
+        OpenEXR.InputFile(p).channels("RGB")
+
+OpenEXR.setGlobalThreadCount(0)
+serial = bench("serial loop", loop)
+OpenEXR.setGlobalThreadCount(threads)
+bench("setGlobalThreadCount(%d)" % threads, loop)
+OpenEXR.setGlobalThreadCount(0)
+many = bench("read_many(threads=%d)" % threads, lambda: list(OpenEXR.read_many(paths, "RGB", threads = threads)))
+print("speedup %.2fx" % (serial / many))
+
+shutil.rmtree(dir)
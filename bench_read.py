@@ -0,0 +1,30 @@
+import time
+import OpenEXR
+
+# Compares reading GoldenGate.exr through a memory-mapped stream (a
+# filename, or a file object with fileno()) against the Python stream
+# path used for file-like objects that only have read/seek/tell.
+
+class Stream:
+    def __init__(self, f):
+        self.f = f
+    def read(self, n):
+        return self.f.read(n)
+    def seek(self, pos):
+        return self.f.seek(pos)
+    def tell(self):
+        return self.f.tell()
+
+def bench(name, wrap, n = 20):
+    t0 = time.time()
+    for i in range(n):
+        with open("GoldenGate.exr", "rb") as f:
+            OpenEXR.InputFile(wrap(f)).channels("RGB")
+    t = (time.time() - t0) / n
+    print("%-24s %8.2f ms" % (name, 1000 * t))
+    return t
+
+mapped = bench("path (mmap)", lambda f: "GoldenGate.exr")
+bench("file object (mmap)", lambda f: f)
+stream = bench("Python stream", Stream)
+print("speedup %.2fx" % (stream / mapped))
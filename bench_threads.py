@@ -0,0 +1,53 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import OpenEXR
+import Imath
+
+# Compares reading N files one after another with reading them from N
+# Python threads.  Decoding runs with the GIL released, so the speedup
+# should be close to N on an otherwise idle machine.
+
+n = min(4, os.cpu_count() or 1)
+reads = 4
+cl = ['R', 'G', 'B']
+
+golden = OpenEXR.InputFile("GoldenGate.exr")
+dw = golden.header()['dataWindow']
+pixels = dict(zip(cl, golden.channels(cl)))
+dir = tempfile.mkdtemp()
+paths = []
+for i in range(n):
+    paths.append(os.path.join(dir, "threaded%d.exr" % i))
+    h = OpenEXR.Header(dw.max.x + 1, dw.max.y + 1)
+    h['channels'] = dict([(c, Imath.Channel(Imath.PixelType(OpenEXR.HALF))) for c in cl])
+    h['compression'] = Imath.Compression(Imath.Compression.PIZ_COMPRESSION)
+    x = OpenEXR.OutputFile(paths[-1], h)
+    x.writePixels(pixels)
+    x.close()
+
+def read(path):
+    for _ in range(reads):
+        OpenEXR.InputFile(path, 0).channels(cl)
+
+def bench(name, run):
+    t0 = time.time()
+    run()
+    t = time.time() - t0
+    print("%-24s %8.2f ms" % (name, 1000 * t))
+    return t
+
+def threaded():
+    threads = [threading.Thread(target=read, args=(p,)) for p in paths]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+serial = bench("serial", lambda: [read(p) for p in paths])
+parallel = bench("%d threads" % n, threaded)
+print("speedup %.2fx with %d threads" % (serial / parallel, n))
+
+shutil.rmtree(dir)
@@ -0,0 +1,5 @@
+import OpenEXR
+
+# Changing metadata copies the compressed pixels unchanged, without
+# decoding and re-encoding them.
+OpenEXR.copy("GoldenGate.exr", "modified.exr", {'comments': b"A picture of some delicious pie"})
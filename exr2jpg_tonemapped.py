@@ -0,0 +1,18 @@
+import OpenEXR
+import Image
+import sys
+
+def main(exrfile, jpgfile):
+    file = OpenEXR.InputFile(exrfile)
+    dw = file.header()['dataWindow']
+    size = (dw.max.x - dw.min.x + 1, dw.max.y - dw.min.y + 1)
+
+    # Scales the darkest to lightest samples of all three channels to
+    # 0..255, as one native pass with no float pixels in Python.
+    rgb8 = file.channels_tonemapped("RGB", transfer = "linear", autorange = True)
+    Image.frombytes("RGB", size, rgb8).save(jpgfile)
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print "usage: exr2jpg_tonemapped <exrfile> <jpgfile>"
+    main(sys.argv[1], sys.argv[2])
@@ -264,6 +264,99 @@ class TestDirected(unittest.TestCase):
         r = self.load_red("out3.exr")
         self.assertTrue(r == data)
 
+    def test_write_interleaved(self):
+        oexr = OpenEXR.InputFile("GoldenGate.exr")
+        hdr = oexr.header()
+        del hdr['tiles']
+        rgb = oexr.channels_interleaved("RGB", numpy=True)
+        x = OpenEXR.OutputFile("out-interleaved.exr", hdr)
+        x.writePixels(rgb[:100], 100, cnames="RGB")
+        x.writePixels(rgb[100:].tobytes(), 760, "RGB")
+        x.close()
+        self.assertEqual(OpenEXR.InputFile("out-interleaved.exr").channels("RGB"), oexr.channels("RGB"))
+
+        x = OpenEXR.OutputFile("out-interleaved.exr", hdr)
+        self.assertRaises(TypeError, lambda: x.writePixels(rgb[:10], 100, "RGB"))
+        self.assertRaises(TypeError, lambda: x.writePixels(rgb, cnames="RGZ"))
+        self.assertRaises(TypeError, lambda: x.writePixels(rgb))
+
+        if hasattr(OpenEXR, 'MultiPartOutputFile'):
+            hdr['name'] = b'rgb'
+            out = OpenEXR.MultiPartOutputFile("out-interleaved-multipart.exr", [hdr])
+            out.writePixels(0, rgb, cnames="BGR"[::-1])
+            out.close()
+            mp = OpenEXR.MultiPartInputFile("out-interleaved-multipart.exr")
+            self.assertEqual(mp.channel(0, 'G'), oexr.channel('G'))
+
+    def test_write_strided(self):
+        hdr = OpenEXR.Header(64, 32)
+        big = np.random.rand(100, 80, 4).astype(np.float32)
+        r = big[10:42, 5:69, 0]
+        g = big[41:9:-1, 5:69, 1]
+        b = np.asfortranarray(big[10:42, 5:69, 2])
+        x = OpenEXR.OutputFile("out-strided.exr", hdr)
+        x.writePixels({'R': r, 'G': g, 'B': b})
+        x.close()
+        oexr = OpenEXR.InputFile("out-strided.exr")
+        for (c, a) in zip("RGB", (r, g, b)):
+            self.assertEqual(oexr.channel(c), a.tobytes())
+
+        x = OpenEXR.OutputFile("out-strided.exr", hdr)
+        x.writePixels(big[42:10:-1, 5:69, 2::-1], cnames="BGR")
+        x.close()
+        rgb = OpenEXR.InputFile("out-strided.exr").channels_interleaved("RGB", numpy=True)
+        self.assertTrue(np.array_equal(rgb, big[42:10:-1, 5:69, :3]))
+
+        x = OpenEXR.OutputFile("out-strided.exr", hdr)
+        self.assertRaises(TypeError, lambda: x.writePixels({'R': big[10:42, 5:70, 0]}))
+        self.assertRaises(TypeError, lambda: x.writePixels({'R': big[10:42, 5:69, 0].astype(np.float16)}))
+
+    def test_write_rows(self):
+        (w, h) = (64, 100)
+        hdr = OpenEXR.Header(w, h)
+        img = np.random.rand(h, w, 3).astype(np.float32)
+        expected = [np.ascontiguousarray(img[:, :, i]).tobytes() for i in range(3)]
+
+        # A ring of 16 rows, refilled before each bucket is written
+        ring = np.zeros((16, w, 3), dtype=np.float32)
+        x = OpenEXR.OutputFile("out-rows.exr", hdr)
+        x.bind(ring, 16, cnames="RGB")
+        for y in range(0, h, 4):
+            ring[y % 16:y % 16 + 4] = img[y:y + 4]
+            x.writeRows(4)
+        x.close()
+        self.assertEqual(OpenEXR.InputFile("out-rows.exr").channels("RGB"), expected)
+
+        # Whole planes, mixed with writePixels
+        planes = dict((c, img[:, :, i]) for (i, c) in enumerate("RGB"))
+        x = OpenEXR.OutputFile("out-rows.exr", hdr)
+        x.bind(planes)
+        x.writeRows(30)
+        x.writePixels(dict((c, p[30:50]) for (c, p) in planes.items()), 20)
+        x.writeRows()
+        self.assertEqual(x.currentScanLine(), h)
+        self.assertRaises(TypeError, lambda: x.writeRows(1))
+        x.unbind()
+        self.assertRaises(TypeError, lambda: x.writeRows(1))
+        self.assertRaises(TypeError, lambda: x.bind(planes, -1))
+        x.close()
+        self.assertEqual(OpenEXR.InputFile("out-rows.exr").channels("RGB"), expected)
+
+        x = OpenEXR.OutputFile("out-rows.exr", hdr)
+        x.bind(ring, 16, "RGB")
+        x.writeRows(10)
+        self.assertRaises(TypeError, lambda: x.writeRows(10))
+
+        if hasattr(OpenEXR, 'MultiPartOutputFile'):
+            hdr['name'] = b'rgb'
+            out = OpenEXR.MultiPartOutputFile("out-rows-multipart.exr", [hdr])
+            out.bind(0, img, cnames="RGB")
+            out.writeRows(0, 50)
+            out.writeRows(0)
+            out.close()
+            mp = OpenEXR.MultiPartInputFile("out-rows-multipart.exr")
+            self.assertEqual(mp.channels(0, "RGB"), expected)
+
     def test_compression(self):
         infile = OpenEXR.InputFile("GoldenGate.exr")
         h = infile.header()
@@ -291,6 +384,602 @@ class TestDirected(unittest.TestCase):
             actual = OpenEXR.InputFile("out.exr").header()['compression']
             self.assertEqual(actual, Imath.Compression(c))
 
+    def test_threaded_read(self):
+        """ N threads reading N files, with the GIL released while decoding,
+        get the same pixels as reading them one after another.  See
+        bench_threads.py for the speedup.
+        """
+        import os
+        import threading
+
+        n = max(2, min(4, os.cpu_count() or 1))
+        cl = ['R', 'G', 'B']
+        golden = OpenEXR.InputFile("GoldenGate.exr")
+        dw = golden.header()['dataWindow']
+        expected = golden.channels(cl)
+        paths = []
+        for i in range(n):
+            paths.append("threaded%d.exr" % i)
+            h = OpenEXR.Header(dw.max.x + 1, dw.max.y + 1)
+            h['channels'] = dict([(c, Imath.Channel(self.HALF)) for c in cl])
+            h['compression'] = Imath.Compression(Imath.Compression.PIZ_COMPRESSION)
+            x = OpenEXR.OutputFile(paths[-1], h)
+            x.writePixels(dict(zip(cl, expected)))
+            x.close()
+
+        def read(path, results, i):
+            for _ in range(4):
+                results[i] = OpenEXR.InputFile(path, 0).channels(cl)
+
+        results = [None] * n
+        threads = [threading.Thread(target=read, args=(path, results, i)) for i, path in enumerate(paths)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        for r in results:
+            self.assertEqual(r, expected)
+
+        # File-like objects take the GIL back only inside their callbacks
+        def read_fileobject(path, results, i):
+            with open(path, "rb") as f:
+                results[i] = OpenEXR.InputFile(f).channels(cl)
+        results = [None] * n
+        threads = [threading.Thread(target=read_fileobject, args=(path, results, i)) for i, path in enumerate(paths)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        for r in results:
+            self.assertEqual(r, expected)
+
+    def test_close_while_reading(self):
+        """ Reads waiting for a file that another thread closes raise OSError """
+        import threading
+        for Reader in (OpenEXR.InputFile, OpenEXR.TiledInputFile):
+            f = Reader("GoldenGate.exr")
+            expected = f.channels("RGB")
+            outcomes = []
+            def read():
+                try:
+                    outcomes.append(f.channels("RGB") == expected)
+                except OSError:
+                    outcomes.append(None)
+            threads = [threading.Thread(target=read) for i in range(4)]
+            for t in threads:
+                t.start()
+            f.close()
+            for t in threads:
+                t.join()
+            self.assertEqual(len(outcomes), 4)
+            self.assertTrue(all(o in (True, None) for o in outcomes))
+            self.assertRaises(OSError, lambda: f.channels("RGB"))
+
+    def test_channel_into(self):
+        """ Reads into caller buffers match the allocating reads """
+        oexr = OpenEXR.InputFile("GoldenGate.exr")
+        dw = oexr.header()['dataWindow']
+        (w, h) = (dw.max.x - dw.min.x + 1, dw.max.y - dw.min.y + 1)
+
+        buf = bytearray(2 * w * h)
+        self.assertTrue(oexr.channel_into('R', buf) is buf)
+        self.assertEqual(bytes(buf), oexr.channel('R'))
+
+        bufs = [np.zeros((h, w), dtype=np.float32) for c in "RGB"]
+        oexr.channels_into("RGB", bufs, self.FLOAT)
+        for c, b in zip("RGB", bufs):
+            self.assertEqual(b.tobytes(), oexr.channel(c, self.FLOAT))
+
+        # Strided views, such as one channel of an interleaved array
+        rgb = np.zeros((h, w, 3), dtype=np.float16)
+        oexr.channels_into("RGB", [rgb[:, :, 0], rgb[:, :, 1], rgb[:, :, 2]])
+        for i, c in enumerate("RGB"):
+            self.assertEqual(rgb[:, :, i].tobytes(), oexr.channel(c))
+
+        rows = bytearray(2 * w * 10)
+        oexr.channel_into('G', rows, scanLine1=100, scanLine2=109)
+        self.assertEqual(bytes(rows), oexr.channel('G', scanLine1=100, scanLine2=109))
+
+        self.assertRaises(TypeError, lambda: oexr.channel_into('R', bytearray(10)))
+        self.assertRaises(TypeError, lambda: oexr.channel_into('R', bytes(2 * w * h)))
+        self.assertRaises(TypeError, lambda: oexr.channels_into("RGB", [buf]))
+
+        texr = OpenEXR.TiledInputFile("GoldenGate.exr")
+        tile = bytearray(len(texr.channel('R', tilex_min=2, tilex_max=5, tiley_min=0, tiley_max=3)))
+        texr.channel_into('R', tile, tilex_min=2, tilex_max=5, tiley_min=0, tiley_max=3)
+        self.assertEqual(bytes(tile), texr.channel('R', tilex_min=2, tilex_max=5, tiley_min=0, tiley_max=3))
+
+        if hasattr(OpenEXR, 'MultiPartInputFile'):
+            mp = OpenEXR.MultiPartInputFile("Beachball_Multipart.exr")
+            for ch in mp.header(0)['channels'].keys():
+                expected = mp.channel(0, ch)
+                buf = bytearray(len(expected))
+                mp.channel_into(0, ch, buf)
+                self.assertEqual(bytes(buf), expected)
+            self.assertRaises(IndexError, lambda: mp.channel_into(mp.parts(), ch, buf))
+
+    def test_channels_interleaved(self):
+        """ Interleaved reads hold the same samples as separate channels """
+        oexr = OpenEXR.InputFile("GoldenGate.exr")
+        dw = oexr.header()['dataWindow']
+        (w, h) = (dw.max.x - dw.min.x + 1, dw.max.y - dw.min.y + 1)
+
+        planes = [np.frombuffer(p, dtype=np.float16).reshape(h, w) for p in oexr.channels("BGR")]
+        bgr = np.frombuffer(oexr.channels_interleaved("BGR"), dtype=np.float16).reshape(h, w, 3)
+        for i in range(3):
+            self.assertTrue(np.array_equal(bgr[:, :, i], planes[i]))
+
+        # Into a caller buffer, with conversion and a scanline range
+        buf = np.zeros((10, w, 2), dtype=np.float32)
+        self.assertTrue(oexr.channels_interleaved("RG", self.FLOAT, 100, 109, buffer=buf) is buf)
+        self.assertEqual(buf[:, :, 1].tobytes(), oexr.channel('G', self.FLOAT, 100, 109))
+
+        # Strided: fill the first three channels of an RGBA array
+        rgba = np.ones((h, w, 4), dtype=np.float16)
+        oexr.channels_interleaved("RGB", buffer=rgba[:, :, :3])
+        self.assertTrue(np.array_equal(rgba[:, :, 2], planes[0]))
+        self.assertTrue((rgba[:, :, 3] == 1).all())
+
+        self.assertRaises(TypeError, lambda: oexr.channels_interleaved([]))
+        self.assertRaises(TypeError, lambda: oexr.channels_interleaved("RGZ"))
+        self.assertRaises(TypeError, lambda: oexr.channels_interleaved("RGB", buffer=bytearray(10)))
+
+        texr = OpenEXR.TiledInputFile("GoldenGate.exr")
+        tiles = dict(tilex_min=2, tilex_max=5, tiley_min=0, tiley_max=3)
+        rgb = np.frombuffer(texr.channels_interleaved("RGB", **tiles), dtype=np.float16)
+        self.assertEqual(rgb[1::3].tobytes(), texr.channel('G', **tiles))
+
+        if hasattr(OpenEXR, 'MultiPartInputFile'):
+            mp = OpenEXR.MultiPartInputFile("Beachball_Multipart.exr")
+            chans = sorted(mp.header(0)['channels'].keys())[:2]
+            both = np.frombuffer(mp.channels_interleaved(0, chans), dtype=np.float16)
+            self.assertEqual(both[0::2].tobytes(), mp.channel(0, chans[0]))
+
+    def test_tonemapped(self):
+        oexr = OpenEXR.InputFile("GoldenGate.exr")
+        h = oexr.channels_interleaved("RGB", numpy=True).astype(np.float32)
+        srgb = np.where(h <= 0.0031308, 12.92 * h, 1.055 * np.power(np.maximum(h, 0), 1 / 2.4) - 0.055)
+        expected = (np.clip(srgb, 0, 1) * 255 + 0.5).astype(np.uint8)
+        rgb = oexr.channels_tonemapped("RGB", numpy=True)
+        self.assertEqual(rgb.dtype, np.uint8)
+        self.assertTrue(np.array_equal(rgb, expected))
+        self.assertEqual(oexr.channels_tonemapped("RGB"), expected.tobytes())
+
+        g = oexr.channels_tonemapped("G", bits=16, transfer="linear", autorange=True, numpy=True)
+        self.assertEqual((g.dtype, g.min(), g.max()), (np.uint16, 0, 65535))
+        g = oexr.channels_tonemapped("G", exposure=1, transfer=2.0, scanLine1=10, scanLine2=19, numpy=True)
+        expected = np.clip(2 * h[10:20, :, 1:2], 0, 1) ** 0.5
+        self.assertTrue(np.abs(g / 255.0 - expected).max() < 0.003)
+
+        # FLOAT channels keep their precision beyond the range of HALF
+        hdr = OpenEXR.Header(256, 2)
+        hdr['channels'] = {'Y': Imath.Channel(self.FLOAT)}
+        ramp = np.vstack([np.linspace(0, 1e6, 256), np.linspace(1000, 1010, 256)]).astype(np.float32)
+        out = OpenEXR.OutputFile("out-tonemapped.exr", hdr)
+        out.writePixels({'Y': ramp.tobytes()})
+        out.close()
+        x = OpenEXR.InputFile("out-tonemapped.exr")
+        y = x.channels_tonemapped("Y", transfer="linear", autorange=True, scanLine1=0, scanLine2=0, numpy=True)
+        self.assertTrue(np.array_equal(y[0, :, 0], (ramp[0] / 1e6 * 255 + 0.5).astype(np.uint8)))
+        y = x.channels_tonemapped("Y", bits=16, autorange=True, scanLine1=1, scanLine2=1, numpy=True)
+        self.assertEqual(len(np.unique(y)), 256)
+
+        self.assertRaises(TypeError, lambda: oexr.channels_tonemapped("RGB", bits=12))
+        self.assertRaises(TypeError, lambda: oexr.channels_tonemapped("RGB", transfer="log"))
+        self.assertRaises(TypeError, lambda: oexr.channels_tonemapped("RGZ"))
+
+    def test_thumbnail(self):
+        oexr = OpenEXR.InputFile("GoldenGate.exr")
+        full = oexr.channels_interleaved("RGB", self.FLOAT, numpy=True)
+        half = oexr.thumbnail("RGB", 631, numpy=True)
+        self.assertEqual(half.shape, (430, 631, 3))
+        self.assertTrue(np.allclose(half, full.reshape(430, 2, 631, 2, 3).mean(axis=(1, 3))))
+        for filter in ("box", "lanczos"):
+            t = oexr.thumbnail("GR", 256, filter=filter, numpy=True)
+            self.assertEqual(t.shape, (174, 256, 2))
+            self.assertTrue(np.allclose(t[:, :, 1].mean(), full[:, :, 0].mean(), rtol=0.01))
+        self.assertEqual(len(oexr.thumbnail("R", 64)), 64 * 44 * 4)
+        self.assertRaises(TypeError, lambda: oexr.thumbnail("R", 64, filter="cubic"))
+        self.assertRaises(TypeError, lambda: oexr.thumbnail("Z", 64))
+
+        hdr = oexr.header()
+        del hdr['preview']
+        out = OpenEXR.OutputFile("out-preview.exr", hdr, preview=100)
+        planes = oexr.channels("RGB")
+        out.writePixels(dict((c, p[:500 * 1262 * 2]) for (c, p) in zip("RGB", planes)), 500)
+        out.writePixels(dict((c, p[500 * 1262 * 2:]) for (c, p) in zip("RGB", planes)), 360)
+        out.close()
+        preview = OpenEXR.InputFile("out-preview.exr").header()['preview']
+        self.assertEqual((preview.width, preview.height), (100, 68))
+        rgba = np.frombuffer(preview.pixels, dtype=np.uint8).reshape(68, 100, 4)
+        self.assertTrue((rgba[:, :, 3] == 255).all())
+        self.assertTrue(rgba[:, :, 2].mean() > rgba[:, :, 0].mean())
+
+    def test_numpy(self):
+        """ numpy=True returns typed, shaped arrays of the same samples """
+        oexr = OpenEXR.InputFile("GoldenGate.exr")
+        dw = oexr.header()['dataWindow']
+        (w, h) = (dw.max.x - dw.min.x + 1, dw.max.y - dw.min.y + 1)
+
+        r = oexr.channel('R', numpy=True)
+        self.assertEqual((r.dtype, r.shape), (np.float16, (h, w)))
+        self.assertEqual(r.tobytes(), oexr.channel('R'))
+
+        for pt, dtype in ((self.FLOAT, np.float32), (Imath.PixelType(Imath.PixelType.UINT), np.uint32)):
+            (g, b) = oexr.channels("GB", pt, 10, 19, numpy=True)
+            self.assertEqual((b.dtype, b.shape), (dtype, (10, w)))
+            self.assertEqual(b.tobytes(), oexr.channel('B', pt, 10, 19))
+
+        rgb = oexr.channels_interleaved("RGB", numpy=True)
+        self.assertEqual(rgb.shape, (h, w, 3))
+        self.assertTrue(np.array_equal(rgb[:, :, 0], r))
+
+        self.assertRaises(TypeError, lambda: oexr.channel('R', scanLine1=10, scanLine2=9, numpy=True))
+
+        texr = OpenEXR.TiledInputFile("GoldenGate.exr")
+        tiles = dict(tilex_min=2, tilex_max=5, tiley_min=0, tiley_max=3)
+        t = texr.channel('R', numpy=True, **tiles)
+        self.assertEqual(t.shape, (512, 512))
+        self.assertEqual(t.tobytes(), texr.channel('R', **tiles))
+        self.assertEqual(texr.channels("RG", numpy=True)[1].shape, (h, w))
+
+        if hasattr(OpenEXR, 'MultiPartInputFile'):
+            mp = OpenEXR.MultiPartInputFile("Beachball_Multipart.exr")
+            ch = list(mp.header(0)['channels'].keys())[0]
+            a = mp.channel(0, ch, numpy=True)
+            self.assertEqual(a.tobytes(), mp.channel(0, ch))
+
+    def test_mmap_input(self):
+        """ Mapped paths and file objects read the same as Python streams """
+        with open("GoldenGate.exr", "rb") as f:
+            data = f.read()
+        expected = OpenEXR.InputFile(StringIO(data)).channels("RGB")
+
+        self.assertEqual(OpenEXR.InputFile("GoldenGate.exr").channels("RGB"), expected)
+        with open("GoldenGate.exr", "rb") as f:
+            self.assertEqual(OpenEXR.InputFile(f).channels("RGB"), expected)
+            f.seek(0)
+            self.assertEqual(OpenEXR.TiledInputFile(f).channels("RGB"), OpenEXR.TiledInputFile(StringIO(data)).channels("RGB"))
+
+        # Wrappers with the fileno() of a different file are read through
+        # their read method
+        import gzip
+        with gzip.open("GoldenGate.exr.gz", "wb") as f:
+            f.write(data)
+        with gzip.open("GoldenGate.exr.gz", "rb") as f:
+            self.assertEqual(OpenEXR.InputFile(f).channels("RGB"), expected)
+
+        if hasattr(OpenEXR, 'MultiPartInputFile'):
+            mp = OpenEXR.MultiPartInputFile("Beachball_Multipart.exr")
+            with open("Beachball_Multipart.exr", "rb") as f:
+                ch = list(mp.header(1)['channels'].keys())[0]
+                self.assertEqual(mp.channel(1, ch), OpenEXR.MultiPartInputFile(StringIO(f.read())).channel(1, ch))
+
+        # A truncated file is still reported as an error
+        with open("truncated.exr", "wb") as f:
+            f.write(data[:len(data) // 2])
+        with open("truncated.exr", "rb") as f:
+            self.assertRaises(OSError, lambda: OpenEXR.InputFile(f).channels("RGB"))
+        self.assertRaises(OSError, lambda: OpenEXR.InputFile("nonexistent.exr"))
+
+    def test_buffered_istream(self):
+        """ Python file objects are read in large blocks """
+        class Counting(object):
+            def __init__(self, data):
+                self.f = StringIO(data)
+                self.calls = 0
+            def read(self, n):
+                self.calls += 1
+                return self.f.read(n)
+            def seek(self, pos):
+                self.calls += 1
+                return self.f.seek(pos)
+            def tell(self):
+                self.calls += 1
+                return self.f.tell()
+        class CountingInto(Counting):
+            def readinto(self, b):
+                self.calls += 1
+                return self.f.readinto(b)
+
+        with open("GoldenGate.exr", "rb") as f:
+            data = f.read()
+        expected = OpenEXR.InputFile("GoldenGate.exr").channels("RGB")
+        expected_tiled = OpenEXR.TiledInputFile("GoldenGate.exr").channels("RGB")
+
+        size = OpenEXR.streamBufferSize()
+        calls = {}
+        try:
+            for n in (0, 1 << 20):
+                OpenEXR.setStreamBufferSize(n)
+                for cls in (Counting, CountingInto):
+                    f = cls(data)
+                    self.assertEqual(OpenEXR.InputFile(f).channels("RGB"), expected)
+                    self.assertEqual(OpenEXR.TiledInputFile(cls(data)).channels("RGB"), expected_tiled)
+                    calls[(n, cls)] = f.calls
+        finally:
+            OpenEXR.setStreamBufferSize(size)
+        for cls in (Counting, CountingInto):
+            self.assertTrue(calls[(1 << 20, cls)] * 100 < calls[(0, cls)])
+        self.assertRaises(TypeError, lambda: OpenEXR.setStreamBufferSize(-1))
+
+    def test_buffered_ostream(self):
+        """ Writes to Python file objects are coalesced into blocks """
+        oexr = OpenEXR.InputFile("GoldenGate.exr")
+        dw = oexr.header()['dataWindow']
+        hdr = OpenEXR.Header(dw.max.x - dw.min.x + 1, dw.max.y - dw.min.y + 1)
+        hdr['channels'] = oexr.header()['channels']
+        hdr['compression'] = Imath.Compression(Imath.Compression.NO_COMPRESSION)
+        pixels = dict(zip("RGB", oexr.channels("RGB")))
+
+        x = OpenEXR.OutputFile("buffered.exr", hdr)
+        x.writePixels(pixels)
+        x.close()
+        self.assertEqual(x.callbackCount(), 0)
+        with open("buffered.exr", "rb") as f:
+            expected = f.read()
+
+        size = OpenEXR.streamBufferSize()
+        calls = []
+        try:
+            for n in (0, 1 << 20):
+                OpenEXR.setStreamBufferSize(n)
+                f = StringIO()
+                x = OpenEXR.OutputFile(f, hdr)
+                x.writePixels(pixels)
+                x.close()
+                self.assertEqual(f.getvalue(), expected)
+                calls.append(x.callbackCount())
+        finally:
+            OpenEXR.setStreamBufferSize(size)
+        self.assertTrue(calls[1] * 100 < calls[0])
+
+        if hasattr(OpenEXR, 'MultiPartOutputFile'):
+            hdr['name'] = b'part'
+            f = StringIO()
+            x = OpenEXR.MultiPartOutputFile(f, [hdr])
+            x.writePixels(0, pixels)
+            x.close()
+            self.assertTrue(x.callbackCount() < 2 * len(f.getvalue()) // size + 10)
+            self.assertEqual(OpenEXR.MultiPartInputFile(StringIO(f.getvalue())).channel(0, 'G'), pixels['G'])
+
+    def test_tiled_out(self):
+        """ Tiles written one at a time or in ranges read back the same """
+        oexr = OpenEXR.InputFile("GoldenGate.exr")
+        hdr = oexr.header()
+        dw = hdr['dataWindow']
+        (w, h) = (dw.max.x - dw.min.x + 1, dw.max.y - dw.min.y + 1)
+        planes = dict((c, oexr.channel(c, numpy=True)) for c in "RGB")
+        self.assertEqual(hdr['tiles'].xSize, 128)
+
+        def tile(dx, dy, nx=1, ny=1):
+            return dict((c, p[128 * dy:128 * (dy + ny), 128 * dx:128 * (dx + nx)].tobytes()) for (c, p) in planes.items())
+
+        x = OpenEXR.TiledOutputFile("tiled0.exr", hdr)
+        (nx, ny) = (x.numXTiles(), x.numYTiles())
+        self.assertEqual((nx, ny), ((w + 127) // 128, (h + 127) // 128))
+        for dy in range(ny):
+            for dx in range(nx):
+                x.writeTile(tile(dx, dy), dx, dy)
+        x.close()
+
+        f = StringIO()
+        x = OpenEXR.TiledOutputFile(f, hdr, 4)
+        x.writeTiles(tile(0, 0, nx, 3), tiley_max=2)
+        x.writeTiles(tile(0, 3, nx, ny - 3), tiley_min=3, tiley_max=ny - 1)
+        x.close()
+
+        expected = OpenEXR.TiledInputFile("GoldenGate.exr").channels("RGB")
+        self.assertEqual(OpenEXR.TiledInputFile("tiled0.exr").channels("RGB"), expected)
+        self.assertEqual(OpenEXR.TiledInputFile(StringIO(f.getvalue())).channels("RGB"), expected)
+
+        x = OpenEXR.TiledOutputFile("tiled1.exr", hdr)
+        self.assertRaises(TypeError, lambda: x.writeTile(tile(0, 0), nx, 0))
+        self.assertRaises(TypeError, lambda: x.writeTile(tile(0, 0), 0, 0, 1))
+        self.assertRaises(TypeError, lambda: x.writeTile(tile(0, 0, 2), 0, 0))
+        x.close()
+        self.assertRaises(OSError, lambda: x.writeTile(tile(0, 0), 0, 0))
+        self.assertRaises(OSError, lambda: OpenEXR.TiledOutputFile("tiled1.exr", OpenEXR.Header(64, 64)))
+
+    def test_levels(self):
+        """ Lower levels are generated on write and can be read individually """
+        (w, h) = (128, 64)
+        plane = np.arange(w * h, dtype=np.float32).reshape(h, w)
+        for (mode, levels) in ((Imath.LevelMode.MIPMAP_LEVELS, [(0, 0), (1, 1), (7, 7)]),
+                               (Imath.LevelMode.RIPMAP_LEVELS, [(0, 0), (3, 1), (7, 0), (0, 6)])):
+            hdr = OpenEXR.Header(w, h)
+            hdr['channels'] = {'Y' : Imath.Channel(self.FLOAT)}
+            hdr['tiles'] = Imath.TileDescription(16, 16, Imath.LevelMode(mode))
+            x = OpenEXR.TiledOutputFile("levels.exr", hdr)
+            x.writeTiles({'Y' : plane.tobytes()})
+            x.close()
+
+            t = OpenEXR.TiledInputFile("levels.exr")
+            self.assertEqual((t.numXLevels(), t.numYLevels()), (8, 7) if mode == Imath.LevelMode.RIPMAP_LEVELS else (8, 8))
+            for (lx, ly) in levels:
+                (lw, lh) = (t.levelWidth(lx), t.levelHeight(ly))
+                self.assertEqual((lw, lh), (max(1, w >> lx), max(1, h >> ly)))
+                y = t.channel('Y', numpy=True, lx=lx, ly=ly)
+                self.assertEqual(y.shape, (lh, lw))
+                (fx, fy) = (w // lw, h // lh)
+                expected = plane[:lh * fy, :lw * fx].reshape(lh, fy, lw, fx).mean(axis=(1, 3))
+                self.assertTrue(np.allclose(y, expected))
+            self.assertEqual(t.channels('Y', lx=2)[0], t.channel('Y', lx=2, ly=2))
+            self.assertRaises(TypeError, lambda: t.channel('Y', lx=8))
+        self.assertRaises(OSError, lambda: t.numLevels())
+
+    def test_window(self):
+        """ Window reads return exactly the pixels of the window """
+        def box(x0, y0, x1, y1):
+            return Imath.Box2i(Imath.V2i(x0, y0), Imath.V2i(x1, y1))
+
+        (w, h) = (700, 600)
+        plane = np.random.random((h, w)).astype(np.float32)
+        hdr = OpenEXR.Header(w, h)
+        hdr['channels'] = {'Y' : Imath.Channel(self.FLOAT), 'Z' : Imath.Channel(self.FLOAT)}
+        hdr['compression'] = Imath.Compression(Imath.Compression.ZIP_COMPRESSION)
+        x = OpenEXR.OutputFile("window.exr", hdr)
+        x.writePixels({'Y' : plane.tobytes(), 'Z' : (2 * plane).tobytes()})
+        x.close()
+
+        golden = OpenEXR.InputFile("GoldenGate.exr").channels("RGB", numpy=True)
+        for (f, planes) in ((OpenEXR.InputFile("window.exr"), [plane, 2 * plane]),
+                            (OpenEXR.TiledInputFile("GoldenGate.exr"), golden),
+                            (OpenEXR.InputFile("GoldenGate.exr"), golden)):
+            names = "YZ" if len(planes) == 2 else "RGB"
+            for (x0, y0, x1, y1) in ((0, 0, 0, 0), (13, 250, 140, 530), (100, 7, 127, 128), (0, 17, 699, 40)):
+                win = box(x0, y0, x1, y1)
+                crops = [p[y0:y1 + 1, x0:x1 + 1] for p in planes]
+                self.assertEqual(f.channel(names[0], window=win), crops[0].tobytes())
+                a = f.channels(names, numpy=True, window=win)
+                for (p, c) in zip(a, crops):
+                    self.assertTrue(np.array_equal(p, c))
+                inter = f.channels_interleaved(names, window=win, numpy=True)
+                self.assertTrue(np.array_equal(inter, np.dstack(crops)))
+                out = np.zeros((2 * (y1 - y0 + 1), x1 - x0 + 1), crops[0].dtype)[::2]
+                f.channel_into(names[1], out, window=win)
+                self.assertTrue(np.array_equal(out, crops[1]))
+            self.assertRaises(TypeError, lambda: f.channel(names[0], window=box(0, 0, 2000, 10)))
+            self.assertRaises(TypeError, lambda: f.channel(names[0], window=box(5, 5, 4, 5)))
+            self.assertRaises(TypeError, lambda: f.channel(names[0], window=(0, 0)))
+
+    def test_iter_blocks(self):
+        """ Blocks are chunk-aligned, reuse their buffers, and cover the image """
+        (w, h) = (300, 200)
+        plane = np.random.random((h, w)).astype(np.float32)
+        hdr = OpenEXR.Header(w, h)
+        hdr['channels'] = {'Y' : Imath.Channel(self.FLOAT), 'Z' : Imath.Channel(self.HALF)}
+        hdr['compression'] = Imath.Compression(Imath.Compression.PIZ_COMPRESSION)
+        x = OpenEXR.OutputFile("blocks.exr", hdr)
+        x.writePixels({'Y' : plane.tobytes(), 'Z' : plane.astype(np.float16).tobytes()})
+        x.close()
+
+        f = OpenEXR.InputFile("blocks.exr")
+        expected = f.channels("YZ", numpy=True)
+        blocks = list(f.iter_blocks("YZ", rows=40, numpy=True))
+        self.assertEqual([(y1, y2) for (y1, y2, _) in blocks], [(0, 63), (64, 127), (128, 191), (192, 199)])
+        self.assertTrue(np.shares_memory(blocks[0][2][0], blocks[2][2][0]))
+        self.assertFalse(np.shares_memory(blocks[0][2][0], blocks[1][2][0]))
+
+        got = [[], []]
+        for (y1, y2, (y, z)) in f.iter_blocks("YZ", numpy=True, scanLine1=50, scanLine2=150):
+            self.assertEqual(y.shape, (y2 - y1 + 1, w))
+            got[0].append(y.copy())
+            got[1].append(z.copy())
+        self.assertTrue(np.array_equal(np.vstack(got[0]), expected[0][50:151]))
+        self.assertTrue(np.array_equal(np.vstack(got[1]), expected[1][50:151]))
+
+        data = b"".join(bytes(y) for (_, _, (y,)) in f.iter_blocks(["Y"], buffers=1))
+        self.assertEqual(data, expected[0].tobytes())
+        self.assertRaises(TypeError, lambda: f.iter_blocks("Q"))
+        self.assertRaises(TypeError, lambda: f.iter_blocks("Y", scanLine1=300))
+
+    def test_header_accessors(self):
+        """ Header accessors agree with the header dict, which callers may edit """
+        for f in (OpenEXR.InputFile("GoldenGate.exr"), OpenEXR.TiledInputFile("GoldenGate.exr")):
+            h = f.header()
+            self.assertEqual(f.dataWindow(), h['dataWindow'])
+            self.assertEqual(f.displayWindow(), h['displayWindow'])
+            self.assertEqual(f.channelNames(), sorted(h['channels']))
+            self.assertEqual(f.compression(), h['compression'])
+            self.assertEqual(f.header('dataWindow'), h['dataWindow'])
+            self.assertRaises(KeyError, lambda: f.header('nonexistent'))
+            del h['dataWindow']
+            self.assertTrue('dataWindow' in f.header())
+            h = f.header()
+            del h['channels']['R']
+            h['displayWindow'].min.x = 999
+            self.assertEqual(sorted(f.header()['channels']), f.channelNames())
+            self.assertEqual(f.header()['displayWindow'], f.displayWindow())
+            f.close()
+            self.assertRaises(OSError, lambda: f.dataWindow())
+
+    def test_read_headers(self):
+        """ read_headers returns a header or an OSError per path, in order """
+        paths = ["GoldenGate.exr", "no-such-file", "test-exr.py", "GoldenGate.exr"]
+        for threads in (0, 4):
+            r = OpenEXR.read_headers(paths, threads=threads)
+            self.assertEqual(len(r), 4)
+            self.assertTrue(isinstance(r[1], OSError))
+            self.assertTrue(isinstance(r[2], OSError))
+            h = OpenEXR.InputFile("GoldenGate.exr").header()
+            for got in (r[0], r[3]):
+                self.assertEqual(sorted(got), sorted(h))
+                self.assertEqual(got['dataWindow'], h['dataWindow'])
+                self.assertEqual(got['channels'].keys(), h['channels'].keys())
+        r = OpenEXR.read_headers(["GoldenGate.exr"], attributes=['dataWindow', 'nonexistent'])
+        self.assertEqual(list(r[0].keys()), ['dataWindow'])
+        r = OpenEXR.read_headers(["GoldenGate.exr"], attributes='compression')
+        self.assertEqual(list(r[0].keys()), ['compression'])
+        self.assertEqual(OpenEXR.read_headers([]), [])
+
+    def test_read_many(self):
+        """ read_many decodes files in order, with an OSError for each bad file """
+        ref = OpenEXR.InputFile("GoldenGate.exr").channels("RGB")
+        paths = ["GoldenGate.exr", "no-such-file", "GoldenGate.exr", "test-exr.py"]
+        for threads in (0, 3):
+            r = list(OpenEXR.read_many(paths, "RGB", threads=threads, inflight=2))
+            self.assertEqual(len(r), 4)
+            self.assertEqual(r[0], ref)
+            self.assertEqual(r[2], ref)
+            self.assertTrue(isinstance(r[1], OSError))
+            self.assertTrue(isinstance(r[3], OSError))
+        FLOAT = Imath.PixelType(Imath.PixelType.FLOAT)
+        (r,) = OpenEXR.read_many(["GoldenGate.exr"], ["R", "Q"])
+        self.assertTrue(isinstance(r, TypeError))
+        (r,) = OpenEXR.read_many(["GoldenGate.exr"], "G", pixel_type=FLOAT)
+        self.assertEqual(r, [OpenEXR.InputFile("GoldenGate.exr").channel("G", FLOAT)])
+        # Abandoning the iterator waits for the frames still decoding
+        it = OpenEXR.read_many(["GoldenGate.exr"] * 8, "RGB", threads=4)
+        self.assertEqual(next(it), ref)
+        del it
+        self.assertEqual(list(OpenEXR.read_many([], "R")), [])
+        # With no threads each file is read only when it is requested
+        import os
+        import shutil
+        if os.path.exists("lazy.exr"):
+            os.remove("lazy.exr")
+        it = OpenEXR.read_many(["lazy.exr", "lazy.exr"], "RGB", threads=0)
+        shutil.copy("GoldenGate.exr", "lazy.exr")
+        self.assertEqual(next(it), ref)
+        os.remove("lazy.exr")
+        self.assertTrue(isinstance(next(it), OSError))
+
+    def test_async(self):
+        """ _async methods resolve futures on the event loop """
+        if sys.version_info < (3, 5):
+            return
+        import asyncio
+        golden = OpenEXR.InputFile("GoldenGate.exr")
+        tiled = OpenEXR.TiledInputFile("GoldenGate.exr")
+        ref = golden.channels("RGB")
+        hdr = OpenEXR.Header(10, 10)
+        hdr['channels'] = {'R': Imath.Channel(Imath.PixelType(Imath.PixelType.FLOAT))}
+        # Built with exec so that this file still parses on Python 2
+        scope = dict(globals(), self=self, asyncio=asyncio, golden=golden, tiled=tiled, ref=ref, hdr=hdr)
+        exec("""
+async def run():
+    rs = await asyncio.gather(*[golden.channels_async("RGB") for i in range(4)])
+    self.assertEqual(rs, [ref] * 4)
+    self.assertEqual(await tiled.channel_async("G"), ref[1])
+    with self.assertRaises(TypeError):
+        await golden.channel_async("Q")
+    out = OpenEXR.OutputFile("async.exr", hdr)
+    await out.writePixels_async({'R': array('f', [0.5] * 100).tobytes()})
+    out.close()
+""", scope)
+        run = scope['run']
+        OpenEXR.setAsyncThreadCount(2)
+        self.assertEqual(OpenEXR.asyncThreadCount(), 2)
+        self.assertRaises(TypeError, lambda: OpenEXR.setAsyncThreadCount(0))
+        self.assertRaises(RuntimeError, lambda: golden.channels_async("RGB"))
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(run())
+        finally:
+            loop.close()
+        self.assertEqual(OpenEXR.InputFile("async.exr").channel('R'), array('f', [0.5] * 100).tobytes())
+
     def test_version(self):
         self.assertTrue(OpenEXR.__version__ != None)
         self.assertTrue(OpenEXR.OPENEXR_VERSION_HEX != None)
@@ -306,6 +995,28 @@ class TestDirected(unittest.TestCase):
                 data = infile.channel(i, ch)
         
 
+    def test_multipart_channels(self):
+        if not hasattr(OpenEXR, 'MultiPartInputFile'):
+            return
+        infile = OpenEXR.MultiPartInputFile("Beachball_Multipart.exr")
+        expected = []
+        for i in range(infile.parts()):
+            names = sorted(infile.header(i)['channels'])
+            data = infile.channels(i, names)
+            self.assertEqual(data, [infile.channel(i, c) for c in names])
+            expected.append(dict(zip(names, data)))
+        self.assertEqual(infile.read_parts(), expected)
+        self.assertEqual(infile.read_parts([4, 0], "RG", threads=0), [
+            {'R': expected[4]['R'], 'G': expected[4]['G']},
+            {'R': expected[0]['R'], 'G': expected[0]['G']}])
+        (z,) = infile.read_parts([1], numpy=True)
+        self.assertEqual(z['Z'].tobytes(), expected[1]['Z'])
+        self.assertRaises(IndexError, lambda: infile.channels(10, "Z"))
+        self.assertRaises(IndexError, lambda: infile.read_parts([10]))
+        self.assertRaises(TypeError, lambda: infile.read_parts([1, 1]))
+        infile.close()
+        self.assertRaises(OSError, lambda: infile.channels(1, "Z"))
+
     def test_multipart_out(self):
         
         if not hasattr(OpenEXR, 'MultiPartOutputFile'):
@@ -329,6 +1040,166 @@ class TestDirected(unittest.TestCase):
 
         x.close()
     
+    def test_multipart_tiled(self):
+        if not hasattr(OpenEXR, 'MultiPartOutputFile'):
+            return
+        FLOAT = Imath.PixelType(Imath.PixelType.FLOAT)
+        h0 = OpenEXR.Header(128, 64)
+        h0['channels'] = {'Z': Imath.Channel(FLOAT)}
+        h0['name'] = b'depth'
+        h1 = OpenEXR.Header(128, 64)
+        h1['channels'] = {'R': Imath.Channel(FLOAT), 'G': Imath.Channel(FLOAT)}
+        h1['name'] = b'beauty'
+        h1['tiles'] = Imath.TileDescription(32, 32, Imath.LevelMode(Imath.LevelMode.MIPMAP_LEVELS))
+        z = np.arange(128 * 64, dtype='float32')
+        r = np.random.rand(64, 128).astype('float32')
+        g = 2 * r
+
+        out = OpenEXR.MultiPartOutputFile('out-multipart-tiled.exr', [h0, h1])
+        self.assertEqual(out.numLevels(1), 8)
+        self.assertEqual(out.numXTiles(1), 4)
+        self.assertRaises(TypeError, lambda: out.writeTiles(0, {'Z': z.tobytes()}))
+        self.assertRaises(TypeError, lambda: out.writePixels(1, {'R': r.tobytes(), 'G': g.tobytes()}))
+        out.writePixels(0, {'Z': z.tobytes()})
+        out.writeTiles(1, {'R': r.tobytes(), 'G': g.tobytes()})
+        out.close()
+
+        infile = OpenEXR.MultiPartInputFile('out-multipart-tiled.exr')
+        self.assertEqual(infile.header(1)['type'], b'tiledimage')
+        self.assertEqual(infile.numLevels(1), 8)
+        self.assertEqual(infile.numXTiles(1, 1), 2)
+        self.assertRaises(TypeError, lambda: infile.numLevels(0))
+        self.assertEqual(infile.channel(0, 'Z'), z.tobytes())
+        self.assertEqual(infile.channels(1, 'RG'), [r.tobytes(), g.tobytes()])
+        tile = infile.channel(1, 'R', tilex_min=1, tilex_max=1, tiley_min=0, tiley_max=0, numpy=True)
+        self.assertTrue((tile == r[0:32, 32:64]).all())
+        level1 = infile.channel(1, 'R', lx=1, numpy=True)
+        self.assertTrue(np.allclose(level1, r.reshape(32, 2, 64, 2).mean(axis=(1, 3))))
+        window = Imath.Box2i(Imath.V2i(10, 5), Imath.V2i(19, 9))
+        rg = infile.channels_interleaved(1, 'RG', window=window, numpy=True)
+        self.assertTrue((rg[:, :, 1] == g[5:10, 10:20]).all())
+        parts = infile.read_parts()
+        self.assertEqual(parts[1]['G'], g.tobytes())
+        self.assertEqual(parts[0]['Z'], z.tobytes())
+
+    def test_deep(self):
+        if not hasattr(OpenEXR, 'read_deep'):
+            return
+        FLOAT = Imath.PixelType(Imath.PixelType.FLOAT)
+        HALF = Imath.PixelType(Imath.PixelType.HALF)
+        h = OpenEXR.Header(40, 30)
+        h['dataWindow'] = Imath.Box2i(Imath.V2i(3, 2), Imath.V2i(42, 31))
+        h['channels'] = {'Z': Imath.Channel(FLOAT), 'A': Imath.Channel(HALF)}
+        h['compression'] = Imath.Compression(Imath.Compression.ZIPS_COMPRESSION)
+        counts = np.random.randint(0, 4, (30, 40)).astype('uint32')
+        total = int(counts.sum())
+        z = np.random.rand(total).astype('float32')
+        a = np.random.rand(total).astype('float16')
+
+        OpenEXR.write_deep('out-deep.exr', h, counts, {'Z': z, 'A': a})
+        c, offsets, samples = OpenEXR.read_deep('out-deep.exr', numpy=True)
+        self.assertTrue((c == counts).all())
+        self.assertEqual(offsets[-1], total)
+        self.assertEqual(offsets[41], counts.flat[:41].sum())
+        self.assertTrue((samples['Z'] == z).all())
+        self.assertTrue((samples['A'] == a).all())
+
+        c, offsets, samples = OpenEXR.read_deep('out-deep.exr', ['Z'], pixel_type=HALF)
+        self.assertEqual(c, counts.tobytes())
+        self.assertEqual(list(samples), ['Z'])
+        self.assertEqual(samples['Z'], z.astype('float16').tobytes())
+
+        h['tiles'] = Imath.TileDescription(16, 16, Imath.LevelMode(Imath.LevelMode.ONE_LEVEL))
+        f = StringIO()
+        OpenEXR.write_deep(f, h, counts, {'Z': z})
+        f.seek(0)
+        c, offsets, samples = OpenEXR.read_deep(f, numpy=True)
+        self.assertTrue((samples['Z'] == z).all())
+        self.assertTrue((samples['A'] == 0).all())
+
+        self.assertRaises(TypeError, lambda: OpenEXR.write_deep('out-deep.exr', h, counts[1:], {}))
+        self.assertRaises(TypeError, lambda: OpenEXR.write_deep('out-deep.exr', h, counts, {'Z': z[1:]}))
+        self.assertRaises(TypeError, lambda: OpenEXR.read_deep('out-deep.exr', ['Y']))
+        self.assertRaises(TypeError, lambda: OpenEXR.read_deep('GoldenGate.exr'))
+        self.assertRaises(IndexError, lambda: OpenEXR.read_deep('out-deep.exr', partNum=1))
+
+        OpenEXR.copy('out-deep.exr', 'out-deep2.exr', {'comments': b'deep'})
+        c, offsets, samples = OpenEXR.read_deep('out-deep2.exr', numpy=True)
+        self.assertTrue((c == counts).all())
+        self.assertTrue((samples['Z'] == z).all())
+        self.assertRaises(TypeError, lambda: OpenEXR.transcode('out-deep.exr', 'out-deep2.exr', compression=0))
+
+    def test_copy_transcode(self):
+        if not hasattr(OpenEXR, 'copy'):
+            return
+        golden = OpenEXR.InputFile("GoldenGate.exr")
+        rgb = golden.channels("RGB")
+        OpenEXR.copy("GoldenGate.exr", "copy.exr", {'comments': b'A picture of some delicious pie', 'owner': None})
+        x = OpenEXR.InputFile("copy.exr")
+        self.assertEqual(x.header()['comments'], b'A picture of some delicious pie')
+        self.assertNotIn('owner', x.header())
+        self.assertEqual(x.header()['compression'], golden.header()['compression'])
+        self.assertEqual(x.channels("RGB"), rgb)
+
+        OpenEXR.transcode("GoldenGate.exr", "copy.exr", compression=Imath.Compression.ZIP_COMPRESSION, pixel_type=self.FLOAT)
+        x = OpenEXR.InputFile("copy.exr")
+        self.assertEqual(x.header()['compression'], Imath.Compression(Imath.Compression.ZIP_COMPRESSION))
+        self.assertEqual(x.header()['channels']['R'].type, self.FLOAT)
+        self.assertEqual(x.channels("RGB", self.HALF), rgb)
+
+        # Scan lines written bottom to top, a subsampled channel and a
+        # UINT channel, which keeps its type.
+        (w, h) = (38, 30)
+        hdr = OpenEXR.Header(w, h)
+        hdr['dataWindow'] = Imath.Box2i(Imath.V2i(4, -6), Imath.V2i(w + 3, h - 7))
+        hdr['lineOrder'] = Imath.LineOrder(Imath.LineOrder.DECREASING_Y)
+        hdr['channels'] = {'Y': Imath.Channel(self.HALF),
+                           'RY': Imath.Channel(self.HALF, 2, 2),
+                           'Z': Imath.Channel(self.UINT)}
+        data = {'Y': np.random.rand(h, w).astype(np.float16).tobytes(),
+                'RY': np.random.rand(h // 2, w // 2).astype(np.float16).tobytes(),
+                'Z': np.arange(w * h, dtype=np.uint32).tobytes()}
+        out = OpenEXR.OutputFile("copy-src.exr", hdr)
+        out.writePixels(data)
+        out.close()
+        for c in (Imath.Compression.NO_COMPRESSION, Imath.Compression.RLE_COMPRESSION,
+                  Imath.Compression.PIZ_COMPRESSION, Imath.Compression.PXR24_COMPRESSION):
+            OpenEXR.transcode("copy-src.exr", "copy.exr", compression=Imath.Compression(c), pixel_type=self.FLOAT)
+            x = OpenEXR.InputFile("copy.exr")
+            self.assertEqual(x.header()['lineOrder'], hdr['lineOrder'])
+            self.assertEqual(x.header()['channels']['Z'].type, self.UINT)
+            self.assertEqual(x.channel('Y', self.HALF), data['Y'])
+            self.assertEqual(x.channel('RY', self.HALF), data['RY'])
+            self.assertEqual(x.channel('Z'), data['Z'])
+
+        # Every level of a mipmapped file is re-encoded.
+        hdr = OpenEXR.Header(50, 37)
+        hdr['channels'] = {'Y': Imath.Channel(self.FLOAT)}
+        hdr['tiles'] = Imath.TileDescription(16, 8, Imath.LevelMode(Imath.LevelMode.MIPMAP_LEVELS))
+        out = OpenEXR.TiledOutputFile("copy-src.exr", hdr)
+        out.writeTiles({'Y': np.random.rand(37, 50).astype(np.float32).tobytes()})
+        out.close()
+        f = StringIO()
+        OpenEXR.transcode("copy-src.exr", f, compression=Imath.Compression.ZIPS_COMPRESSION, threads=2)
+        f.seek(0)
+        (a, b) = (OpenEXR.TiledInputFile("copy-src.exr"), OpenEXR.TiledInputFile(f))
+        self.assertEqual(b.header()['compression'], Imath.Compression(Imath.Compression.ZIPS_COMPRESSION))
+        for l in range(a.numLevels()):
+            self.assertEqual(a.channel('Y', lx=l, ly=l), b.channel('Y', lx=l, ly=l))
+
+        OpenEXR.transcode("Beachball_Multipart.exr", "copy.exr", compression=Imath.Compression.ZIP_COMPRESSION)
+        (a, b) = (OpenEXR.MultiPartInputFile("Beachball_Multipart.exr"), OpenEXR.MultiPartInputFile("copy.exr"))
+        self.assertEqual(a.parts(), b.parts())
+        for p in range(a.parts()):
+            names = list(a.header(p)['channels'])
+            self.assertEqual(b.header(p)['name'], a.header(p)['name'])
+            self.assertEqual(a.channels(p, names), b.channels(p, names))
+
+        self.assertRaises(TypeError, lambda: OpenEXR.copy("GoldenGate.exr", "copy.exr", {'dataWindow': Imath.Box2i(Imath.V2i(0, 0), Imath.V2i(9, 9))}))
+        self.assertRaises(TypeError, lambda: OpenEXR.copy("GoldenGate.exr", "copy.exr", {'foo': object()}))
+        self.assertRaises(TypeError, lambda: OpenEXR.transcode("GoldenGate.exr", "copy.exr", compression=99))
+        self.assertRaises(OSError, lambda: OpenEXR.copy("nonexistent.exr", "copy.exr"))
+
     def test_write_chunk_multipart(self):
 
         if not hasattr(OpenEXR, 'MultiPartInputFile'):